@@ -0,0 +1,303 @@
+from dataclasses import dataclass
+import logging
+import os
+from typing import Dict, List, Optional, Tuple
+
+import networkx as nx
+import numpy as np
+import pandas as pd
+from scipy import sparse
+
+import Network.index as index
+import Network.main as network
+
+logger = logging.getLogger(os.getenv('DATA_NETWORK_LOGGER', 'data-and-network'))
+
+LOCATION_LEVELS = index.LOCATION_LEVELS
+# Dense similarity values computed at once by top_k_similar_all (128 MiB of floats)
+SIMILARITY_BLOCK_VALUES = 2**24
+
+
+@dataclass
+class BipartiteMatrices:
+    """
+    The attraction-adjective graph as sparse matrices. Rows of both matrices are
+    attractions (in `attraction_ids` order), columns are adjectives (edge weights) or
+    emotion categories (sum of the weights of the adjectives associated with them).
+    """
+
+    attraction_ids: List[str]
+    attraction_index: Dict[str, int]
+    adjective_ids: List[str]
+    adjective_index: Dict[str, int]
+    emotion_categories: List[str]
+    emotion_index: Dict[str, int]
+    adjective_matrix: sparse.csr_matrix
+    count_matrix: sparse.csr_matrix
+    emotion_matrix: sparse.csr_matrix
+    # Location of each attraction, one column per LOCATION_LEVELS entry
+    locations: pd.DataFrame
+
+    def matrix(self, kind: str) -> sparse.csr_matrix:
+        if kind == 'adjective':
+            return self.adjective_matrix
+        elif kind == 'emotion':
+            return self.emotion_matrix
+        raise ValueError(f'Unknown matrix kind: {kind}')
+
+
+def build_matrices(graph: nx.Graph) -> BipartiteMatrices:
+    """Builds the sparse matrices of `graph` with a single pass over its edges."""
+    attraction_ids, adjective_ids = [], []
+    locations = []
+    associated_emotions = []
+    for node, data in graph.nodes.items():
+        if data.get('type') == 'attraction':
+            attraction_ids.append(node)
+            location = data.get('location') or {}
+            locations.append([location.get(level) for level in LOCATION_LEVELS])
+        else:
+            adjective_ids.append(node)
+            associated_emotions.append(data.get('associated_emotion'))
+    attraction_index = {node: index for index, node in enumerate(attraction_ids)}
+    adjective_index = {node: index for index, node in enumerate(adjective_ids)}
+
+    rows = np.empty(graph.number_of_edges(), dtype=np.int64)
+    columns = np.empty(graph.number_of_edges(), dtype=np.int64)
+    weights = np.empty(graph.number_of_edges(), dtype=np.float64)
+    counts = np.empty(graph.number_of_edges(), dtype=np.float64)
+    edges = 0
+    for source, target, data in graph.edges(data=True):
+        if source not in attraction_index:
+            source, target = target, source
+        if source not in attraction_index or target not in adjective_index:
+            continue
+        rows[edges] = attraction_index[source]
+        columns[edges] = adjective_index[target]
+        weights[edges] = data['weight']
+        counts[edges] = data['count']
+        edges += 1
+
+    shape = (len(attraction_ids), len(adjective_ids))
+    adjective_matrix = sparse.csr_matrix(
+        (weights[:edges], (rows[:edges], columns[:edges])), shape=shape
+    )
+    count_matrix = sparse.csr_matrix(
+        (counts[:edges], (rows[:edges], columns[:edges])), shape=shape
+    )
+
+    # Adjective -> emotion category indicator, so emotion weights are one product
+    # (adjectives without an associated emotion are left out)
+    emotion_categories = sorted({emotion for emotion in associated_emotions if emotion})
+    emotion_index = {emotion: index for index, emotion in enumerate(emotion_categories)}
+    categorized = [
+        (adjective, emotion_index[emotion])
+        for adjective, emotion in enumerate(associated_emotions)
+        if emotion
+    ]
+    categories = sparse.csr_matrix(
+        (
+            np.ones(len(categorized)),
+            (
+                [adjective for adjective, _ in categorized],
+                [category for _, category in categorized],
+            ),
+        ),
+        shape=(len(adjective_ids), len(emotion_categories)),
+    )
+
+    return BipartiteMatrices(
+        attraction_ids=attraction_ids,
+        attraction_index=attraction_index,
+        adjective_ids=adjective_ids,
+        adjective_index=adjective_index,
+        emotion_categories=emotion_categories,
+        emotion_index=emotion_index,
+        adjective_matrix=adjective_matrix,
+        count_matrix=count_matrix,
+        emotion_matrix=(adjective_matrix @ categories).tocsr(),
+        locations=pd.DataFrame(locations, columns=list(LOCATION_LEVELS)),
+    )
+
+
+_cached_matrices: Optional[BipartiteMatrices] = None
+_cached_key: Optional[Tuple[int, int, int]] = None
+
+
+def get_matrices() -> BipartiteMatrices:
+    """
+    Matrices of the current network, rebuilt only when the graph changed since the
+    last call (any update changes the version of the network statistics).
+    """
+    global _cached_matrices, _cached_key
+    key = (
+        id(network.AttractionSentimentNet),
+        id(network.network_stats),
+        network.network_stats.version,
+    )
+    if _cached_matrices is None or key != _cached_key:
+        _cached_matrices = build_matrices(network.AttractionSentimentNet)
+        _cached_key = key
+        logger.info(
+            f'Built the network matrices: {len(_cached_matrices.attraction_ids)} '
+            f'attractions x {len(_cached_matrices.adjective_ids)} adjectives.'
+        )
+
+    return _cached_matrices
+
+
+def normalize_rows(matrix: sparse.csr_matrix) -> sparse.csr_matrix:
+    """Rows scaled to unit L2 norm (empty rows stay empty)."""
+    norms = np.sqrt(np.asarray(matrix.multiply(matrix).sum(axis=1)).ravel())
+    norms[norms == 0] = 1.0
+    return sparse.diags(1.0 / norms) @ matrix
+
+
+def cosine_similarity(
+    matrices: BipartiteMatrices = None, kind: str = 'adjective'
+) -> sparse.csr_matrix:
+    """
+    Attraction x attraction cosine similarity of the adjective (or emotion category)
+    weights, as a sparse matrix (attractions without shared columns are left out).
+    """
+    matrices = matrices or get_matrices()
+    normalized = normalize_rows(matrices.matrix(kind))
+
+    return (normalized @ normalized.T).tocsr()
+
+
+def top_k_similar(
+    attraction_id: str,
+    k: int = 10,
+    matrices: BipartiteMatrices = None,
+    kind: str = 'adjective',
+) -> List[Tuple[str, float]]:
+    """The `k` attractions most similar to `attraction_id`, with their similarity."""
+    matrices = matrices or get_matrices()
+    normalized = normalize_rows(matrices.matrix(kind))
+    row = matrices.attraction_index[attraction_id]
+    similarities = (normalized @ normalized[row].T).toarray().ravel()
+    similarities[row] = -np.inf
+
+    return [
+        (matrices.attraction_ids[index], float(similarities[index]))
+        for index in top_k_indexes(similarities, k)
+    ]
+
+
+def top_k_indexes(values: np.ndarray, k: int) -> np.ndarray:
+    """Indexes of the `k` largest values (finite ones only), largest first."""
+    k = min(k, len(values))
+    if k <= 0:
+        return np.empty(0, dtype=np.int64)
+    candidates = np.argpartition(-values, k - 1)[:k]
+    candidates = candidates[np.argsort(-values[candidates], kind='stable')]
+
+    return candidates[np.isfinite(values[candidates])]
+
+
+def top_k_similar_all(
+    k: int = 10, matrices: BipartiteMatrices = None, kind: str = 'adjective'
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    The `k` most similar attractions of every attraction: (attractions x k) arrays of
+    attraction indexes and similarities, largest first. Rows are computed in blocks of
+    at most SIMILARITY_BLOCK_VALUES similarities to bound memory. Every pair is
+    compared, so time grows with the square of the number of attractions.
+    """
+    matrices = matrices or get_matrices()
+    normalized = normalize_rows(matrices.matrix(kind))
+    num_attractions = normalized.shape[0]
+    k = min(k, max(num_attractions - 1, 0))
+
+    indexes = np.full((num_attractions, k), -1, dtype=np.int64)
+    similarities = np.full((num_attractions, k), np.nan)
+    if k == 0:
+        return indexes, similarities
+
+    block_size = max(1, SIMILARITY_BLOCK_VALUES // num_attractions)
+    for start in range(0, num_attractions, block_size):
+        end = min(start + block_size, num_attractions)
+        # Sparse x dense product: one column of similarities per attraction of the
+        # block, much faster than a sparse x sparse product with a dense result
+        block = normalized @ normalized[start:end].toarray().T
+        block[np.arange(start, end), np.arange(end - start)] = -np.inf
+
+        block_indexes = np.argpartition(-block, k - 1, axis=0)[:k]
+        block_values = np.take_along_axis(block, block_indexes, axis=0)
+        order = np.argsort(-block_values, axis=0, kind='stable')
+        indexes[start:end] = np.take_along_axis(block_indexes, order, axis=0).T
+        similarities[start:end] = np.take_along_axis(block_values, order, axis=0).T
+
+    return indexes, similarities
+
+
+def emotion_profiles(
+    level: str = 'country',
+    matrices: BipartiteMatrices = None,
+    normalize: bool = True,
+) -> pd.DataFrame:
+    """
+    Emotion category weights of every city, country or continent (rows) as shares of
+    the location total, or absolute weights with `normalize=False`.
+    """
+    if level not in LOCATION_LEVELS:
+        raise ValueError(f'Unknown location level: {level}')
+    matrices = matrices or get_matrices()
+
+    group_codes, groups = pd.factorize(matrices.locations[level])
+    located = group_codes >= 0
+    membership = sparse.csr_matrix(
+        (
+            np.ones(located.sum()),
+            (group_codes[located], np.flatnonzero(located)),
+        ),
+        shape=(len(groups), len(matrices.attraction_ids)),
+    )
+    profiles = np.asarray((membership @ matrices.emotion_matrix).todense())
+    if normalize:
+        totals = profiles.sum(axis=1, keepdims=True)
+        profiles = np.divide(
+            profiles, totals, out=np.zeros_like(profiles), where=totals > 0
+        )
+
+    return pd.DataFrame(
+        profiles,
+        index=pd.Index(groups, name=level),
+        columns=matrices.emotion_categories,
+    )
+
+
+def weighted_degree_ranking(
+    node_type: str = 'attraction',
+    top: int = None,
+    matrices: BipartiteMatrices = None,
+) -> pd.DataFrame:
+    """
+    Attractions (or adjectives with `node_type='adjective'`) by weighted degree (sum
+    of edge weights), with their degree and review count.
+    """
+    matrices = matrices or get_matrices()
+    if node_type == 'attraction':
+        axis, ids = 1, matrices.attraction_ids
+    elif node_type == 'adjective':
+        axis, ids = 0, matrices.adjective_ids
+    else:
+        raise ValueError(f'Unknown node type: {node_type}')
+
+    ranking = pd.DataFrame(
+        {
+            'weighted_degree': np.asarray(
+                matrices.adjective_matrix.sum(axis=axis)
+            ).ravel(),
+            'degree': np.diff(
+                matrices.adjective_matrix.indptr
+                if axis == 1
+                else matrices.adjective_matrix.tocsc().indptr
+            ),
+            'count': np.asarray(matrices.count_matrix.sum(axis=axis)).ravel(),
+        },
+        index=pd.Index(ids, name='id'),
+    ).sort_values('weighted_degree', ascending=False, kind='stable')
+
+    return ranking.head(top) if top is not None else ranking
@@ -0,0 +1,597 @@
+import argparse
+from contextlib import contextmanager
+import math
+import os
+import random
+import tempfile
+import time
+import tracemalloc
+from types import SimpleNamespace
+from typing import Dict
+
+import networkx as nx
+
+import Network.analytics as analytics
+import Network.export as export
+import Network.main as network
+import Network.plotting as plotting
+import Network.query as query
+import Network.shards as shards
+import Network.snapshot as snapshot
+import Network.stats as stats
+import Network.temporal as temporal
+
+EMOTIONS = ['Joy', 'Sadness', 'Anger', 'Surprise', 'Trust', 'Fear']
+
+
+def generate_reviews(attractions: int, occurrences: int, vocabulary: int, seed: int):
+    """
+    Synthetic adjective occurrences (name, sentiment, rating, emotion, date) of each
+    attraction, with a Zipf-like adjective distribution like real reviews.
+    """
+    rng = random.Random(seed)
+    adjectives = [f'adjective{i}' for i in range(vocabulary)]
+    adjective_weights = [1 / (rank + 1) for rank in range(vocabulary)]
+
+    reviews = []
+    for i in range(attractions):
+        attraction = SimpleNamespace(
+            id=f'attraction{i}',
+            displayName={'text': f'Attraction {i}'},
+            rating=rng.uniform(1, 5),
+            location={'latitude': 0.0, 'longitude': 0.0},
+            types=['tourist_attraction'],
+        )
+        names = rng.choices(adjectives, adjective_weights, k=occurrences)
+        reviews.append(
+            (
+                attraction,
+                names,
+                [rng.uniform(-1, 1) for _ in names],
+                [rng.randint(1, 5) for _ in names],
+                [EMOTIONS[int(name[9:]) % len(EMOTIONS)] for name in names],
+                [
+                    f'{rng.randint(2015, 2025)}-{rng.randint(1, 12):02d}-01T00:00:00'
+                    for _ in names
+                ],
+            )
+        )
+
+    return reviews
+
+
+@contextmanager
+def scratch_network():
+    """
+    An isolated empty network (see Network.shards.isolated_network), so benchmarks
+    never touch the saved network (nor load it). Call `reset_scratch_network` to
+    start over inside it.
+    """
+    with shards.isolated_network():
+        yield
+
+
+def reset_scratch_network():
+    network.use_network(nx.Graph(), {})
+    network.pending_raw_review_dates.clear()
+    network.mutation_log.truncate()
+
+
+def synthetic_location(attraction) -> Dict[str, str]:
+    index = int(attraction.id[len('attraction') :])
+    return {
+        'continent': f'Continent {index % 5}',
+        'country': f'Country {index % 25}',
+        'city': f'City {index % 125}',
+    }
+
+
+def build_with_add_edge(reviews):
+    for attraction, names, scores, ratings, emotions, dates in reviews:
+        for name, score, rating, emotion, date in zip(
+            names, scores, ratings, emotions, dates
+        ):
+            network.add_edge(
+                attraction,
+                name,
+                'adjective',
+                score,
+                rating,
+                associated_emotion=emotion,
+                review_date=date,
+                **synthetic_location(attraction),
+            )
+
+
+def build_with_add_edges_bulk(reviews):
+    for attraction, names, scores, ratings, emotions, dates in reviews:
+        network.add_edges_bulk(
+            attraction,
+            names,
+            'adjective',
+            scores,
+            ratings,
+            associated_emotions=emotions,
+            review_dates=dates,
+            **synthetic_location(attraction),
+        )
+
+
+def benchmark_bulk_ingestion(reviews):
+    """
+    Builds the same graph with add_edge and add_edges_bulk on empty in-memory graphs
+    (nothing is saved) and checks both graphs are identical.
+    """
+    graphs = {}
+    with scratch_network():
+        print(f'{"strategy":<16}{"seconds":>10}{"occurrences/s":>16}')
+        occurrences = sum(len(names) for _, names, *_ in reviews)
+        for name, build in [
+            ('add_edge', build_with_add_edge),
+            ('add_edges_bulk', build_with_add_edges_bulk),
+        ]:
+            reset_scratch_network()
+            start_time = time.perf_counter()
+            build(reviews)
+            elapsed = time.perf_counter() - start_time
+            graphs[name] = network.AttractionSentimentNet
+            print(f'{name:<16}{elapsed:>10.3f}{occurrences / elapsed:>16.0f}')
+
+    same_graph = nx.utils.graphs_equal(graphs['add_edge'], graphs['add_edges_bulk'])
+    print(f'identical graphs: {same_graph}')
+
+    return same_graph
+
+
+def benchmark_snapshot(reviews):
+    """
+    Save and load time and file size of a synthetic graph as GML (how the graph used
+    to be saved) and as a binary snapshot, checking both read back the same graph.
+    """
+    with scratch_network():
+        build_with_add_edges_bulk(reviews)
+        graph = network.AttractionSentimentNet
+
+    print(
+        f'{graph.number_of_nodes()} nodes, {graph.number_of_edges()} edges\n'
+        f'{"format":<10}{"save (s)":>10}{"load (s)":>10}{"size (MB)":>11}  identical'
+    )
+    results = {}
+    with tempfile.TemporaryDirectory() as directory:
+        for name, extension in [('gml', '.gml'), ('snapshot', '.npz')]:
+            path = os.path.join(directory, f'graph{extension}')
+            start_time = time.perf_counter()
+            snapshot.write_graph(graph, path)
+            save_time = time.perf_counter() - start_time
+
+            start_time = time.perf_counter()
+            loaded_graph = snapshot.read_graph(path)
+            load_time = time.perf_counter() - start_time
+
+            results[name] = (save_time, load_time, os.path.getsize(path))
+            print(
+                f'{name:<10}{save_time:>10.3f}{load_time:>10.3f}'
+                f'{os.path.getsize(path) / 2**20:>11.2f}'
+                f'  {nx.utils.graphs_equal(graph, loaded_graph)}'
+            )
+
+    return results
+
+
+def benchmark_mutation_log(reviews):
+    """
+    Time to build a graph with add_edges_bulk while logging (one fsync per attraction),
+    size of the resulting log and time to replay it into an empty graph, checking the
+    replayed graph is identical.
+    """
+    with scratch_network():
+        start_time = time.perf_counter()
+        build_with_add_edges_bulk(reviews)
+        build_time = time.perf_counter() - start_time
+        graph = network.AttractionSentimentNet
+        log_size = network.mutation_log.size
+
+        network.AttractionSentimentNet = nx.Graph()
+        network.emotions_dict.clear()
+        network.network_stats.reset()
+        network.network_index.reset()
+        start_time = time.perf_counter()
+        network.replay_mutation_log()
+        replay_time = time.perf_counter() - start_time
+        same_graph = nx.utils.graphs_equal(graph, network.AttractionSentimentNet)
+
+    print(
+        f'build (s): {build_time:.3f}\nlog size (MB): {log_size / 2**20:.2f}\n'
+        f'replay (s): {replay_time:.3f}\nidentical graphs: {same_graph}'
+    )
+
+    return build_time, log_size, replay_time, same_graph
+
+
+def benchmark_network_info(reviews):
+    """
+    Time to get the network information from the incrementally maintained statistics
+    and by recomputing them from the whole graph, checking both give the same values.
+    """
+    with scratch_network():
+        build_with_add_edges_bulk(reviews)
+        graph = network.AttractionSentimentNet
+
+        start_time = time.perf_counter()
+        incremental_info = network.network_stats.as_info(graph)
+        incremental_time = time.perf_counter() - start_time
+
+        start_time = time.perf_counter()
+        rebuilt_stats = stats.NetworkStats()
+        rebuilt_stats.rebuild(graph)
+        rebuilt_info = rebuilt_stats.as_info(graph)
+        rebuild_time = time.perf_counter() - start_time
+
+        # Ties for the highest degree or weight may pick different nodes, so only
+        # the degree or weight of those entries is compared
+        def comparable(info):
+            return {
+                key: {'degree': value.get('degree'), 'weight': value.get('weight')}
+                if key.startswith('highest')
+                else value
+                for key, value in info.items()
+            }
+
+        same_info = comparable(incremental_info) == comparable(rebuilt_info)
+
+    print(
+        f'{graph.number_of_nodes()} nodes, {graph.number_of_edges()} edges\n'
+        f'incremental (ms): {incremental_time * 1000:.3f}\n'
+        f'full recompute (ms): {rebuild_time * 1000:.3f}\nsame values: {same_info}'
+    )
+
+    return incremental_time, rebuild_time, same_info
+
+
+def benchmark_analytics(reviews, k: int = 10):
+    """
+    Time of each sparse matrix analysis on a synthetic graph, checking the weighted
+    degrees against NetworkX and the similarities of one attraction against a plain
+    Python cosine similarity.
+    """
+    with scratch_network():
+        build_with_add_edges_bulk(reviews)
+        graph = network.AttractionSentimentNet
+        print(f'{graph.number_of_nodes()} nodes, {graph.number_of_edges()} edges')
+
+        timings = {}
+        start_time = time.perf_counter()
+        matrices = analytics.get_matrices()
+        timings['build matrices'] = time.perf_counter() - start_time
+        for name, analysis in [
+            ('top-k similar (all)', lambda: analytics.top_k_similar_all(k, matrices)),
+            (
+                'top-k similar (one)',
+                lambda: analytics.top_k_similar(reviews[0][0].id, k, matrices),
+            ),
+            (
+                'country profiles',
+                lambda: analytics.emotion_profiles('country', matrices),
+            ),
+            ('city profiles', lambda: analytics.emotion_profiles('city', matrices)),
+            (
+                'degree ranking',
+                lambda: analytics.weighted_degree_ranking('adjective', 10, matrices),
+            ),
+        ]:
+            start_time = time.perf_counter()
+            analysis()
+            timings[name] = time.perf_counter() - start_time
+
+        ranking = analytics.weighted_degree_ranking(matrices=matrices)
+        same_degrees = all(
+            ranking.loc[node, 'weighted_degree'] == degree
+            for node, degree in graph.degree(ranking.index, weight='weight')
+        )
+
+        attraction_id = reviews[0][0].id
+        weights = {
+            emotion: data['weight'] for emotion, data in graph[attraction_id].items()
+        }
+        norm = math.sqrt(sum(weight**2 for weight in weights.values()))
+        expected = {}
+        for other in matrices.attraction_ids:
+            if other == attraction_id:
+                continue
+            other_weights = graph[other]
+            dot = sum(
+                weight * other_weights[emotion]['weight']
+                for emotion, weight in weights.items()
+                if emotion in other_weights
+            )
+            other_norm = math.sqrt(
+                sum(data['weight'] ** 2 for data in other_weights.values())
+            )
+            expected[other] = dot / (norm * other_norm)
+        all_indexes, all_similarities = analytics.top_k_similar_all(k, matrices)
+        row = matrices.attraction_index[attraction_id]
+        same_similarities = (
+            all(
+                math.isclose(similarity, expected[matrices.attraction_ids[index]])
+                for index, similarity in zip(all_indexes[row], all_similarities[row])
+            )
+            and all(
+                math.isclose(similarity, expected[other])
+                for other, similarity in analytics.top_k_similar(
+                    attraction_id, k, matrices
+                )
+            )
+            and math.isclose(
+                max(expected.values()),
+                analytics.top_k_similar(attraction_id, 1, matrices)[0][1],
+            )
+        )
+
+    for name, elapsed in timings.items():
+        print(f'{name:<22}{elapsed:>10.3f} s')
+    print(
+        f'same weighted degrees: {same_degrees}\nsame similarities: {same_similarities}'
+    )
+
+    return timings, same_degrees, same_similarities
+
+
+def scan_top_attractions(emotion: str, country: str, start: str, top: int):
+    """top_attractions without the indexes: a pass over every node and edge."""
+    graph = network.AttractionSentimentNet
+    totals = {}
+    for source, target, edge in graph.edges(data=True):
+        if graph.nodes[source]['type'] != 'attraction':
+            source, target = target, source
+        if (
+            graph.nodes[source]['location']['country'] != country
+            or graph.nodes[target].get('associated_emotion') != emotion
+        ):
+            continue
+        count, weight = temporal.activity_between(edge, start)
+        if count:
+            totals[source] = totals.get(source, 0) + weight
+
+    return sorted(totals.items(), key=lambda item: -item[1])[:top]
+
+
+def benchmark_queries(reviews, top: int = 10):
+    """
+    Time of an indexed top_attractions query (an emotion in a country since a month)
+    and of the same query scanning the whole graph, checking both agree.
+    """
+    emotion, country, start = EMOTIONS[0], 'Country 0', '2020-01'
+    with scratch_network():
+        build_with_add_edges_bulk(reviews)
+
+        start_time = time.perf_counter()
+        result = query.top_attractions(emotion, country=country, start=start, top=top)
+        indexed_time = time.perf_counter() - start_time
+
+        start_time = time.perf_counter()
+        expected = scan_top_attractions(emotion, country, start, top)
+        scan_time = time.perf_counter() - start_time
+
+    same_results = list(result['weight']) == [weight for _, weight in expected]
+    print(
+        f'indexed query (ms): {indexed_time * 1000:.3f}\n'
+        f'full scan (ms): {scan_time * 1000:.3f}\nsame results: {same_results}'
+    )
+
+    return indexed_time, scan_time, same_results
+
+
+def synthetic_world(countries: int = 25):
+    """A grid of square countries named like synthetic_location ones."""
+    import geopandas as gpd
+    from shapely.geometry import box
+
+    columns = math.ceil(math.sqrt(countries))
+    return gpd.GeoDataFrame(
+        {'NAME': [f'Country {i}' for i in range(countries)]},
+        geometry=[
+            box(
+                -180 + (i % columns) * 360 / columns,
+                -90 + (i // columns) * 180 / columns,
+                -180 + (i % columns + 1) * 360 / columns,
+                -90 + (i // columns + 1) * 180 / columns,
+            )
+            for i in range(countries)
+        ],
+    )
+
+
+def benchmark_plots(reviews):
+    """
+    Time to render the degree distribution and the world map (over synthetic
+    countries, nothing is downloaded) of a synthetic graph to PNG, against drawing
+    the attractions with one scatter call each, checking the degree counts match
+    NetworkX.
+    """
+    import matplotlib
+
+    matplotlib.use('Agg')
+    import matplotlib.pyplot as plt
+
+    with scratch_network():
+        build_with_add_edges_bulk(reviews)
+        graph = network.AttractionSentimentNet
+        rng = random.Random(0)
+        for data in graph.nodes.values():
+            if data['type'] == 'attraction':
+                data['location']['longitude'] = rng.uniform(-180, 180)
+                data['location']['latitude'] = rng.uniform(-90, 90)
+
+        world = synthetic_world()
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'plot.png')
+            start_time = time.perf_counter()
+            plotting.plot_degree_distribution(graph, path)
+            degrees_time = time.perf_counter() - start_time
+
+            start_time = time.perf_counter()
+            plotting.plot_world_map_with_tooltips(graph, path, world)
+            map_time = time.perf_counter() - start_time
+
+            start_time = time.perf_counter()
+            longitudes, latitudes, _ = plotting.attraction_points(graph)
+            fig, ax = plt.subplots(figsize=(12, 6))
+            world.plot(ax=ax, color='lightgray', edgecolor='black', linewidth=0.35)
+            for longitude, latitude in zip(longitudes, latitudes):
+                ax.scatter(longitude, latitude, s=2.5, color='black')
+            fig.savefig(path, dpi=150)
+            plt.close(fig)
+            per_point_time = time.perf_counter() - start_time
+
+        counts = plotting.degree_counts(graph)
+        expected = nx.degree_histogram(graph)
+        same_counts = list(counts[: len(expected)]) == expected and not any(
+            counts[len(expected) :]
+        )
+
+    print(
+        f'attractions: {len(longitudes)}\n'
+        f'degree distribution (s): {degrees_time:.3f}\n'
+        f'world map (s): {map_time:.3f}\n'
+        f'world map, one scatter per attraction (s): {per_point_time:.3f}\n'
+        f'same degree counts: {same_counts}'
+    )
+
+    return degrees_time, map_time, same_counts
+
+
+def traced(function, *args):
+    """Seconds and peak traced memory (bytes) of a call."""
+    tracemalloc.start()
+    start_time = time.perf_counter()
+    function(*args)
+    elapsed = time.perf_counter() - start_time
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return elapsed, peak
+
+
+def benchmark_export(reviews, min_count: int = 5):
+    """
+    Time and peak memory of a GEXF export with the NetworkX writer (as
+    export_graph does) and with the streaming exporter from the graph and from a
+    snapshot, checking the streamed files read back with the same nodes, edges,
+    weights and locations. Also checks the edges kept by a `min_count` filter.
+    """
+
+    def networkx_gexf(path):
+        nx.write_gexf(snapshot.to_text_format_graph(graph, gexf=True), path)
+
+    def streamed_from_snapshot(path):
+        with export.snapshot_source(snapshot_path) as source:
+            export.export_source(source, path)
+
+    with scratch_network(), tempfile.TemporaryDirectory() as directory:
+        build_with_add_edges_bulk(reviews)
+        graph = network.AttractionSentimentNet
+        snapshot_path = os.path.join(directory, 'graph.npz')
+        snapshot.save_snapshot(graph, snapshot_path)
+
+        print(f'{"exporter":<28}{"seconds":>10}{"peak MB":>10}')
+        paths = {}
+        for name, extension, function in [
+            ('networkx gexf', '.gexf', networkx_gexf),
+            (
+                'streamed gexf (graph)',
+                '.gexf',
+                lambda path: export.export_source(export.graph_source(graph), path),
+            ),
+            ('streamed gexf (snapshot)', '.gexf', streamed_from_snapshot),
+            (
+                'streamed graphml (graph)',
+                '.graphml',
+                lambda path: export.export_source(export.graph_source(graph), path),
+            ),
+        ]:
+            paths[name] = os.path.join(directory, f'{len(paths)}{extension}')
+            elapsed, peak = traced(function, paths[name])
+            print(f'{name:<28}{elapsed:>10.3f}{peak / 2**20:>10.1f}')
+
+        def same_graph(exported: nx.Graph) -> bool:
+            return (
+                exported.number_of_nodes() == graph.number_of_nodes()
+                and exported.number_of_edges() == graph.number_of_edges()
+                and all(
+                    float(exported[source][target]['weight']) == data['weight']
+                    for source, target, data in graph.edges(data=True)
+                )
+                and all(
+                    exported.nodes[node].get('location.city')
+                    == data.get('location', {}).get('city')
+                    for node, data in graph.nodes.items()
+                )
+            )
+
+        same_graphs = all(
+            same_graph(nx.read_gexf(paths[name]))
+            for name in ['streamed gexf (graph)', 'streamed gexf (snapshot)']
+        ) and same_graph(nx.read_graphml(paths['streamed graphml (graph)']))
+
+        filtered_path = os.path.join(directory, 'filtered.gexf')
+        _, num_edges = export.export_source(
+            export.graph_source(graph), filtered_path, min_count=min_count
+        )
+        expected_edges = sum(
+            1 for *_, count in graph.edges(data='count') if count >= min_count
+        )
+        same_filter = (
+            num_edges == expected_edges
+            and nx.read_gexf(filtered_path).number_of_edges() == expected_edges
+        )
+
+    print(f'same graphs: {same_graphs}\nfiltered edges match: {same_filter}')
+
+    return same_graphs and same_filter
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Network benchmarks')
+    parser.add_argument(
+        'benchmark',
+        choices=[
+            'bulk',
+            'snapshot',
+            'wal',
+            'info',
+            'analytics',
+            'query',
+            'plots',
+            'export',
+        ],
+    )
+    parser.add_argument('--attractions', type=int, default=50)
+    parser.add_argument(
+        '--occurrences',
+        type=int,
+        default=5000,
+        help='adjective occurrences per attraction',
+    )
+    parser.add_argument('--vocabulary', type=int, default=2000)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    reviews = generate_reviews(
+        args.attractions, args.occurrences, args.vocabulary, args.seed
+    )
+    if args.benchmark == 'bulk':
+        benchmark_bulk_ingestion(reviews)
+    elif args.benchmark == 'snapshot':
+        benchmark_snapshot(reviews)
+    elif args.benchmark == 'wal':
+        benchmark_mutation_log(reviews)
+    elif args.benchmark == 'info':
+        benchmark_network_info(reviews)
+    elif args.benchmark == 'analytics':
+        benchmark_analytics(reviews)
+    elif args.benchmark == 'query':
+        benchmark_queries(reviews)
+    elif args.benchmark == 'plots':
+        benchmark_plots(reviews)
+    elif args.benchmark == 'export':
+        benchmark_export(reviews)
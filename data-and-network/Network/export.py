@@ -0,0 +1,441 @@
+import argparse
+from contextlib import contextmanager
+from dataclasses import dataclass
+import logging
+import os
+from typing import Callable, Dict, Hashable, Iterator, Optional, Set, Tuple
+from xml.sax.saxutils import escape, quoteattr
+
+import networkx as nx
+import numpy as np
+
+import Network.main as network
+import Network.snapshot as snapshot
+import Network.temporal as temporal
+
+logger = logging.getLogger(os.getenv('DATA_NETWORK_LOGGER', 'data-and-network'))
+
+# Rows of a snapshot decoded at once when exporting from it
+SNAPSHOT_CHUNK_ROWS = 50_000
+# Monthly aggregates of the edges (see Network.temporal), left out unless requested
+TIMELINE_KEYS = (
+    temporal.MONTHS_KEY,
+    temporal.MONTH_COUNTS_KEY,
+    temporal.MONTH_WEIGHTS_KEY,
+)
+# Separator of flattened lists ('tourist_attraction|museum')
+LIST_SEPARATOR = '|'
+
+Node = Tuple[Hashable, Dict]
+Edge = Tuple[Hashable, Hashable, Dict]
+
+
+@dataclass
+class ExportSource:
+    """Nodes and edges to export, each function starts a new pass over them."""
+
+    nodes: Callable[[], Iterator[Node]]
+    edges: Callable[[], Iterator[Edge]]
+
+
+def graph_source(graph: nx.Graph) -> ExportSource:
+    return ExportSource(
+        nodes=lambda: iter(graph.nodes.items()),
+        edges=lambda: graph.edges(data=True),
+    )
+
+
+@contextmanager
+def snapshot_source(path: str):
+    """
+    Source reading a graph snapshot (see Network.snapshot) without building the
+    graph: only its compact arrays are loaded and attributes are decoded in chunks
+    of SNAPSHOT_CHUNK_ROWS rows.
+    """
+    with np.load(path, allow_pickle=False) as data:
+        if int(data['version']) > snapshot.SNAPSHOT_VERSION:
+            raise ValueError(f'Unsupported graph snapshot version in {path}')
+        nodes = data['nodes']
+        sources, targets = data['sources'], data['targets']
+        node_columns = snapshot.load_columns(data, 'node')
+        edge_columns = snapshot.load_columns(data, 'edge')
+
+        def iter_nodes():
+            rows = snapshot.iter_attribute_rows(
+                node_columns, len(nodes), SNAPSHOT_CHUNK_ROWS
+            )
+            for start in range(0, len(nodes), SNAPSHOT_CHUNK_ROWS):
+                for node in nodes[start : start + SNAPSHOT_CHUNK_ROWS].tolist():
+                    yield node, next(rows)
+
+        def iter_edges():
+            rows = snapshot.iter_attribute_rows(
+                edge_columns, len(sources), SNAPSHOT_CHUNK_ROWS
+            )
+            for start in range(0, len(sources), SNAPSHOT_CHUNK_ROWS):
+                end = start + SNAPSHOT_CHUNK_ROWS
+                for source, target in zip(
+                    nodes[sources[start:end]].tolist(),
+                    nodes[targets[start:end]].tolist(),
+                ):
+                    yield source, target, next(rows)
+
+        yield ExportSource(nodes=iter_nodes, edges=iter_edges)
+
+
+def flatten_attributes(data: Dict, timeline: bool = False, prefix: str = '') -> Dict:
+    """
+    Attributes as flat scalar columns: nested dicts become dotted names
+    ('location.city'), lists are joined with LIST_SEPARATOR and None values are left
+    out. Monthly aggregates are left out unless `timeline`, months then become ISO
+    labels.
+    """
+    flat = {}
+    for key, value in data.items():
+        if not prefix and key in TIMELINE_KEYS:
+            if not timeline:
+                continue
+            if key == temporal.MONTHS_KEY:
+                value = [
+                    temporal.month_label(month) for month in temporal.as_list(value)
+                ]
+        name = f'{prefix}{key}'
+        if value is None:
+            continue
+        elif isinstance(value, dict):
+            flat.update(flatten_attributes(value, timeline, f'{name}.'))
+        elif isinstance(value, (list, tuple)):
+            flat[name] = LIST_SEPARATOR.join(str(item) for item in value)
+        elif isinstance(value, np.generic):
+            flat[name] = value.item()
+        else:
+            flat[name] = value
+
+    return flat
+
+
+def value_type(value) -> str:
+    if isinstance(value, bool):
+        return 'boolean'
+    elif isinstance(value, int):
+        return 'long'
+    elif isinstance(value, float):
+        return 'double'
+    return 'string'
+
+
+def merge_type(current: Optional[str], value) -> str:
+    """Narrowest type holding the values of a column so far."""
+    new = value_type(value)
+    if current is None or current == new:
+        return new
+    if {current, new} == {'long', 'double'}:
+        return 'double'
+    return 'string'
+
+
+def format_value(value, value_type: str) -> str:
+    if value_type == 'boolean':
+        return 'true' if value else 'false'
+    elif value_type == 'double':
+        return repr(float(value))
+    return str(value)
+
+
+def edge_filter(
+    min_weight: Optional[float], min_count: Optional[int]
+) -> Callable[[Dict], bool]:
+    def keep(data: Dict) -> bool:
+        return (min_weight is None or data.get('weight', 0) >= min_weight) and (
+            min_count is None or data.get('count', 0) >= min_count
+        )
+
+    return keep
+
+
+def scan_schema(
+    source: ExportSource,
+    keep_edge: Callable[[Dict], bool],
+    timeline: bool,
+    filtered: bool,
+) -> Tuple[Dict[str, str], Dict[str, str], Optional[Set[Hashable]]]:
+    """
+    Types of the flattened node and edge columns (in first seen order) and, when
+    edges are filtered, the nodes with at least one kept edge.
+    """
+    node_types: Dict[str, str] = {}
+    edge_types: Dict[str, str] = {}
+    kept_nodes = set() if filtered else None
+    for node, other, data in source.edges():
+        if not keep_edge(data):
+            continue
+        if filtered:
+            kept_nodes.update((node, other))
+        for key, value in flatten_attributes(data, timeline).items():
+            edge_types[key] = merge_type(edge_types.get(key), value)
+
+    for node, data in source.nodes():
+        if kept_nodes is not None and node not in kept_nodes:
+            continue
+        for key, value in flatten_attributes(data).items():
+            node_types[key] = merge_type(node_types.get(key), value)
+
+    return node_types, edge_types, kept_nodes
+
+
+class GexfWriter:
+    """GEXF 1.2 (Gephi), with the edge weight as the edge weight Gephi reads."""
+
+    def __init__(self, file, node_types: Dict[str, str], edge_types: Dict[str, str]):
+        self.file = file
+        self.node_types = node_types
+        self.node_ids = {key: str(index) for index, key in enumerate(node_types)}
+        self.edge_types = {
+            key: kind for key, kind in edge_types.items() if key != 'weight'
+        }
+        self.edge_ids = {key: str(index) for index, key in enumerate(self.edge_types)}
+        self.edges = 0
+
+    def write_attributes(self, element_class: str, types: Dict[str, str], ids: Dict):
+        self.file.write(f'    <attributes class="{element_class}" mode="static">\n')
+        for key, kind in types.items():
+            self.file.write(
+                f'      <attribute id="{ids[key]}" title={quoteattr(key)} '
+                f'type="{kind}" />\n'
+            )
+        self.file.write('    </attributes>\n')
+
+    def write_attvalues(self, attributes: Dict, types: Dict[str, str], ids: Dict):
+        values = [
+            f'<attvalue for="{ids[key]}" '
+            f'value={quoteattr(format_value(value, types[key]))} />'
+            for key, value in attributes.items()
+            if key in ids
+        ]
+        if values:
+            self.file.write(f'<attvalues>{"".join(values)}</attvalues>')
+
+    def start(self):
+        self.file.write(
+            '<?xml version="1.0" encoding="utf-8"?>\n'
+            '<gexf xmlns="http://www.gexf.net/1.2draft" version="1.2">\n'
+            '  <graph defaultedgetype="undirected" mode="static">\n'
+        )
+        self.write_attributes('node', self.node_types, self.node_ids)
+        self.write_attributes('edge', self.edge_types, self.edge_ids)
+
+    def start_nodes(self):
+        self.file.write('    <nodes>\n')
+
+    def node(self, node: Hashable, attributes: Dict):
+        label = attributes.get('name', node)
+        self.file.write(
+            f'      <node id={quoteattr(str(node))} label={quoteattr(str(label))}>'
+        )
+        self.write_attvalues(attributes, self.node_types, self.node_ids)
+        self.file.write('</node>\n')
+
+    def start_edges(self):
+        self.file.write('    </nodes>\n    <edges>\n')
+
+    def edge(self, source: Hashable, target: Hashable, attributes: Dict):
+        weight = attributes.get('weight')
+        weight = (
+            f' weight="{format_value(weight, "double")}"' if weight is not None else ''
+        )
+        self.file.write(
+            f'      <edge id="{self.edges}" source={quoteattr(str(source))} '
+            f'target={quoteattr(str(target))}{weight}>'
+        )
+        self.write_attvalues(attributes, self.edge_types, self.edge_ids)
+        self.file.write('</edge>\n')
+        self.edges += 1
+
+    def end(self):
+        self.file.write('    </edges>\n  </graph>\n</gexf>\n')
+
+
+class GraphMLWriter:
+    def __init__(self, file, node_types: Dict[str, str], edge_types: Dict[str, str]):
+        self.file = file
+        self.node_types = node_types
+        self.edge_types = edge_types
+        self.node_ids = {key: f'n{index}' for index, key in enumerate(node_types)}
+        self.edge_ids = {key: f'e{index}' for index, key in enumerate(edge_types)}
+
+    def write_data(self, attributes: Dict, types: Dict[str, str], ids: Dict):
+        for key, value in attributes.items():
+            if key in ids:
+                self.file.write(
+                    f'<data key="{ids[key]}">'
+                    f'{escape(format_value(value, types[key]))}</data>'
+                )
+
+    def start(self):
+        self.file.write(
+            '<?xml version="1.0" encoding="utf-8"?>\n'
+            '<graphml xmlns="http://graphml.graphdrawing.org/xmlns">\n'
+        )
+        for element, types, ids in (
+            ('node', self.node_types, self.node_ids),
+            ('edge', self.edge_types, self.edge_ids),
+        ):
+            for key, kind in types.items():
+                self.file.write(
+                    f'  <key id="{ids[key]}" for="{element}" '
+                    f'attr.name={quoteattr(key)} attr.type="{kind}" />\n'
+                )
+        self.file.write('  <graph edgedefault="undirected">\n')
+
+    def start_nodes(self):
+        pass
+
+    def node(self, node: Hashable, attributes: Dict):
+        self.file.write(f'    <node id={quoteattr(str(node))}>')
+        self.write_data(attributes, self.node_types, self.node_ids)
+        self.file.write('</node>\n')
+
+    def start_edges(self):
+        pass
+
+    def edge(self, source: Hashable, target: Hashable, attributes: Dict):
+        self.file.write(
+            f'    <edge source={quoteattr(str(source))} target={quoteattr(str(target))}>'
+        )
+        self.write_data(attributes, self.edge_types, self.edge_ids)
+        self.file.write('</edge>\n')
+
+    def end(self):
+        self.file.write('  </graph>\n</graphml>\n')
+
+
+WRITERS = {'.gexf': GexfWriter, '.graphml': GraphMLWriter}
+
+
+def export_source(
+    source: ExportSource,
+    path: str,
+    min_weight: float = None,
+    min_count: int = None,
+    timeline: bool = False,
+) -> Tuple[int, int]:
+    """
+    Writes the nodes and edges of `source` to a GEXF (.gexf) or GraphML (.graphml)
+    file one element at a time, with flattened typed attributes (see
+    flatten_attributes). Edges below `min_weight` or `min_count` are left out, and
+    so are the nodes left without edges. Returns the number of nodes and edges
+    written.
+    """
+    extension = os.path.splitext(path)[1].lower()
+    if extension not in WRITERS:
+        raise ValueError(f'Unsupported export format: {path}')
+
+    keep_edge = edge_filter(min_weight, min_count)
+    filtered = min_weight is not None or min_count is not None
+    # First pass for the attribute declarations, which come before the elements
+    node_types, edge_types, kept_nodes = scan_schema(
+        source, keep_edge, timeline, filtered
+    )
+
+    num_nodes = num_edges = 0
+    temporary_path = f'{path}.tmp'
+    with open(temporary_path, 'w', encoding='utf-8') as file:
+        writer = WRITERS[extension](file, node_types, edge_types)
+        writer.start()
+        writer.start_nodes()
+        for node, data in source.nodes():
+            if kept_nodes is None or node in kept_nodes:
+                writer.node(node, flatten_attributes(data))
+                num_nodes += 1
+        writer.start_edges()
+        for node, target, data in source.edges():
+            if keep_edge(data):
+                writer.edge(node, target, flatten_attributes(data, timeline))
+                num_edges += 1
+        writer.end()
+    os.replace(temporary_path, path)
+
+    logger.info(f'Exported {num_nodes} nodes and {num_edges} edges to {path}')
+    return num_nodes, num_edges
+
+
+def unsaved_mutations(snapshot_path: str) -> int:
+    """
+    Mutations logged in the network mutation log after the saved snapshot, missing
+    from it. Always 0 for other snapshots (shards, copies...).
+    """
+    if not (
+        os.path.exists(network.EXISTING_SNAPSHOT_PATH)
+        and os.path.samefile(snapshot_path, network.EXISTING_SNAPSHOT_PATH)
+    ):
+        return 0
+    snapshot_sequence = snapshot.load_metadata(snapshot_path).get('wal_sequence', 0)
+
+    return network.mutation_log.count_after(snapshot_sequence)
+
+
+def export_network(
+    path: str,
+    snapshot_path: str = None,
+    min_weight: float = None,
+    min_count: int = None,
+    timeline: bool = False,
+    allow_stale: bool = False,
+) -> Tuple[int, int]:
+    """
+    Exports the network (see export_source), or the graph snapshot in
+    `snapshot_path` without loading it. The saved snapshot misses the mutations
+    logged after it (see Network.wal): exporting it then raises a ValueError, or
+    only logs a warning with `allow_stale`.
+    """
+    if snapshot_path is None:
+        return export_source(
+            graph_source(network.get_graph()), path, min_weight, min_count, timeline
+        )
+
+    pending_mutations = unsaved_mutations(snapshot_path)
+    if pending_mutations:
+        message = (
+            f'{snapshot_path} misses {pending_mutations} graph mutations logged in '
+            f'{network.mutation_log.path}. Export without --snapshot to include them.'
+        )
+        if not allow_stale:
+            raise ValueError(message)
+        logger.warning(message)
+
+    with snapshot_source(snapshot_path) as source:
+        return export_source(source, path, min_weight, min_count, timeline)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description='Streaming GEXF/GraphML export of the network'
+    )
+    parser.add_argument('path', help='output file (.gexf or .graphml)')
+    parser.add_argument(
+        '--snapshot',
+        nargs='?',
+        const=network.EXISTING_SNAPSHOT_PATH,
+        help='export a graph snapshot (the saved one by default) without loading it. '
+        'Refused when graph.wal holds mutations newer than the saved snapshot',
+    )
+    parser.add_argument(
+        '--allow-stale',
+        action='store_true',
+        help='export the saved snapshot even if graph.wal holds newer mutations',
+    )
+    parser.add_argument('--min-weight', type=float)
+    parser.add_argument('--min-count', type=int)
+    parser.add_argument(
+        '--timeline', action='store_true', help='include the monthly aggregates'
+    )
+    args = parser.parse_args()
+
+    export_network(
+        args.path,
+        args.snapshot,
+        args.min_weight,
+        args.min_count,
+        args.timeline,
+        args.allow_stale,
+    )
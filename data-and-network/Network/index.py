@@ -0,0 +1,105 @@
+from bisect import bisect_left, bisect_right, insort
+from typing import Dict, Hashable, Iterable, List, Optional, Set, Tuple
+
+import networkx as nx
+
+import Network.temporal as temporal
+
+LOCATION_LEVELS = ('continent', 'country', 'city')
+
+Edge = Tuple[Hashable, Hashable]
+
+
+def index_key(value: str) -> str:
+    return value.strip().casefold()
+
+
+class NetworkIndex:
+    """
+    Secondary indexes of the network, kept up to date by the graph update functions
+    like the network statistics: attractions by continent, country and city (case
+    insensitive), adjectives by associated emotion and (attraction, adjective) edges by
+    month with reviews. As with the statistics, anything that removes nodes or edges
+    or replaces the graph must call `rebuild` afterwards.
+    """
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self.attractions_by_location: Dict[str, Dict[str, Set[Hashable]]] = {
+            level: {} for level in LOCATION_LEVELS
+        }
+        self.adjectives_by_emotion: Dict[str, Set[Hashable]] = {}
+        self.edges_by_month: Dict[int, Set[Edge]] = {}
+        # Sorted keys of edges_by_month, for month ranges
+        self._months: List[int] = []
+
+    def rebuild(self, graph: nx.Graph):
+        """Rebuilds every index from `graph`."""
+        self.reset()
+        for node, data in graph.nodes.items():
+            self.node_added(node, data)
+        for source, target, data in graph.edges(data=True):
+            if graph.nodes[source].get('type') != 'attraction':
+                source, target = target, source
+            self.edge_months_added(source, target, temporal.get_timeline(data)[0])
+
+    def node_added(self, node: Hashable, attributes: Dict):
+        if attributes.get('type') == 'attraction':
+            location = attributes.get('location') or {}
+            for level in LOCATION_LEVELS:
+                if location.get(level):
+                    self.attractions_by_location[level].setdefault(
+                        index_key(location[level]), set()
+                    ).add(node)
+        elif attributes.get('associated_emotion'):
+            self.adjectives_by_emotion.setdefault(
+                index_key(attributes['associated_emotion']), set()
+            ).add(node)
+
+    def edge_months_added(
+        self, attraction_id: Hashable, emotion_id: Hashable, months: Iterable[int]
+    ):
+        """Months (indexes, see temporal.month_index) with reviews of an edge."""
+        for month in months:
+            if month not in self.edges_by_month:
+                self.edges_by_month[month] = set()
+                insort(self._months, month)
+            self.edges_by_month[month].add((attraction_id, emotion_id))
+
+    def attractions_in(
+        self, continent: str = None, country: str = None, city: str = None
+    ) -> Optional[Set[Hashable]]:
+        """Attractions in every given location, None when no location is given."""
+        attractions = None
+        for level, value in zip(LOCATION_LEVELS, (continent, country, city)):
+            if value is None:
+                continue
+            matches = self.attractions_by_location[level].get(index_key(value), set())
+            attractions = matches if attractions is None else attractions & matches
+
+        return attractions
+
+    def adjectives_of(self, emotion: str) -> Set[Hashable]:
+        """Adjectives associated with an emotion (case insensitive)."""
+        return self.adjectives_by_emotion.get(index_key(emotion), set())
+
+    def edges_between(self, start: str = None, end: str = None) -> Set[Edge]:
+        """
+        (attraction, adjective) edges with reviews between the months of the ISO dates
+        `start` and `end` (both included, open when None).
+        """
+        first = (
+            bisect_left(self._months, temporal.bound_month_index(start)) if start else 0
+        )
+        last = (
+            bisect_right(self._months, temporal.bound_month_index(end))
+            if end
+            else len(self._months)
+        )
+
+        edges = set()
+        for month in self._months[first:last]:
+            edges |= self.edges_by_month[month]
+        return edges
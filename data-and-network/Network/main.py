@@ -1,19 +1,26 @@
+import csv
 from dataclasses import dataclass
+import hashlib
 import json
 import logging
 import os
-from typing import Dict
+from typing import TYPE_CHECKING, Dict, List, Sequence, Tuple
 
 from dacite import from_dict
-import geopandas as gpd
-from matplotlib.patches import Rectangle
-import matplotlib.pyplot as plt
 import networkx as nx
+import numpy as np
 
-from PlacesAPI.main import Place
+import Network.index as index
+import Network.snapshot as snapshot
+import Network.stats as stats
+import Network.temporal as temporal
+import Network.wal as wal
 import Sentiments.main as Sentiments
 import Shared.main as utils
 
+if TYPE_CHECKING:
+    from PlacesAPI.main import Place
+
 logger = logging.getLogger(os.getenv('DATA_NETWORK_LOGGER', 'data-and-network'))
 
 
@@ -34,26 +41,133 @@ class Emotion:
 
 MODULE_PATH = os.path.dirname(os.path.realpath(__file__))
 
+# The graph is saved as a binary snapshot (see Network.snapshot), GML and GEXF are
+# only used for imports and exports
+EXISTING_SNAPSHOT_PATH = os.path.join(MODULE_PATH, 'graph.npz')
 EXISTING_GRAPH_PATH = os.path.join(MODULE_PATH, 'graph.gml')
 GEXT_GRAPH_PATH = os.path.join(MODULE_PATH, 'graph.gexf')
 EXISTING_EMOTIONS_PATH = os.path.join(MODULE_PATH, 'emotions.json')
+RAW_REVIEW_DATES_PATH = os.path.join(MODULE_PATH, 'review_dates.csv')
+MUTATION_LOG_PATH = os.path.join(MODULE_PATH, 'graph.wal')
+
+# Graph mutations since the last snapshot are appended to MUTATION_LOG_PATH (see
+# Network.wal) and replayed on import. The log is fsynced every
+# NETWORK_WAL_SYNC_RECORDS records or NETWORK_WAL_SYNC_SECONDS seconds (and after
+# each bulk insert), a snapshot is saved once it reaches NETWORK_WAL_CHECKPOINT_BYTES
+NETWORK_WAL_SYNC_RECORDS = int(os.getenv('NETWORK_WAL_SYNC_RECORDS', 1000))
+NETWORK_WAL_SYNC_SECONDS = float(os.getenv('NETWORK_WAL_SYNC_SECONDS', 1.0))
+NETWORK_WAL_CHECKPOINT_BYTES = int(
+    os.getenv('NETWORK_WAL_CHECKPOINT_BYTES', 64 * 2**20)
+)
+
+# Off while a caller takes the snapshots itself at points consistent with its own
+# progress (see Pipeline.checkpoints.checkpoint_pipeline), so none holds unfinished work
+automatic_checkpoints = True
+
+# Edges only keep monthly aggregates (see Network.temporal), the raw date of each
+# review is also appended to RAW_REVIEW_DATES_PATH when this is set
+KEEP_RAW_REVIEW_DATES = bool(os.getenv('NETWORK_KEEP_RAW_REVIEW_DATES'))
+RAW_REVIEW_DATES_COLUMNS = ['attraction_id', 'emotion_id', 'review_date', 'weight']
 
 NETWORK_INFO_PATH = os.path.join(MODULE_PATH, '..', '..', 'network_info.json')
 
-AttractionSentimentNet = nx.Graph()
-emotions_dict: Dict[str, Emotion] = {}
+# Raw review dates not yet appended to RAW_REVIEW_DATES_PATH
+pending_raw_review_dates: List[Tuple[str, str, str, int]] = []
+# Ids of the shards merged into the network (see Network.shards), saved in the
+# snapshot metadata so a shard is never merged twice
+merged_shard_ids: List[str] = []
+mutation_log = wal.MutationLog(
+    MUTATION_LOG_PATH, NETWORK_WAL_SYNC_RECORDS, NETWORK_WAL_SYNC_SECONDS
+)
+# Kept up to date by the graph update functions below (see save_network_info and
+# Network.query), rebuilt on load
+network_stats = stats.NetworkStats()
+network_index = index.NetworkIndex()
+
+
+def load_emotions() -> Dict[str, Emotion]:
+    emotions = {}
+    if (
+        os.path.exists(EXISTING_EMOTIONS_PATH)
+        and os.path.getsize(EXISTING_EMOTIONS_PATH) > 0
+    ):
+        with open(EXISTING_EMOTIONS_PATH, 'r', encoding='utf-8') as f:
+            adjectives = json.load(f)
+            for adjective in adjectives:
+                processed_adjective = from_dict(data_class=Emotion, data=adjective)
+                emotions[processed_adjective.name] = processed_adjective
+
+    return emotions
+
+
+def load(path: str = None, backend: str = None) -> nx.Graph:
+    """
+    Loads the graph and the emotions, replacing the loaded ones. By default loads the
+    saved network: the snapshot (or the GML graph of older runs) with the mutations
+    logged after it replayed. With `path`, that file is read instead, as `backend`
+    ('npz', 'gml' or 'gexf', by default from the extension) and without the mutation
+    log, e.g. for tools inspecting another graph.
+    """
+    snapshot_metadata = {}
+    if path is not None:
+        graph = snapshot.read_graph(path, backend)
+    elif os.path.exists(EXISTING_SNAPSHOT_PATH):
+        graph, snapshot_metadata = snapshot.load_snapshot(
+            EXISTING_SNAPSHOT_PATH, with_metadata=True
+        )
+    elif (
+        os.path.exists(EXISTING_GRAPH_PATH) and os.path.getsize(EXISTING_GRAPH_PATH) > 0
+    ):
+        graph = snapshot.read_graph(EXISTING_GRAPH_PATH)
+    else:
+        graph = nx.Graph()
 
-if os.path.exists(EXISTING_GRAPH_PATH) and os.path.getsize(EXISTING_GRAPH_PATH) > 0:
-    AttractionSentimentNet = nx.read_gml(EXISTING_GRAPH_PATH)
-if (
-    os.path.exists(EXISTING_EMOTIONS_PATH)
-    and os.path.getsize(EXISTING_EMOTIONS_PATH) > 0
-):
-    with open(EXISTING_EMOTIONS_PATH, 'r', encoding='utf-8') as f:
-        adjectives = json.load(f)
-        for adjective in adjectives:
-            processed_adjective = from_dict(data_class=Emotion, data=adjective)
-            emotions_dict[processed_adjective.name.lower()] = processed_adjective
+    use_network(graph, load_emotions())
+    merged_shard_ids[:] = snapshot_metadata.get('merged_shards', [])
+    if path is None:
+        # Mutations logged after the last snapshot (e.g. before a crash)
+        replay_mutation_log(snapshot_metadata.get('wal_sequence', 0))
+
+    return graph
+
+
+def use_network(graph: nx.Graph, emotions: Dict[str, Emotion]):
+    """Makes `graph` and `emotions` the network, rebuilding its statistics and indexes."""
+    global AttractionSentimentNet, emotions_dict
+    AttractionSentimentNet = graph
+    emotions_dict = emotions
+    network_stats.rebuild(graph)
+    network_index.rebuild(graph)
+
+
+# The graph (AttractionSentimentNet) and the emotions (emotions_dict) are only loaded
+# on first use (see get_graph, get_emotions and load), so importing is cheap
+def is_loaded() -> bool:
+    return 'AttractionSentimentNet' in globals()
+
+
+def get_graph() -> nx.Graph:
+    """The network graph, loaded on first use."""
+    if not is_loaded():
+        load()
+    return AttractionSentimentNet
+
+
+def get_emotions() -> Dict[str, Emotion]:
+    """The emotions of the network by name, loaded with the graph on first use."""
+    if not is_loaded():
+        load()
+    return emotions_dict
+
+
+def __getattr__(name: str):
+    # network.AttractionSentimentNet and network.emotions_dict load the network on
+    # first access
+    if name == 'AttractionSentimentNet':
+        return get_graph()
+    if name == 'emotions_dict':
+        return get_emotions()
+    raise AttributeError(f'module {__name__!r} has no attribute {name!r}')
 
 
 def calculate_adequacy_weight(sentiment_score, user_rating):
@@ -72,256 +186,544 @@ def calculate_adequacy_weight(sentiment_score, user_rating):
     return int(round(adequacy_weight))
 
 
-def add_edge(
-    attraction: Place,
-    emotion_name: str,
-    emotion_type: str,
-    sentiment_score: float,
-    review_rating: float,
-    associated_emotion: str = None,
-    review_date: str = None,
-    continent: str = None,
-    country: str = None,
-    city: str = None,
+def calculate_adequacy_weights(
+    sentiment_scores: np.ndarray, user_ratings: np.ndarray
+) -> np.ndarray:
+    """Vectorized calculate_adequacy_weight (same half to even rounding)."""
+    scores = np.clip(np.asarray(sentiment_scores, dtype=float), -1.0, 1.0)
+    ratings = np.clip(np.asarray(user_ratings, dtype=float), 1.0, 5.0)
+    polarity_ratings = (ratings - 3.0) / 2.0
+
+    adequacy_weights = np.clip(3.0 + 2.0 * (scores * polarity_ratings), 1.0, 5.0)
+
+    return np.rint(adequacy_weights).astype(np.int64)
+
+
+def derive_emotion_id(emotion_type: str, emotion_name: str) -> str:
+    """
+    Id of an emotion derived from its type and name only, so it is the same whatever
+    the order emotions are added in (serial builds, shards or workers).
+    """
+    digest = hashlib.blake2b(emotion_name.encode('utf-8'), digest_size=8).hexdigest()
+    return f'{emotion_type}_{digest}'
+
+
+def merge_emotions(normalized_names: Dict[str, str]):
+    """
+    Merges the emotions (and their nodes) whose names map to the same normalized name.
+    The emotion already named after the normalized name is kept, otherwise the first
+    one; edges of the others are moved to it, adding weights, counts and monthly
+    aggregates. A kept emotion renamed to the normalized name gets the id derived
+    from it (see derive_emotion_id) and its node is relabeled. The node of the kept
+    emotion is created when only the merged ones have nodes.
+    """
+    graph = get_graph()
+    all_emotions = get_emotions()
+    emotions_by_name: Dict[str, List[Emotion]] = {}
+    for name, emotion in all_emotions.items():
+        emotions_by_name.setdefault(normalized_names.get(name, name), []).append(
+            emotion
+        )
+
+    merged_emotions = {}
+    merged_ids: Dict[str, str] = {}
+    for name, emotions in emotions_by_name.items():
+        kept_emotion = next((e for e in emotions if e.name == name), emotions[0])
+        kept_emotion.name = name
+        kept_id = derive_emotion_id(kept_emotion.type, name)
+        if kept_emotion.id != kept_id:
+            if graph.has_node(kept_emotion.id):
+                nx.relabel_nodes(graph, {kept_emotion.id: kept_id}, copy=False)
+            merged_ids[kept_emotion.id] = kept_id
+            kept_emotion.id = kept_id
+        merged_emotions[name] = kept_emotion
+        if not graph.has_node(kept_emotion.id):
+            if not any(graph.has_node(emotion.id) for emotion in emotions):
+                continue
+            graph.add_node(
+                kept_emotion.id,
+                type=kept_emotion.type,
+                associated_emotion=kept_emotion.associated_emotion,
+            )
+        graph.nodes[kept_emotion.id]['name'] = name
+
+        for emotion in emotions:
+            if emotion is kept_emotion or not graph.has_node(emotion.id):
+                continue
+
+            for attraction_id, data in list(graph[emotion.id].items()):
+                if graph.has_edge(attraction_id, kept_emotion.id):
+                    edge = graph[attraction_id][kept_emotion.id]
+                    edge['weight'] += data['weight']
+                    edge['count'] += data['count']
+                    temporal.merge_timelines(edge, data)
+                else:
+                    graph.add_edge(attraction_id, kept_emotion.id, **data)
+            graph.remove_node(emotion.id)
+            merged_ids[emotion.id] = kept_emotion.id
+
+    rename_raw_review_dates_emotions(merged_ids)
+    network_stats.rebuild(graph)
+    network_index.rebuild(graph)
+    logger.info(f'Merged {len(all_emotions)} emotions into {len(merged_emotions)}.')
+    all_emotions.clear()
+    all_emotions.update(merged_emotions)
+
+
+def migrate_adjective_keys():
+    """
+    Collapses adjectives stored before they were normalized (lemma, no punctuation),
+    both in the adjective emotion cache and in the graph, then saves them.
+    """
+    emotions = get_emotions()
+    Sentiments.migrate_adjective_sentiment_cache()
+    merge_emotions(Sentiments.normalize_adjectives(emotions.keys()))
+    save_graph()
+
+
+def add_attraction_node(
+    attraction: 'Place', continent: str = None, country: str = None, city: str = None
 ):
-    if not AttractionSentimentNet.has_node(attraction.id):
-        AttractionSentimentNet.add_node(
-            attraction.id,
-            type='attraction',
-            name=attraction.displayName['text'],
-            rating=attraction.rating,
-            location={
+    graph = get_graph()
+    if not graph.has_node(attraction.id):
+        attributes = {
+            'type': 'attraction',
+            'name': attraction.displayName['text'],
+            'rating': attraction.rating,
+            'location': {
                 **attraction.location,
                 'continent': continent,
                 'country': country,
                 'city': city,
             },
-            attraction_types=attraction.types,
-        )
-
-    emotion = emotions_dict.get(emotion_name.lower())
+            'attraction_types': attraction.types,
+        }
+        graph.add_node(attraction.id, **attributes)
+        network_stats.node_added(attraction.id, 'attraction')
+        network_index.node_added(attraction.id, attributes)
+        mutation_log.append_node(attraction.id, attributes)
+
+
+def get_or_add_emotion(
+    emotion_name: str, emotion_type: str, associated_emotion: str = None
+) -> Emotion:
+    """Emotion of an already normalized name, created (with its node) if missing."""
+    graph = get_graph()
+    emotions = get_emotions()
+    emotion = emotions.get(emotion_name)
     if not emotion:
         emotion = Emotion(
-            id=f'{emotion_type}_{len(emotions_dict) + 1}',
-            name=emotion_name.lower(),
+            id=derive_emotion_id(emotion_type, emotion_name),
+            name=emotion_name,
             type=emotion_type,
             associated_emotion=associated_emotion,
         )
-        emotions_dict[emotion.name] = emotion
+        emotions[emotion.name] = emotion
 
-    if not AttractionSentimentNet.has_node(emotion.id):
-        AttractionSentimentNet.add_node(
+    if not graph.has_node(emotion.id):
+        graph.add_node(
             emotion.id,
             type=emotion.type,
             name=emotion.name,
             associated_emotion=emotion.associated_emotion,
         )
+        network_stats.node_added(emotion.id, emotion.type)
+        network_index.node_added(emotion.id, graph.nodes[emotion.id])
+
+    return emotion
+
+
+def update_edge(attraction_id: str, emotion_id: str, count: int, weight: int) -> Dict:
+    """Adds reviews to an edge (created if missing) and returns its attributes."""
+    graph = get_graph()
+    if graph.has_edge(attraction_id, emotion_id):
+        edge = graph[attraction_id][emotion_id]
+        edge['weight'] += weight
+        edge['count'] += count
+    else:
+        graph.add_edge(attraction_id, emotion_id, weight=weight, count=count)
+        edge = graph[attraction_id][emotion_id]
+        network_stats.edge_added(graph, attraction_id, emotion_id)
+    network_stats.edge_weight_changed(attraction_id, emotion_id, edge['weight'])
+
+    return edge
+
+
+def add_edge(
+    attraction: 'Place',
+    emotion_name: str,
+    emotion_type: str,
+    sentiment_score: float,
+    review_rating: float,
+    associated_emotion: str = None,
+    review_date: str = None,
+    continent: str = None,
+    country: str = None,
+    city: str = None,
+):
+    add_attraction_node(attraction, continent, country, city)
+    emotion = get_or_add_emotion(
+        Sentiments.normalize_adjective(emotion_name), emotion_type, associated_emotion
+    )
 
     edge_weight = calculate_adequacy_weight(sentiment_score, review_rating)
-    if AttractionSentimentNet.has_edge(attraction.id, emotion.id):
-        AttractionSentimentNet[attraction.id][emotion.id]['weight'] += edge_weight
-        AttractionSentimentNet[attraction.id][emotion.id]['count'] += 1
-        AttractionSentimentNet[attraction.id][emotion.id]['review_dates'].append(
-            review_date
+    month = temporal.month_index(review_date)
+    edge = update_edge(attraction.id, emotion.id, 1, edge_weight)
+    temporal.add_to_timeline(edge, month, 1, edge_weight)
+    if month is not None:
+        network_index.edge_months_added(attraction.id, emotion.id, [month])
+    mutation_log.append_edge(
+        attraction.id,
+        emotion.name,
+        emotion.type,
+        associated_emotion,
+        -1 if month is None else month,
+        1,
+        edge_weight,
+    )
+
+    if KEEP_RAW_REVIEW_DATES and review_date:
+        pending_raw_review_dates.append(
+            (attraction.id, emotion.id, review_date, edge_weight)
         )
-    else:
-        AttractionSentimentNet.add_edge(
+    checkpoint_if_needed()
+
+
+def add_edges_bulk(
+    attraction: 'Place',
+    emotion_names: Sequence[str],
+    emotion_type: str,
+    sentiment_scores: Sequence[float],
+    review_ratings: Sequence[float],
+    associated_emotions: Sequence[str] = None,
+    review_dates: Sequence[str] = None,
+    continent: str = None,
+    country: str = None,
+    city: str = None,
+):
+    """
+    Same as calling add_edge for every position of the columns (one per adjective
+    occurrence) of an attraction. Weights are computed in a single vectorized pass and
+    occurrences are grouped by edge and month first, so every edge is updated once.
+    """
+    # pandas is slow to import and only needed here and for the raw review dates
+    import pandas as pd
+
+    occurrences = len(emotion_names)
+    if occurrences == 0:
+        return
+    if associated_emotions is None:
+        associated_emotions = [None] * occurrences
+    if review_dates is None:
+        review_dates = [None] * occurrences
+
+    add_attraction_node(attraction, continent, country, city)
+
+    # Normalization and date parsing only run once per distinct value (factorize keeps
+    # the order of first appearance, so emotion ids are the same as with add_edge)
+    raw_name_codes, raw_names = pd.factorize(np.asarray(emotion_names, dtype=object))
+    name_codes: Dict[str, int] = {}
+    raw_name_to_code = np.array(
+        [
+            name_codes.setdefault(
+                Sentiments.normalize_adjective(raw_name), len(name_codes)
+            )
+            for raw_name in raw_names
+        ],
+        dtype=np.int64,
+    )
+    occurrence_names = raw_name_to_code[raw_name_codes]
+
+    # Missing dates get code -1, which picks the trailing -1 (undated) month
+    date_codes, dates = pd.factorize(np.asarray(review_dates, dtype=object))
+    date_months = [temporal.month_index(review_date) for review_date in dates]
+    occurrence_months = np.array(
+        [-1 if month is None else month for month in date_months] + [-1],
+        dtype=np.int64,
+    )[date_codes]
+
+    edge_weights = calculate_adequacy_weights(sentiment_scores, review_ratings)
+
+    # Totals by edge, then by (edge, month) using a single integer key per bucket,
+    # sorted by edge and then month (undated occurrences first, as month -1)
+    edge_counts = np.bincount(occurrence_names, minlength=len(name_codes))
+    edge_weight_sums = np.bincount(
+        occurrence_names, weights=edge_weights, minlength=len(name_codes)
+    ).astype(np.int64)
+    month_span = int(occurrence_months.max()) + 2
+    bucket_keys, bucket_occurrences = np.unique(
+        occurrence_names * month_span + occurrence_months + 1, return_inverse=True
+    )
+    bucket_codes, bucket_months = np.divmod(bucket_keys, month_span)
+    bucket_months -= 1
+    bucket_counts = np.bincount(bucket_occurrences, minlength=len(bucket_keys))
+    bucket_weights = np.bincount(
+        bucket_occurrences, weights=edge_weights, minlength=len(bucket_keys)
+    ).astype(np.int64)
+    bucket_bounds = np.searchsorted(
+        bucket_codes, np.arange(len(name_codes) + 1)
+    ).tolist()
+    bucket_months = bucket_months.tolist()
+    bucket_counts = bucket_counts.tolist()
+    bucket_weights = bucket_weights.tolist()
+
+    first_occurrences = np.full(len(name_codes), occurrences, dtype=np.int64)
+    np.minimum.at(first_occurrences, occurrence_names, np.arange(occurrences))
+
+    emotion_ids = []
+    for emotion_name, code in name_codes.items():
+        associated_emotion = associated_emotions[first_occurrences[code]]
+        emotion = get_or_add_emotion(emotion_name, emotion_type, associated_emotion)
+        edge = update_edge(
             attraction.id,
             emotion.id,
-            weight=edge_weight,
-            count=1,
-            review_dates=[review_date],
+            int(edge_counts[code]),
+            int(edge_weight_sums[code]),
         )
+        emotion_ids.append(emotion.id)
+
+        start, end = bucket_bounds[code], bucket_bounds[code + 1]
+        for month, count, weight in zip(
+            bucket_months[start:end],
+            bucket_counts[start:end],
+            bucket_weights[start:end],
+        ):
+            mutation_log.append_edge(
+                attraction.id,
+                emotion.name,
+                emotion.type,
+                associated_emotion,
+                month,
+                count,
+                weight,
+            )
+        # Undated buckets (month -1) come first
+        while start < end and bucket_months[start] < 0:
+            start += 1
+        if start < end:
+            temporal.add_buckets(
+                edge,
+                bucket_months[start:end],
+                bucket_counts[start:end],
+                bucket_weights[start:end],
+            )
+            network_index.edge_months_added(
+                attraction.id, emotion.id, bucket_months[start:end]
+            )
 
+    if KEEP_RAW_REVIEW_DATES:
+        pending_raw_review_dates.extend(
+            (attraction.id, emotion_ids[code], review_date, weight)
+            for code, review_date, weight in zip(
+                occurrence_names.tolist(), review_dates, edge_weights.tolist()
+            )
+            if review_date
+        )
 
-def plot_degree_distribution():
-    all_degrees = [degree for _, degree in AttractionSentimentNet.degree()]
+    # The whole attraction is made durable at once
+    mutation_log.sync()
+    checkpoint_if_needed()
+
+
+def replay_mutation_log(after_sequence: int = 0):
+    """Applies the logged mutations newer than the snapshot (without logging them)."""
+    graph = get_graph()
+    replayed_records = 0
+    for record in mutation_log.replay(after_sequence):
+        if isinstance(record, wal.NodeRecord):
+            if not graph.has_node(record.node_id):
+                graph.add_node(record.node_id, **record.attributes)
+                network_stats.node_added(record.node_id, record.attributes.get('type'))
+                network_index.node_added(record.node_id, record.attributes)
+        else:
+            emotion = get_or_add_emotion(
+                record.emotion_name, record.emotion_type, record.associated_emotion
+            )
+            edge = update_edge(
+                record.attraction_id, emotion.id, record.count, record.weight
+            )
+            if record.month >= 0:
+                temporal.add_to_timeline(
+                    edge, record.month, record.count, record.weight
+                )
+                network_index.edge_months_added(
+                    record.attraction_id, emotion.id, [record.month]
+                )
+        replayed_records += 1
+
+    if replayed_records:
+        logger.info(
+            f'Replayed {replayed_records} graph mutations logged after the last snapshot.'
+        )
 
-    low_degrees = [d for d in all_degrees if d <= 50]
-    high_degrees = [d for d in all_degrees if d > 50]
 
-    low_bins = range(0, 51 + 1)
-    high_max = max(high_degrees) if high_degrees else 51
-    high_bins = range(51, high_max + 50, 1)
+def checkpoint_if_needed(automatic: bool = True):
+    """
+    Saves a snapshot once the mutation log reaches NETWORK_WAL_CHECKPOINT_BYTES.
+    Automatic calls (after graph updates) do nothing while automatic_checkpoints
+    is off.
+    """
+    if automatic and not automatic_checkpoints:
+        return
+    if mutation_log.size >= NETWORK_WAL_CHECKPOINT_BYTES:
+        logger.info('Mutation log is full, saving a graph snapshot...')
+        save_graph()
 
-    fig, (ax1, ax2) = plt.subplots(
-        1,
-        2,
-        figsize=(18, 6),
-    )
 
-    # 0-50
-    counts1, bins1, patches1 = ax1.hist(
-        low_degrees,
-        bins=low_bins,
-        align='left',
-        color='cornflowerblue',
-        edgecolor='cornflowerblue',
-    )
-    ax1.set_title('Distribuição de Graus (0–50)')
-    ax1.set_xlabel('Grau')
-    ax1.set_ylabel('Número de Nós')
-    ax1.set_xticks(range(0, 51, 3))
-    ax1.set_yticks(range(0, 5000, 300))
-    ax1.grid(axis='y', linestyle='--', alpha=0.7)
-
-    # 51+
-    counts2, bins2, patches2 = ax2.hist(
-        high_degrees,
-        bins=high_bins,
-        align='left',
-        color='mediumseagreen',
-        edgecolor='cornflowerblue',
-    )
-    ax2.set_title(f'Distribuição de Graus (51–{high_max})')
-    ax2.set_xlabel('Grau')
-    ax2.set_xticks(range(50, high_max + 100, 100))
-    ax2.set_yticks(range(0, 16))
-    ax2.grid(axis='y', linestyle='--', alpha=0.7)
+def discard_mutations_after(sequence: int) -> int:
+    """
+    Drops the logged mutations newer than `sequence` (e.g. the last one recorded by
+    a pipeline checkpoint), reloading the network if it is loaded. Nothing is
+    dropped when the saved snapshot already contains newer mutations. Returns how
+    many were dropped.
+    """
+    if os.path.exists(EXISTING_SNAPSHOT_PATH):
+        snapshot_sequence = snapshot.load_metadata(EXISTING_SNAPSHOT_PATH).get(
+            'wal_sequence', 0
+        )
+        if snapshot_sequence > sequence:
+            logger.warning(
+                f'The graph snapshot contains mutations after {sequence} '
+                f'(up to {snapshot_sequence}), keeping the mutation log.'
+            )
+            return 0
 
-    plt.suptitle('Distribuição de Graus da Rede de Atrações e Sentimentos', fontsize=16)
-    plt.tight_layout(rect=[0, 0.03, 1, 0.95])
+    discarded = mutation_log.discard_after(sequence)
+    if discarded:
+        logger.warning(
+            f'Dropped {discarded} graph mutations logged after mutation {sequence}.'
+        )
+        if is_loaded():
+            load()
 
-    plt.show()
+    return discarded
 
 
-def plot_world_map_with_tooltips():
-    url = (
-        'https://naciscdn.org/naturalearth/110m/cultural/ne_110m_admin_0_countries.zip'
-    )
+def get_edge_activity(
+    attraction_id: str, emotion_id: str, start: str = None, end: str = None
+) -> Tuple[int, int]:
+    """
+    Review count and weight sum of an edge between the months of the ISO dates
+    `start` and `end` (both included, open when None).
+    """
+    return temporal.activity_between(get_graph()[attraction_id][emotion_id], start, end)
 
-    world = gpd.read_file(url)
 
-    highlight = [
-        data['location']['country']
-        for node, data in AttractionSentimentNet.nodes.items()
-        if data['type'] == 'attraction'
-    ]
-    # Different format than our database <- not renaming anything as this is just for visualization
-    highlight.extend(['Dem. Rep. Congo', 'United States of America'])
+def get_edge_monthly_activity(
+    attraction_id: str, emotion_id: str
+) -> Dict[str, Tuple[int, int]]:
+    """Review count and weight sum of an edge by month ("YYYY-MM")."""
+    return temporal.monthly_activity(get_graph()[attraction_id][emotion_id])
 
-    fig, ax = plt.subplots(figsize=(12, 6))
 
-    world.plot(ax=ax, color='lightgray', edgecolor='black', linewidth=0.35)
+def flush_raw_review_dates():
+    if not pending_raw_review_dates:
+        return
 
-    world[world['NAME'].isin(highlight)].plot(
-        ax=ax, color='cornflowerblue', edgecolor='black', linewidth=0.35
-    )
+    write_header = not os.path.exists(RAW_REVIEW_DATES_PATH)
+    with open(RAW_REVIEW_DATES_PATH, 'a', encoding='utf-8', newline='') as f:
+        writer = csv.writer(f)
+        if write_header:
+            writer.writerow(RAW_REVIEW_DATES_COLUMNS)
+        writer.writerows(pending_raw_review_dates)
+    pending_raw_review_dates.clear()
 
-    tooltip_points = [
-        {
-            'lon': data['location']['longitude'],
-            'lat': data['location']['latitude'],
-            'name': data['name'],
-        }
-        for node, data in AttractionSentimentNet.nodes.items()
-        if data['type'] == 'attraction'
-    ]
-    for point in tooltip_points:
-        ax.scatter(point['lon'], point['lat'], s=2.5, color='black')
-
-    for spine in ax.spines.values():
-        spine.set_visible(True)
-        spine.set_linewidth(1.2)
-        spine.set_edgecolor('black')
-    ax.tick_params(left=False, bottom=False, labelleft=False, labelbottom=False)
-
-    legend_elements = [
-        Rectangle(
-            (0, 0),
-            1,
-            1,
-            facecolor='cornflowerblue',
-            edgecolor='black',
-            label='Países com Atrações',
-        ),
-        plt.Line2D(
-            [0],
-            [0],
-            marker='o',
-            color='w',
-            label='Localização das Atrações',
-            markerfacecolor='black',
-            markersize=5,
-        ),
-    ]
-    ax.legend(
-        handles=legend_elements,
-        loc='lower left',
-        fontsize=9,
-        frameon=True,
-        framealpha=1,
-        edgecolor='black',
-        bbox_to_anchor=(0.035, 0.09),
-    )
 
-    ax.set_title('Mapa das Atrações Coletadas', fontsize=13)
+def load_raw_review_dates():
+    """
+    Raw review dates kept with NETWORK_KEEP_RAW_REVIEW_DATES as a pandas DataFrame
+    (one row per review and adjective, see RAW_REVIEW_DATES_COLUMNS).
+    """
+    import pandas as pd
 
-    plt.tight_layout()
-    plt.show()
+    flush_raw_review_dates()
+    if not os.path.exists(RAW_REVIEW_DATES_PATH):
+        return pd.DataFrame(columns=RAW_REVIEW_DATES_COLUMNS)
 
+    return pd.read_csv(RAW_REVIEW_DATES_PATH, parse_dates=['review_date'])
 
-def save_network_info():
-    logger.info('Calculating network information...')
-    network_info = {
-        'num_nodes': AttractionSentimentNet.number_of_nodes(),
-        'num_edges': AttractionSentimentNet.number_of_edges(),
-        'avg_degree': sum(dict(AttractionSentimentNet.degree()).values())
-        / AttractionSentimentNet.number_of_nodes()
-        if AttractionSentimentNet.number_of_nodes() > 0
-        else 0,
-        'num_components': nx.number_connected_components(AttractionSentimentNet),
-    }
-    attraction_nodes = [
-        node
-        for node, data in AttractionSentimentNet.nodes.items()
-        if data['type'] == 'attraction'
-    ]
-    if attraction_nodes:
-        avg_attraction_degree = sum(
-            dict(AttractionSentimentNet.degree(attraction_nodes)).values()
-        ) / len(attraction_nodes)
-        network_info['avg_attraction_degree'] = avg_attraction_degree
-
-    emotion_nodes = [
-        node
-        for node, data in AttractionSentimentNet.nodes.items()
-        if data['type'] != 'attraction'
-    ]
-    if emotion_nodes:
-        avg_emotion_degree = sum(
-            dict(AttractionSentimentNet.degree(emotion_nodes)).values()
-        ) / len(emotion_nodes)
-        network_info['avg_emotion_degree'] = avg_emotion_degree
-
-    if attraction_nodes:
-        highest_degree_attraction = max(
-            attraction_nodes, key=lambda n: AttractionSentimentNet.degree(n)
-        )
-        network_info['highest_degree_attraction'] = {
-            **AttractionSentimentNet.nodes[highest_degree_attraction],
-            'degree': AttractionSentimentNet.degree(highest_degree_attraction),
-        }
 
-    if emotion_nodes:
-        highest_degree_emotion = max(
-            emotion_nodes, key=lambda n: AttractionSentimentNet.degree(n)
-        )
-        network_info['highest_degree_emotion'] = {
-            **AttractionSentimentNet.nodes[highest_degree_emotion],
-            'degree': AttractionSentimentNet.degree(highest_degree_emotion),
-        }
+def rename_raw_review_dates_emotions(renamed_ids: Dict[str, str]):
+    # Rewrites the side file so rows of merged emotions point to the kept node
+    flush_raw_review_dates()
+    if not renamed_ids or not os.path.exists(RAW_REVIEW_DATES_PATH):
+        return
+
+    with open(RAW_REVIEW_DATES_PATH, 'r', encoding='utf-8', newline='') as f:
+        rows = list(csv.reader(f))
+    with open(RAW_REVIEW_DATES_PATH, 'w', encoding='utf-8', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(rows[0])
+        for attraction_id, emotion_id, *values in rows[1:]:
+            writer.writerow(
+                [attraction_id, renamed_ids.get(emotion_id, emotion_id), *values]
+            )
+
 
-    if AttractionSentimentNet.number_of_edges() > 0:
-        highest_weight_edge = max(
-            AttractionSentimentNet.edges(data=True), key=lambda e: e[2]['weight']
+def migrate_review_dates():
+    """
+    Replaces the `review_dates` list of edges saved before the monthly aggregation
+    with its monthly buckets (the edge weight is split by month in proportion to the
+    review count). The dates are moved to the side file when KEEP_RAW_REVIEW_DATES
+    is set. Saves the graph.
+    """
+    graph = get_graph()
+    migrated_edges = 0
+    for attraction_id, emotion_id, edge in graph.edges(data=True):
+        if 'review_dates' not in edge:
+            continue
+
+        review_dates = temporal.as_list(edge.pop('review_dates'))
+        months, counts, weights = temporal.timeline_from_dates(
+            review_dates, edge['weight']
         )
-        network_info['highest_weight_edge'] = {
-            'attraction': AttractionSentimentNet.nodes[highest_weight_edge[0]],
-            'emotion': AttractionSentimentNet.nodes[highest_weight_edge[1]],
-            'weight': highest_weight_edge[2]['weight'],
-            'count': highest_weight_edge[2]['count'],
-        }
+        edge[temporal.MONTHS_KEY] = months
+        edge[temporal.MONTH_COUNTS_KEY] = counts
+        edge[temporal.MONTH_WEIGHTS_KEY] = weights
+
+        if KEEP_RAW_REVIEW_DATES:
+            # Weights of single reviews were not stored
+            pending_raw_review_dates.extend(
+                (attraction_id, emotion_id, review_date, None)
+                for review_date in review_dates
+                if review_date
+            )
+        migrated_edges += 1
+
+    logger.info(f'Migrated the review dates of {migrated_edges} edges.')
+    network_index.rebuild(graph)
+    save_graph()
+
+
+def migrate_emotion_ids():
+    """
+    Renames emotions created with sequential ids (`adjective_12`) to the ids derived
+    from their names (see derive_emotion_id), in the graph, the emotions and the raw
+    review dates, then saves them.
+    """
+    graph = get_graph()
+    emotions = get_emotions()
+    renamed_ids = {}
+    for emotion in emotions.values():
+        new_id = derive_emotion_id(emotion.type, emotion.name)
+        if emotion.id != new_id:
+            renamed_ids[emotion.id] = new_id
+            emotion.id = new_id
+
+    nx.relabel_nodes(
+        graph,
+        {old: new for old, new in renamed_ids.items() if old in graph},
+        copy=False,
+    )
+    rename_raw_review_dates_emotions(renamed_ids)
+    use_network(graph, emotions)
+    logger.info(f'Renamed {len(renamed_ids)} emotion ids.')
+    save_graph()
+
+
+def save_network_info():
+    """Writes the incrementally maintained statistics (no pass over the graph)."""
+    network_info = network_stats.as_info(get_graph())
 
     with open(NETWORK_INFO_PATH, 'w', encoding='utf-8') as f:
         json.dump(network_info, f, ensure_ascii=False, indent=2)
@@ -330,33 +732,63 @@ def save_network_info():
 
 
 def save_emotions():
+    emotions = get_emotions()
     Sentiments.save_adjective_sentiment_cache()
     with open(EXISTING_EMOTIONS_PATH, 'w', encoding='utf-8') as f:
         emotions_list = [
             json.dumps(
                 emotion, cls=utils.EnhancedJSONEncoder, ensure_ascii=False, indent=2
             )
-            for emotion in emotions_dict.values()
+            for emotion in emotions.values()
         ]
         f.write('[\n' + ',\n'.join(emotions_list) + '\n]')
 
 
 def save_graph():
     save_emotions()
-    nx.write_gml(AttractionSentimentNet, EXISTING_GRAPH_PATH)
+    flush_raw_review_dates()
+    # The snapshot records the last logged mutation it contains, so a crash before
+    # the log is truncated does not apply those mutations twice
+    snapshot.save_snapshot(
+        get_graph(),
+        EXISTING_SNAPSHOT_PATH,
+        metadata={
+            'wal_sequence': mutation_log.last_sequence,
+            'merged_shards': merged_shard_ids,
+        },
+    )
+    mutation_log.truncate()
+
+
+def export_graph(path: str = GEXT_GRAPH_PATH):
+    """Writes the graph as GEXF (Gephi), GML or a snapshot, by the extension of `path`."""
+    snapshot.write_graph(get_graph(), path)
+    logger.info(f'Graph exported to {path}')
+
+
+def import_graph(path: str, backend: str = None):
+    """Replaces the graph with a GEXF, GML or snapshot file and saves it."""
+    load(path, backend)
+    save_graph()
+    logger.info(f'Graph imported from {path}')
 
 
 def reset_network_data():
     logger.info('Resetting existing Network data...')
 
-    global AttractionSentimentNet, emotions_dict
-    AttractionSentimentNet = nx.Graph()
-    emotions_dict = {}
+    use_network(nx.Graph(), {})
+    pending_raw_review_dates.clear()
+    merged_shard_ids.clear()
+    if os.path.exists(EXISTING_SNAPSHOT_PATH):
+        os.remove(EXISTING_SNAPSHOT_PATH)
+    mutation_log.truncate()
     if os.path.exists(EXISTING_GRAPH_PATH):
         os.remove(EXISTING_GRAPH_PATH)
     if os.path.exists(EXISTING_EMOTIONS_PATH):
         os.remove(EXISTING_EMOTIONS_PATH)
     if os.path.exists(NETWORK_INFO_PATH):
         os.remove(NETWORK_INFO_PATH)
+    if os.path.exists(RAW_REVIEW_DATES_PATH):
+        os.remove(RAW_REVIEW_DATES_PATH)
 
     logger.info('Network data reset complete. ✅')
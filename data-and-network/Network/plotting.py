@@ -0,0 +1,246 @@
+import argparse
+import logging
+import math
+import os
+import tempfile
+from typing import TYPE_CHECKING, List, Tuple
+import urllib.request
+
+import networkx as nx
+import numpy as np
+
+import Network.main as network
+
+if TYPE_CHECKING:
+    import geopandas as gpd
+
+logger = logging.getLogger(os.getenv('DATA_NETWORK_LOGGER', 'data-and-network'))
+
+WORLD_SHAPEFILE_URL = (
+    'https://naciscdn.org/naturalearth/110m/cultural/ne_110m_admin_0_countries.zip'
+)
+# Natural Earth countries, downloaded from WORLD_SHAPEFILE_URL on first use and
+# read from disk afterwards (point it to an existing copy to plot offline)
+WORLD_SHAPEFILE_PATH = os.getenv(
+    'NETWORK_WORLD_SHAPEFILE_PATH',
+    os.path.join(network.MODULE_PATH, 'ne_110m_admin_0_countries.zip'),
+)
+# Degrees up to LOW_DEGREE_MAX get one bar each, higher degrees are grouped in at
+# most HIGH_DEGREE_BINS bars of equal width
+LOW_DEGREE_MAX = 50
+HIGH_DEGREE_BINS = 100
+
+_world = None
+
+
+def load_world(path: str = None) -> 'gpd.GeoDataFrame':
+    """Country shapes, downloaded to `path` (WORLD_SHAPEFILE_PATH) if missing."""
+    import geopandas as gpd
+
+    global _world
+    path = path or WORLD_SHAPEFILE_PATH
+    if _world is not None and _world[0] == path:
+        return _world[1]
+
+    if not os.path.exists(path):
+        logger.info(f'Downloading the country shapes to {path}...')
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        # Downloaded next to the final file and renamed, so an interrupted download
+        # is never mistaken for the cached shapes
+        handle, temporary_path = tempfile.mkstemp(dir=directory, suffix='.zip')
+        os.close(handle)
+        try:
+            urllib.request.urlretrieve(WORLD_SHAPEFILE_URL, temporary_path)
+            os.replace(temporary_path, path)
+        finally:
+            if os.path.exists(temporary_path):
+                os.remove(temporary_path)
+
+    _world = (path, gpd.read_file(path))
+    return _world[1]
+
+
+def degree_counts(graph: nx.Graph) -> np.ndarray:
+    """Number of nodes of each degree (index), with a single pass over the nodes."""
+    degrees = np.fromiter(
+        (len(neighbours) for neighbours in graph.adj.values()),
+        dtype=np.int64,
+        count=graph.number_of_nodes(),
+    )
+    return np.bincount(degrees, minlength=LOW_DEGREE_MAX + 1)
+
+
+def high_degree_bins(counts: np.ndarray) -> Tuple[np.ndarray, np.ndarray, int]:
+    """
+    Left edges, node counts and width of the bins of degrees above LOW_DEGREE_MAX,
+    at most HIGH_DEGREE_BINS of them whatever the highest degree.
+    """
+    high_counts = counts[LOW_DEGREE_MAX + 1 :]
+    if len(high_counts) == 0:
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64), 1
+
+    width = max(1, math.ceil(len(high_counts) / HIGH_DEGREE_BINS))
+    starts = np.arange(0, len(high_counts), width)
+
+    return starts + LOW_DEGREE_MAX + 1, np.add.reduceat(high_counts, starts), width
+
+
+def show_or_save(figure, path: str = None):
+    import matplotlib.pyplot as plt
+
+    if path:
+        figure.savefig(path, dpi=150)
+        plt.close(figure)
+        logger.info(f'Plot saved to {path}')
+    else:
+        plt.show()
+
+
+def plot_degree_distribution(graph: nx.Graph = None, path: str = None):
+    """Degree histogram of the graph, shown or saved to `path`."""
+    import matplotlib.pyplot as plt
+    from matplotlib.ticker import MaxNLocator
+
+    graph = graph if graph is not None else network.get_graph()
+    counts = degree_counts(graph)
+    high_edges, high_counts, width = high_degree_bins(counts)
+    high_max = len(counts) - 1 if len(high_counts) else LOW_DEGREE_MAX + 1
+
+    fig, (ax1, ax2) = plt.subplots(1, 2, figsize=(18, 6))
+
+    # 0-50
+    ax1.bar(
+        np.arange(LOW_DEGREE_MAX + 1),
+        counts[: LOW_DEGREE_MAX + 1],
+        width=1,
+        color='cornflowerblue',
+        edgecolor='cornflowerblue',
+    )
+    ax1.set_xlim(-0.5, LOW_DEGREE_MAX + 0.5)
+    ax1.set_title(f'Distribuição de Graus (0–{LOW_DEGREE_MAX})')
+    ax1.set_xlabel('Grau')
+    ax1.set_ylabel('Número de Nós')
+
+    # 51+
+    ax2.bar(
+        high_edges,
+        high_counts,
+        width=width,
+        align='edge',
+        color='mediumseagreen',
+        edgecolor='cornflowerblue',
+    )
+    ax2.set_title(f'Distribuição de Graus ({LOW_DEGREE_MAX + 1}–{high_max})')
+    ax2.set_xlabel('Grau' if width == 1 else f'Grau (intervalos de {width})')
+
+    for ax in (ax1, ax2):
+        ax.xaxis.set_major_locator(MaxNLocator(nbins=20, integer=True))
+        ax.yaxis.set_major_locator(MaxNLocator(integer=True))
+        ax.grid(axis='y', linestyle='--', alpha=0.7)
+
+    plt.suptitle('Distribuição de Graus da Rede de Atrações e Sentimentos', fontsize=16)
+    plt.tight_layout(rect=[0, 0.03, 1, 0.95])
+
+    show_or_save(fig, path)
+
+
+def attraction_points(graph: nx.Graph) -> Tuple[np.ndarray, np.ndarray, List[str]]:
+    """Longitudes, latitudes and countries of the attractions."""
+    longitudes, latitudes, countries = [], [], []
+    for data in graph.nodes.values():
+        if data.get('type') != 'attraction':
+            continue
+        location = data.get('location') or {}
+        longitudes.append(location.get('longitude', np.nan))
+        latitudes.append(location.get('latitude', np.nan))
+        countries.append(location.get('country'))
+
+    return (
+        np.asarray(longitudes, dtype=np.float64),
+        np.asarray(latitudes, dtype=np.float64),
+        countries,
+    )
+
+
+def plot_world_map_with_tooltips(
+    graph: nx.Graph = None, path: str = None, world: 'gpd.GeoDataFrame' = None
+):
+    """
+    World map highlighting the countries with attractions and the location of each
+    attraction, shown or saved to `path`. `world` defaults to the cached Natural
+    Earth countries (see load_world).
+    """
+    from matplotlib.patches import Rectangle
+    import matplotlib.pyplot as plt
+
+    graph = graph if graph is not None else network.get_graph()
+    world = world if world is not None else load_world()
+    longitudes, latitudes, countries = attraction_points(graph)
+
+    highlight = set(countries)
+    # Different format than our database <- not renaming anything as this is just for visualization
+    highlight.update(['Dem. Rep. Congo', 'United States of America'])
+
+    fig, ax = plt.subplots(figsize=(12, 6))
+
+    world.plot(ax=ax, color='lightgray', edgecolor='black', linewidth=0.35)
+
+    world[world['NAME'].isin(highlight)].plot(
+        ax=ax, color='cornflowerblue', edgecolor='black', linewidth=0.35
+    )
+
+    # A single collection for every attraction
+    ax.scatter(longitudes, latitudes, s=2.5, color='black', linewidths=0)
+
+    for spine in ax.spines.values():
+        spine.set_visible(True)
+        spine.set_linewidth(1.2)
+        spine.set_edgecolor('black')
+    ax.tick_params(left=False, bottom=False, labelleft=False, labelbottom=False)
+
+    legend_elements = [
+        Rectangle(
+            (0, 0),
+            1,
+            1,
+            facecolor='cornflowerblue',
+            edgecolor='black',
+            label='Países com Atrações',
+        ),
+        plt.Line2D(
+            [0],
+            [0],
+            marker='o',
+            color='w',
+            label='Localização das Atrações',
+            markerfacecolor='black',
+            markersize=5,
+        ),
+    ]
+    ax.legend(
+        handles=legend_elements,
+        loc='lower left',
+        fontsize=9,
+        frameon=True,
+        framealpha=1,
+        edgecolor='black',
+        bbox_to_anchor=(0.035, 0.09),
+    )
+
+    ax.set_title('Mapa das Atrações Coletadas', fontsize=13)
+
+    plt.tight_layout()
+    show_or_save(fig, path)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Network plots')
+    parser.add_argument('plot', choices=['degrees', 'map'])
+    parser.add_argument('--output', help='image file (shown in a window by default)')
+    args = parser.parse_args()
+
+    if args.plot == 'degrees':
+        plot_degree_distribution(path=args.output)
+    else:
+        plot_world_map_with_tooltips(path=args.output)
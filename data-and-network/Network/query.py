@@ -0,0 +1,239 @@
+import argparse
+from collections import defaultdict
+import heapq
+from typing import Dict, Hashable, Iterator, List, Optional, Set, Tuple
+
+import pandas as pd
+
+import Network.main as network
+import Network.temporal as temporal
+import Sentiments.main as sentiments
+
+QUERY_COLUMNS = ['name', 'count', 'weight']
+
+
+def month_bound(date: Optional[str], end: bool = False) -> Optional[str]:
+    """
+    ISO date of a query bound, a bare year ("2023") covers the whole year. Raises
+    ValueError when the date is neither.
+    """
+    if date and len(date) == 4:
+        date = f'{date}-12' if end else f'{date}-01'
+    if date:
+        temporal.bound_month_index(date)
+    return date
+
+
+def query_date(value: str) -> str:
+    """argparse type of the --since and --until bounds."""
+    try:
+        month_bound(value)
+    except ValueError as e:
+        raise argparse.ArgumentTypeError(str(e))
+    return value
+
+
+def adjective_key(adjective: str) -> str:
+    """
+    Key of an adjective in the network ("Beautiful" -> "beautiful"). Words that are
+    not a key themselves are lemmatized ("bigger" -> "big"), like the pipeline does.
+    """
+    key = sentiments.normalize_adjective(adjective)
+    if key in network.emotions_dict:
+        return key
+    return sentiments.normalize_adjectives([adjective])[adjective]
+
+
+def edge_activity(
+    edge: Dict, start: Optional[str], end: Optional[str]
+) -> Tuple[int, int]:
+    if start or end:
+        return temporal.activity_between(edge, start, end)
+    return edge['count'], edge['weight']
+
+
+def matching_edges(
+    attractions: Optional[Set[Hashable]],
+    adjectives: Optional[Set[Hashable]],
+    start: Optional[str],
+    end: Optional[str],
+) -> Iterator[Tuple[Hashable, Hashable]]:
+    """
+    (attraction, adjective) edges between the given attractions and adjectives (any
+    when None) with reviews between `start` and `end`. Walks the neighbours of the
+    smaller filter, the month index when only dates are given and every edge only
+    when nothing is filtered.
+    """
+    graph = network.AttractionSentimentNet
+    if attractions is None and adjectives is None:
+        if start or end:
+            yield from network.network_index.edges_between(start, end)
+            return
+        for source, target in graph.edges:
+            if graph.nodes[source].get('type') == 'attraction':
+                yield source, target
+            else:
+                yield target, source
+        return
+
+    def total_degree(nodes):
+        return sum(len(graph[node]) for node in nodes)
+
+    if adjectives is None or (
+        attractions is not None
+        and total_degree(attractions) <= total_degree(adjectives)
+    ):
+        for attraction in attractions:
+            for adjective in graph[attraction]:
+                if adjectives is None or adjective in adjectives:
+                    yield attraction, adjective
+    else:
+        for adjective in adjectives:
+            for attraction in graph[adjective]:
+                if attractions is None or attraction in attractions:
+                    yield attraction, adjective
+
+
+def top_rows(
+    totals: Dict[Hashable, List[int]], names: Dict[Hashable, str], by: str, top: int
+) -> pd.DataFrame:
+    position = QUERY_COLUMNS.index(by) - 1
+    rows = heapq.nlargest(top, totals.items(), key=lambda item: item[1][position])
+
+    return pd.DataFrame(
+        [[names[key], count, weight] for key, (count, weight) in rows],
+        index=pd.Index([key for key, _ in rows], name='id'),
+        columns=QUERY_COLUMNS,
+    )
+
+
+def top_emotions(
+    continent: str = None,
+    country: str = None,
+    city: str = None,
+    start: str = None,
+    end: str = None,
+    top: int = 10,
+    by: str = 'weight',
+    group: str = 'adjective',
+) -> pd.DataFrame:
+    """
+    Adjectives (or associated emotions with `group='emotion'`) with the highest
+    review weight (or `by='count'`) in the attractions of a location, optionally
+    counting only the reviews between the ISO dates `start` and `end`.
+    """
+    graph = network.AttractionSentimentNet
+    start, end = month_bound(start), month_bound(end, end=True)
+    attractions = network.network_index.attractions_in(continent, country, city)
+
+    totals = defaultdict(lambda: [0, 0])
+    names = {}
+    for attraction, adjective in matching_edges(attractions, None, start, end):
+        count, weight = edge_activity(graph[attraction][adjective], start, end)
+        if count == 0:
+            continue
+        if group == 'emotion':
+            key = graph.nodes[adjective].get('associated_emotion')
+            if key is None:
+                continue
+            names[key] = key
+        else:
+            key = adjective
+            names[key] = graph.nodes[adjective].get('name')
+        totals[key][0] += count
+        totals[key][1] += weight
+
+    return top_rows(totals, names, by, top)
+
+
+def top_attractions(
+    emotion: str = None,
+    adjective: str = None,
+    continent: str = None,
+    country: str = None,
+    city: str = None,
+    start: str = None,
+    end: str = None,
+    top: int = 10,
+    by: str = 'weight',
+) -> pd.DataFrame:
+    """
+    Attractions most associated with an emotion (through the adjectives associated
+    with it) or with an adjective, by review weight (or `by='count'`), optionally in
+    a location and counting only the reviews between the ISO dates `start` and `end`.
+    """
+    graph = network.AttractionSentimentNet
+    start, end = month_bound(start), month_bound(end, end=True)
+    attractions = network.network_index.attractions_in(continent, country, city)
+    adjectives = None
+    if emotion is not None:
+        adjectives = network.network_index.adjectives_of(emotion)
+    if adjective is not None:
+        adjective_emotion = network.emotions_dict.get(adjective_key(adjective))
+        matches = {adjective_emotion.id} if adjective_emotion else set()
+        adjectives = matches if adjectives is None else adjectives & matches
+
+    totals = defaultdict(lambda: [0, 0])
+    for attraction, adjective_id in matching_edges(attractions, adjectives, start, end):
+        count, weight = edge_activity(graph[attraction][adjective_id], start, end)
+        if count == 0:
+            continue
+        totals[attraction][0] += count
+        totals[attraction][1] += weight
+
+    names = {attraction: graph.nodes[attraction].get('name') for attraction in totals}
+    return top_rows(totals, names, by, top)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Network queries')
+    parser.add_argument(
+        'query',
+        choices=['emotions', 'attractions'],
+        help='top adjectives/emotions of a location or top attractions of an emotion',
+    )
+    parser.add_argument('--continent')
+    parser.add_argument('--country')
+    parser.add_argument('--city')
+    parser.add_argument('--emotion', help='associated emotion (attractions query)')
+    parser.add_argument('--adjective', help='adjective (attractions query)')
+    parser.add_argument(
+        '--since', type=query_date, help='first month (YYYY or YYYY-MM)'
+    )
+    parser.add_argument('--until', type=query_date, help='last month (YYYY or YYYY-MM)')
+    parser.add_argument('--top', type=int, default=10)
+    parser.add_argument('--by', choices=['weight', 'count'], default='weight')
+    parser.add_argument(
+        '--group',
+        choices=['adjective', 'emotion'],
+        default='adjective',
+        help='group the emotions query by adjective or associated emotion',
+    )
+    args = parser.parse_args()
+
+    location = {
+        'continent': args.continent,
+        'country': args.country,
+        'city': args.city,
+    }
+    if args.query == 'emotions':
+        result = top_emotions(
+            **location,
+            start=args.since,
+            end=args.until,
+            top=args.top,
+            by=args.by,
+            group=args.group,
+        )
+    else:
+        result = top_attractions(
+            args.emotion,
+            args.adjective,
+            **location,
+            start=args.since,
+            end=args.until,
+            top=args.top,
+            by=args.by,
+        )
+
+    print(result.to_string() if not result.empty else 'No results.')
@@ -0,0 +1,200 @@
+from contextlib import contextmanager
+import dataclasses
+import glob
+import logging
+import math
+import os
+import tempfile
+from typing import Dict, Iterable, List, Tuple
+import uuid
+
+from dacite import from_dict
+import networkx as nx
+
+import Network.index as index
+import Network.main as network
+import Network.snapshot as snapshot
+import Network.stats as stats
+import Network.temporal as temporal
+import Network.wal as wal
+import Shared.main as utils
+
+logger = logging.getLogger(os.getenv('DATA_NETWORK_LOGGER', 'data-and-network'))
+
+# Parts of the network built separately (by other runs of the pipeline, on other
+# machines...) and merged into it afterwards. Emotion ids only depend on the emotion
+# name (see Network.main.derive_emotion_id), so shards agree on them without
+# coordination.
+SHARDS_PATH = os.path.join(network.MODULE_PATH, 'shards')
+
+Shard = Tuple[nx.Graph, Dict[str, network.Emotion]]
+
+
+def shard_path(name: str) -> str:
+    return os.path.join(SHARDS_PATH, f'{utils.make_string_filesystem_safe(name)}.npz')
+
+
+@contextmanager
+def isolated_network():
+    """
+    Swaps the network for an empty one (graph, emotions, statistics, indexes and raw
+    review dates) with a temporary mutation log and no checkpoints, so the Network
+    functions build it without touching (or loading) the saved network. The previous
+    network is restored on exit. The network is swapped in the Network.main module
+    globals, so it must not be used while other threads update the network.
+    """
+    was_loaded = network.is_loaded()
+    if was_loaded:
+        original_graph = network.AttractionSentimentNet
+        original_emotions = network.emotions_dict
+    original_stats = network.network_stats
+    original_index = network.network_index
+    original_mutation_log = network.mutation_log
+    original_checkpoint_bytes = network.NETWORK_WAL_CHECKPOINT_BYTES
+    original_raw_review_dates = network.pending_raw_review_dates
+    original_merged_shard_ids = network.merged_shard_ids
+
+    with tempfile.TemporaryDirectory() as directory:
+        network.network_stats = stats.NetworkStats()
+        network.network_index = index.NetworkIndex()
+        network.mutation_log = wal.MutationLog(
+            os.path.join(directory, 'graph.wal'),
+            network.NETWORK_WAL_SYNC_RECORDS,
+            network.NETWORK_WAL_SYNC_SECONDS,
+        )
+        network.NETWORK_WAL_CHECKPOINT_BYTES = math.inf
+        network.pending_raw_review_dates = []
+        network.merged_shard_ids = []
+        network.use_network(nx.Graph(), {})
+        try:
+            yield
+        finally:
+            network.mutation_log.close()
+            network.mutation_log = original_mutation_log
+            network.NETWORK_WAL_CHECKPOINT_BYTES = original_checkpoint_bytes
+            network.pending_raw_review_dates = original_raw_review_dates
+            network.merged_shard_ids = original_merged_shard_ids
+            network.network_stats = original_stats
+            network.network_index = original_index
+            if was_loaded:
+                network.AttractionSentimentNet = original_graph
+                network.emotions_dict = original_emotions
+            else:
+                del network.AttractionSentimentNet, network.emotions_dict
+
+
+def save_shard(path: str, graph: nx.Graph, emotions: Dict[str, network.Emotion]):
+    """
+    A graph snapshot with the emotions of the shard and a unique shard id (see
+    merge_shards_into_network) in its metadata.
+    """
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    snapshot.save_snapshot(
+        graph,
+        path,
+        metadata={
+            'shard_id': uuid.uuid4().hex,
+            'emotions': [dataclasses.asdict(emotion) for emotion in emotions.values()],
+        },
+    )
+    logger.info(
+        f'Shard saved to {path}: {graph.number_of_nodes()} nodes, '
+        f'{graph.number_of_edges()} edges.'
+    )
+
+
+def export_shard(name: str):
+    """Saves the network to `shard_path(name)`, to be merged into another network."""
+    save_shard(shard_path(name), network.get_graph(), network.get_emotions())
+
+
+def load_shard(path: str) -> Shard:
+    graph, metadata = snapshot.load_snapshot(path, with_metadata=True)
+    emotions = {}
+    for data in metadata.get('emotions', []):
+        emotion = from_dict(data_class=network.Emotion, data=data)
+        emotions[emotion.name] = emotion
+
+    return graph, emotions
+
+
+def merge_shards(shards: Iterable[Shard]) -> Shard:
+    """
+    Combines shards in the given order: nodes and emotions keep the attributes of
+    the first shard that has them, edges present in several shards add their
+    weights, counts and monthly aggregates. Merging the shards of a partition of the
+    reviews gives the same graph as adding all of them to a single network. Raises
+    ValueError for emotions whose id is not the one derived from their name, since
+    their nodes would not be merged with the other shards'.
+    """
+    merged_graph = nx.Graph()
+    merged_emotions: Dict[str, network.Emotion] = {}
+    for graph, emotions in shards:
+        for name, emotion in emotions.items():
+            if emotion.id != network.derive_emotion_id(emotion.type, name):
+                raise ValueError(
+                    f'Emotion "{name}" has the id {emotion.id}, not the one derived '
+                    'from its name (run `just migrate_emotion_ids` on the network '
+                    'the shard was built from).'
+                )
+            merged_emotions.setdefault(name, dataclasses.replace(emotion))
+
+        for node, data in graph.nodes.items():
+            if node not in merged_graph:
+                merged_graph.add_node(node, **data)
+
+        for source, target, data in graph.edges(data=True):
+            if not merged_graph.has_edge(source, target):
+                merged_graph.add_edge(
+                    source,
+                    target,
+                    **{
+                        key: list(value) if isinstance(value, list) else value
+                        for key, value in data.items()
+                    },
+                )
+                continue
+
+            edge = merged_graph[source][target]
+            edge['weight'] += data['weight']
+            edge['count'] += data['count']
+            temporal.merge_timelines(edge, data)
+
+    return merged_graph, merged_emotions
+
+
+def shard_paths() -> List[str]:
+    """Saved shards, sorted by name so merges are deterministic."""
+    return sorted(glob.glob(os.path.join(SHARDS_PATH, '*.npz')))
+
+
+def merge_shards_into_network(paths: List[str] = None, remove: bool = False):
+    """
+    Merges the saved shards (all of them by default, in name order) into the network
+    and saves it. The ids of the merged shards are saved with the network, so shards
+    already merged are skipped and running the merge again changes nothing. With
+    `remove`, merged shard files are deleted afterwards.
+    """
+    paths = shard_paths() if paths is None else paths
+    network_graph = network.get_graph()
+    new_paths = {}
+    for path in paths:
+        shard_id = snapshot.load_metadata(path).get('shard_id', path)
+        if shard_id in network.merged_shard_ids or shard_id in new_paths:
+            logger.info(f'Shard {path} is already merged into the network, skipping.')
+        else:
+            new_paths[shard_id] = path
+
+    if new_paths:
+        graph, emotions = merge_shards(
+            [(network_graph, network.get_emotions())]
+            + [load_shard(path) for path in new_paths.values()]
+        )
+        network.use_network(graph, emotions)
+        network.merged_shard_ids.extend(new_paths)
+        network.save_graph()
+    logger.info(f'Merged {len(new_paths)} shards into the network.')
+
+    if remove:
+        for path in paths:
+            os.remove(path)
@@ -0,0 +1,333 @@
+import json
+import os
+from typing import Any, Dict, Iterator, List, Tuple
+
+import networkx as nx
+import numpy as np
+
+# Binary graph snapshot: a compressed NPZ file with the node ids, the edge endpoints
+# (as node indexes) and one set of arrays per node or edge attribute. Each attribute
+# column is stored with the most compact encoding its values allow (see
+# encode_column), missing values are kept apart from None.
+SNAPSHOT_VERSION = 1
+
+MISSING, NONE, PRESENT = 0, 1, 2
+
+# Attributes with values GML or GEXF can not store (None, dicts, booleans, lists in
+# GEXF) are written as JSON text under the attribute name with this suffix
+JSON_ATTRIBUTE_SUFFIX = '__json'
+
+
+def is_int(value) -> bool:
+    # Exact type check first, this runs for every value of every column
+    return type(value) is int or isinstance(value, np.integer)
+
+
+def encode_column(values: List[Any], present: np.ndarray) -> Dict[str, np.ndarray]:
+    """
+    Arrays of an attribute column. `present` holds MISSING, NONE or PRESENT for each
+    row and only PRESENT values are encoded:
+    - 'int' / 'float' / 'str': a single array with one value per present row
+    - 'int_list': lists of ints, concatenated with the offsets of each list
+    - 'json': JSON text of each value (dicts, mixed lists, booleans...)
+    """
+    values = [value for value, state in zip(values, present) if state == PRESENT]
+
+    if all(is_int(value) for value in values):
+        kind, arrays = 'int', {'values': np.array(values, dtype=np.int64)}
+    elif all(isinstance(value, (float, np.floating)) for value in values):
+        kind, arrays = 'float', {'values': np.array(values, dtype=np.float64)}
+    elif all(isinstance(value, str) for value in values):
+        kind, arrays = 'str', {'values': np.array(values, dtype=np.str_)}
+    elif all(type(value) is list for value in values) and all(
+        is_int(item) for value in values for item in value
+    ):
+        kind = 'int_list'
+        arrays = {
+            'values': np.array(
+                [item for value in values for item in value], dtype=np.int64
+            ),
+            'offsets': np.cumsum([0] + [len(value) for value in values]),
+        }
+    else:
+        kind = 'json'
+        arrays = {
+            'values': np.array(
+                [json.dumps(value, ensure_ascii=False) for value in values],
+                dtype=np.str_,
+            )
+        }
+
+    return {'kind': np.array(kind), 'present': present.astype(np.uint8), **arrays}
+
+
+def decode_column(arrays: Dict[str, np.ndarray]) -> List[Any]:
+    """Value of each row (MISSING rows are returned as the MISSING sentinel)."""
+    kind = str(arrays['kind'])
+    if kind == 'int_list':
+        items = arrays['values'].tolist()
+        offsets = arrays['offsets'].tolist()
+        values = [items[start:end] for start, end in zip(offsets, offsets[1:])]
+    elif kind == 'json':
+        values = [json.loads(value) for value in arrays['values'].tolist()]
+    else:
+        values = arrays['values'].tolist()
+
+    values_iter = iter(values)
+    return [
+        next(values_iter) if state == PRESENT else None if state == NONE else MISSING
+        for state in arrays['present'].tolist()
+    ]
+
+
+def encode_attributes(rows: List[Dict], prefix: str, arrays: Dict[str, np.ndarray]):
+    keys = list(dict.fromkeys(key for row in rows for key in row))
+    for index, key in enumerate(keys):
+        values = [row.get(key) for row in rows]
+        present = np.array(
+            [
+                MISSING if key not in row else NONE if row[key] is None else PRESENT
+                for row in rows
+            ],
+            dtype=np.uint8,
+        )
+        arrays[f'{prefix}/{index}/key'] = np.array(key)
+        for name, array in encode_column(values, present).items():
+            arrays[f'{prefix}/{index}/{name}'] = array
+
+
+def load_columns(snapshot, prefix: str) -> List[Tuple[str, Dict[str, np.ndarray]]]:
+    """(attribute name, arrays) of every attribute column of the nodes or edges."""
+    columns: Dict[str, Dict[str, np.ndarray]] = {}
+    for name in snapshot.files:
+        if name.startswith(f'{prefix}/'):
+            _, index, array_name = name.split('/')
+            columns.setdefault(index, {})[array_name] = snapshot[name]
+
+    return [
+        (str(columns[index]['key']), columns[index])
+        for index in sorted(columns, key=int)
+    ]
+
+
+def decode_attributes(snapshot, prefix: str) -> List[Dict]:
+    rows = None
+    for key, arrays in load_columns(snapshot, prefix):
+        values = decode_column(arrays)
+        if rows is None:
+            rows = [{} for _ in values]
+        for row, value in zip(rows, values):
+            if value is not MISSING:
+                row[key] = value
+
+    return rows
+
+
+def decode_column_rows(
+    arrays: Dict[str, np.ndarray], value_offsets: np.ndarray, start: int, end: int
+) -> List[Any]:
+    """
+    Like decode_column for rows `start` to `end` only. `value_offsets[row]` is the
+    number of PRESENT rows before `row` (see iter_attribute_rows).
+    """
+    kind = str(arrays['kind'])
+    first, last = int(value_offsets[start]), int(value_offsets[end])
+    if kind == 'int_list':
+        offsets = arrays['offsets'][first : last + 1].tolist()
+        items = arrays['values'][offsets[0] : offsets[-1]].tolist()
+        values = [
+            items[item_start - offsets[0] : item_end - offsets[0]]
+            for item_start, item_end in zip(offsets, offsets[1:])
+        ]
+    elif kind == 'json':
+        values = [json.loads(value) for value in arrays['values'][first:last].tolist()]
+    else:
+        values = arrays['values'][first:last].tolist()
+
+    values_iter = iter(values)
+    return [
+        next(values_iter) if state == PRESENT else None if state == NONE else MISSING
+        for state in arrays['present'][start:end].tolist()
+    ]
+
+
+def iter_attribute_rows(
+    columns: List[Tuple[str, Dict[str, np.ndarray]]], count: int, chunk_rows: int
+) -> Iterator[Dict]:
+    """
+    Attributes of each of the `count` nodes or edges of `columns` (see
+    load_columns), decoded `chunk_rows` rows at a time so only one chunk of Python
+    values exists at once.
+    """
+    value_offsets = [
+        np.concatenate(([0], np.cumsum(arrays['present'] == PRESENT)))
+        for _, arrays in columns
+    ]
+    for start in range(0, count, chunk_rows):
+        end = min(start + chunk_rows, count)
+        rows = [{} for _ in range(end - start)]
+        for (key, arrays), offsets in zip(columns, value_offsets):
+            for row, value in zip(
+                rows, decode_column_rows(arrays, offsets, start, end)
+            ):
+                if value is not MISSING:
+                    row[key] = value
+        yield from rows
+
+
+def save_snapshot(graph: nx.Graph, path: str, metadata: Dict = None):
+    """
+    Writes the graph (node, edge and graph attributes included) to `path`, with
+    optional JSON `metadata` about the snapshot itself.
+    """
+    nodes = list(graph.nodes)
+    node_indexes = {node: index for index, node in enumerate(nodes)}
+    edges = list(graph.edges(data=True))
+
+    arrays = {
+        'version': np.array(SNAPSHOT_VERSION),
+        'graph': np.array(json.dumps(graph.graph, ensure_ascii=False)),
+        'metadata': np.array(json.dumps(metadata or {})),
+        'nodes': np.array([str(node) for node in nodes], dtype=np.str_),
+        'sources': np.array(
+            [node_indexes[source] for source, _, _ in edges], dtype=np.int64
+        ),
+        'targets': np.array(
+            [node_indexes[target] for _, target, _ in edges], dtype=np.int64
+        ),
+    }
+    encode_attributes([graph.nodes[node] for node in nodes], 'node', arrays)
+    encode_attributes([data for _, _, data in edges], 'edge', arrays)
+
+    # Written next to the target and renamed, so a crash never leaves half a snapshot
+    temporary_path = f'{path}.tmp.npz'
+    np.savez_compressed(temporary_path, **arrays)
+    os.replace(temporary_path, path)
+
+
+def load_metadata(path: str) -> Dict:
+    """Metadata of the snapshot in `path`, without reading the graph."""
+    with np.load(path, allow_pickle=False) as snapshot:
+        return json.loads(str(snapshot['metadata'])) if 'metadata' in snapshot else {}
+
+
+def load_snapshot(path: str, with_metadata: bool = False):
+    """The graph in `path`, or the graph and the snapshot metadata with `with_metadata`."""
+    with np.load(path, allow_pickle=False) as snapshot:
+        if int(snapshot['version']) > SNAPSHOT_VERSION:
+            raise ValueError(f'Unsupported graph snapshot version in {path}')
+
+        nodes = snapshot['nodes'].tolist()
+        node_rows = decode_attributes(snapshot, 'node') or [{} for _ in nodes]
+        sources = snapshot['sources'].tolist()
+        targets = snapshot['targets'].tolist()
+        edge_rows = decode_attributes(snapshot, 'edge') or [{} for _ in sources]
+
+        graph = nx.Graph(**json.loads(str(snapshot['graph'])))
+        metadata = (
+            json.loads(str(snapshot['metadata'])) if 'metadata' in snapshot else {}
+        )
+
+    graph.add_nodes_from(zip(nodes, node_rows))
+    graph.add_edges_from(
+        (nodes[source], nodes[target], data)
+        for source, target, data in zip(sources, targets, edge_rows)
+    )
+
+    return (graph, metadata) if with_metadata else graph
+
+
+# GML and GEXF keep `id` and `label` for themselves, GEXF also reads the edge weight
+# as a float and adds these graph attributes
+RESERVED_ATTRIBUTES = {'id', 'label'}
+GEXF_GRAPH_DEFAULTS = {'mode': 'static', 'edge_default': {}, 'node_default': {}}
+
+
+def needs_json(value, gexf: bool) -> bool:
+    if isinstance(value, list):
+        return gexf or not all(
+            isinstance(item, (str, int, float)) and not isinstance(item, bool)
+            for item in value
+        )
+    return value is None or isinstance(value, (dict, bool))
+
+
+def to_text_format_graph(graph: nx.Graph, gexf: bool = False) -> nx.Graph:
+    """
+    Copy of the graph GML (or GEXF) can store: attributes with None, dict, bool or
+    unsupported list values are replaced by their JSON text under a
+    JSON_ATTRIBUTE_SUFFIX name, which from_text_format_graph reverts. In GEXF the
+    edge weight is kept for Gephi and also stored as JSON when it is not a float.
+    """
+
+    def convert(data: Dict) -> Dict:
+        converted = {}
+        for key, value in data.items():
+            json_key = f'{key}{JSON_ATTRIBUTE_SUFFIX}'
+            if needs_json(value, gexf) or key in RESERVED_ATTRIBUTES:
+                converted[json_key] = json.dumps(value, ensure_ascii=False)
+                continue
+
+            converted[key] = value
+            if gexf and key == 'weight' and not isinstance(value, float):
+                converted[json_key] = json.dumps(value)
+        return converted
+
+    copy = nx.Graph(**graph.graph)
+    copy.add_nodes_from((node, convert(data)) for node, data in graph.nodes.items())
+    copy.add_edges_from(
+        (source, target, convert(data))
+        for source, target, data in graph.edges(data=True)
+    )
+
+    return copy
+
+
+def from_text_format_graph(graph: nx.Graph, gexf: bool = False) -> nx.Graph:
+    """Reverts to_text_format_graph on a graph read from GML or GEXF (in place)."""
+    if gexf:
+        for key, default in GEXF_GRAPH_DEFAULTS.items():
+            if graph.graph.get(key) == default:
+                del graph.graph[key]
+
+    attribute_dicts = [
+        *graph.nodes.values(),
+        *(data for *_, data in graph.edges(data=True)),
+    ]
+    for data in attribute_dicts:
+        # Added by the readers
+        for key in RESERVED_ATTRIBUTES:
+            data.pop(key, None)
+        for key in [key for key in data if key.endswith(JSON_ATTRIBUTE_SUFFIX)]:
+            data[key[: -len(JSON_ATTRIBUTE_SUFFIX)]] = json.loads(data.pop(key))
+
+    return graph
+
+
+def write_graph(graph: nx.Graph, path: str):
+    """Writes a snapshot (.npz), GML (.gml) or GEXF (.gexf) file by extension."""
+    extension = os.path.splitext(path)[1].lower()
+    if extension == '.npz':
+        save_snapshot(graph, path)
+    elif extension == '.gml':
+        nx.write_gml(to_text_format_graph(graph), path)
+    elif extension == '.gexf':
+        nx.write_gexf(to_text_format_graph(graph, gexf=True), path)
+    else:
+        raise ValueError(f'Unsupported graph format: {path}')
+
+
+def read_graph(path: str, backend: str = None) -> nx.Graph:
+    """
+    Reads a snapshot ('npz'), GML ('gml') or GEXF ('gexf') file, by `backend` or by
+    the file extension.
+    """
+    backend = backend or os.path.splitext(path)[1].lower().lstrip('.')
+    if backend == 'npz':
+        return load_snapshot(path)
+    elif backend == 'gml':
+        return from_text_format_graph(nx.read_gml(path))
+    elif backend == 'gexf':
+        return from_text_format_graph(nx.read_gexf(path), gexf=True)
+
+    raise ValueError(f'Unsupported graph format: {path}')
@@ -0,0 +1,136 @@
+from typing import Dict, Hashable, Optional, Tuple
+
+import networkx as nx
+
+ATTRACTION_GROUP = 'attraction'
+EMOTION_GROUP = 'emotion'
+
+
+def node_group(node_type: str) -> str:
+    return ATTRACTION_GROUP if node_type == 'attraction' else EMOTION_GROUP
+
+
+class NetworkStats:
+    """
+    Statistics of the network kept up to date by the graph update functions instead of
+    being recomputed from the whole graph: node and edge counts, degree sums and the
+    highest degree node of each group (attractions and emotions), the highest weight
+    edge and the connected components (union-find).
+
+    Nodes, edges, degrees and weights only grow between calls to `rebuild`, which is
+    what keeps the running maximums right. Anything that removes nodes or edges (like
+    merging emotions) or replaces the graph must call `rebuild` afterwards.
+
+    `version` changes with every update (it is never reset), so it can be used to
+    invalidate anything derived from the graph.
+    """
+
+    def __init__(self):
+        self.version = 0
+        self.reset()
+
+    def reset(self):
+        self.version += 1
+        self.num_nodes = 0
+        self.num_edges = 0
+        self.group_nodes = {ATTRACTION_GROUP: 0, EMOTION_GROUP: 0}
+        self.group_degrees = {ATTRACTION_GROUP: 0, EMOTION_GROUP: 0}
+        self.highest_degree: Dict[str, Optional[Tuple[Hashable, int]]] = {
+            ATTRACTION_GROUP: None,
+            EMOTION_GROUP: None,
+        }
+        self.highest_weight_edge: Optional[Tuple[Hashable, Hashable, int]] = None
+        self.num_components = 0
+        self._parents: Dict[Hashable, Hashable] = {}
+        self._groups: Dict[Hashable, str] = {}
+
+    def rebuild(self, graph: nx.Graph):
+        """Recomputes everything from `graph` (O(nodes + edges))."""
+        self.reset()
+        for node, data in graph.nodes.items():
+            self.node_added(node, data.get('type'))
+        for source, target, data in graph.edges(data=True):
+            self.edge_added(graph, source, target)
+            self.edge_weight_changed(source, target, data['weight'])
+
+    def _find(self, node: Hashable) -> Hashable:
+        parents = self._parents
+        while parents[node] != node:
+            # Path halving
+            parents[node] = parents[parents[node]]
+            node = parents[node]
+        return node
+
+    def _union(self, node: Hashable, other: Hashable):
+        root, other_root = self._find(node), self._find(other)
+        if root != other_root:
+            self._parents[other_root] = root
+            self.num_components -= 1
+
+    def _update_highest_degree(self, graph: nx.Graph, node: Hashable):
+        group = self._groups[node]
+        degree = graph.degree(node)
+        highest = self.highest_degree[group]
+        if highest is None or degree > highest[1]:
+            self.highest_degree[group] = (node, degree)
+
+    def node_added(self, node: Hashable, node_type: str):
+        group = node_group(node_type)
+        self.version += 1
+        self.num_nodes += 1
+        self.group_nodes[group] += 1
+        self._groups[node] = group
+        self._parents[node] = node
+        self.num_components += 1
+        if self.highest_degree[group] is None:
+            self.highest_degree[group] = (node, 0)
+
+    def edge_added(self, graph: nx.Graph, source: Hashable, target: Hashable):
+        """Called once `source`-`target` is in `graph` (and its endpoints counted)."""
+        self.version += 1
+        self.num_edges += 1
+        for node in (source, target):
+            self.group_degrees[self._groups[node]] += 1
+            self._update_highest_degree(graph, node)
+        self._union(source, target)
+
+    def edge_weight_changed(self, source: Hashable, target: Hashable, weight: int):
+        self.version += 1
+        if self.highest_weight_edge is None or weight > self.highest_weight_edge[2]:
+            # Stored as (attraction, emotion)
+            if self._groups[source] != ATTRACTION_GROUP:
+                source, target = target, source
+            self.highest_weight_edge = (source, target, weight)
+
+    def as_info(self, graph: nx.Graph) -> Dict:
+        """Network information in the network_info.json format."""
+        network_info = {
+            'num_nodes': self.num_nodes,
+            'num_edges': self.num_edges,
+            'avg_degree': 2 * self.num_edges / self.num_nodes if self.num_nodes else 0,
+            'num_components': self.num_components,
+        }
+        for group in (ATTRACTION_GROUP, EMOTION_GROUP):
+            if self.group_nodes[group]:
+                network_info[f'avg_{group}_degree'] = (
+                    self.group_degrees[group] / self.group_nodes[group]
+                )
+
+        for group in (ATTRACTION_GROUP, EMOTION_GROUP):
+            if self.highest_degree[group] is not None:
+                node, degree = self.highest_degree[group]
+                network_info[f'highest_degree_{group}'] = {
+                    **graph.nodes[node],
+                    'degree': degree,
+                }
+
+        if self.highest_weight_edge is not None:
+            attraction, emotion, weight = self.highest_weight_edge
+            network_info['highest_weight_edge'] = {
+                'attraction': graph.nodes[attraction],
+                'emotion': graph.nodes[emotion],
+                'weight': weight,
+                'count': graph[attraction][emotion]['count'],
+            }
+
+        return network_info
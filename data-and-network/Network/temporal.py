@@ -0,0 +1,154 @@
+from bisect import bisect_left, bisect_right
+from typing import Dict, Iterable, List, Optional, Tuple
+
+# Edges keep one bucket per month with reviews instead of every review date: sorted
+# month indexes (year * 12 + month - 1) and, in parallel, the review count and weight
+# sum of each month. Reviews without a date only count towards the edge totals.
+MONTHS_KEY = 'months'
+MONTH_COUNTS_KEY = 'month_counts'
+MONTH_WEIGHTS_KEY = 'month_weights'
+
+
+def as_list(value):
+    # GML stores single element lists as plain values
+    return value if isinstance(value, list) else [value]
+
+
+def month_index(review_date: str) -> Optional[int]:
+    """Month index of an ISO date ("2024-05-17T10:00:00" -> 2024 * 12 + 4)."""
+    if not review_date:
+        return None
+    try:
+        year, month = int(review_date[:4]), int(review_date[5:7])
+    except ValueError:
+        return None
+    if not 1 <= month <= 12:
+        return None
+
+    return year * 12 + month - 1
+
+
+def bound_month_index(date: str) -> int:
+    """Month index of a query bound, raises ValueError when it is not an ISO date."""
+    month = month_index(date)
+    if month is None:
+        raise ValueError(f'Invalid date "{date}", expected an ISO date (YYYY-MM).')
+    return month
+
+
+def month_label(index: int) -> str:
+    return f'{index // 12:04d}-{index % 12 + 1:02d}'
+
+
+def get_timeline(edge: Dict) -> Tuple[List[int], List[int], List[int]]:
+    """Months, counts and weights of an edge (lists stored in the edge itself)."""
+    for key in (MONTHS_KEY, MONTH_COUNTS_KEY, MONTH_WEIGHTS_KEY):
+        edge[key] = as_list(edge[key]) if key in edge else []
+
+    return edge[MONTHS_KEY], edge[MONTH_COUNTS_KEY], edge[MONTH_WEIGHTS_KEY]
+
+
+def add_to_timeline(edge: Dict, month: Optional[int], count: int, weight: int):
+    if month is None:
+        return
+
+    months, counts, weights = get_timeline(edge)
+    position = bisect_left(months, month)
+    if position < len(months) and months[position] == month:
+        counts[position] += count
+        weights[position] += weight
+    else:
+        months.insert(position, month)
+        counts.insert(position, count)
+        weights.insert(position, weight)
+
+
+def add_buckets(edge: Dict, months: List[int], counts: List[int], weights: List[int]):
+    """Adds sorted monthly buckets into `edge` with a single merge pass."""
+    edge_months, edge_counts, edge_weights = get_timeline(edge)
+    if not edge_months:
+        edge[MONTHS_KEY], edge[MONTH_COUNTS_KEY], edge[MONTH_WEIGHTS_KEY] = (
+            list(months),
+            list(counts),
+            list(weights),
+        )
+        return
+
+    merged_months, merged_counts, merged_weights = [], [], []
+    i = j = 0
+    while i < len(edge_months) or j < len(months):
+        if j == len(months) or (i < len(edge_months) and edge_months[i] < months[j]):
+            merged_months.append(edge_months[i])
+            merged_counts.append(edge_counts[i])
+            merged_weights.append(edge_weights[i])
+            i += 1
+        elif i == len(edge_months) or months[j] < edge_months[i]:
+            merged_months.append(months[j])
+            merged_counts.append(counts[j])
+            merged_weights.append(weights[j])
+            j += 1
+        else:
+            merged_months.append(months[j])
+            merged_counts.append(edge_counts[i] + counts[j])
+            merged_weights.append(edge_weights[i] + weights[j])
+            i += 1
+            j += 1
+
+    edge[MONTHS_KEY] = merged_months
+    edge[MONTH_COUNTS_KEY] = merged_counts
+    edge[MONTH_WEIGHTS_KEY] = merged_weights
+
+
+def merge_timelines(edge: Dict, other: Dict):
+    """Adds the monthly buckets of `other` into `edge`."""
+    add_buckets(edge, *get_timeline(other))
+
+
+def timeline_from_dates(
+    review_dates: Iterable[str], total_weight: int
+) -> Tuple[List[int], List[int], List[int]]:
+    """
+    Monthly buckets of a list of review dates whose weights were only kept as a total
+    (graphs saved before the aggregation). The weight is split between months in
+    proportion to their review counts, keeping the exact total.
+    """
+    review_dates = [date for date in as_list(review_dates) if date is not None]
+    month_counts: Dict[int, int] = {}
+    for review_date in review_dates:
+        month = month_index(review_date)
+        if month is not None:
+            month_counts[month] = month_counts.get(month, 0) + 1
+
+    months = sorted(month_counts)
+    counts = [month_counts[month] for month in months]
+    weights = []
+    total_count = len(review_dates)
+    cumulative_count = 0
+    assigned_weight = 0
+    for count in counts:
+        cumulative_count += count
+        cumulative_weight = round(total_weight * cumulative_count / total_count)
+        weights.append(cumulative_weight - assigned_weight)
+        assigned_weight = cumulative_weight
+
+    return months, counts, weights
+
+
+def activity_between(edge: Dict, start: str = None, end: str = None) -> Tuple[int, int]:
+    """
+    Review count and weight sum of an edge between the months of the ISO dates
+    `start` and `end` (both included, open when None).
+    """
+    months, counts, weights = get_timeline(edge)
+    first = bisect_left(months, bound_month_index(start)) if start else 0
+    last = bisect_right(months, bound_month_index(end)) if end else len(months)
+
+    return sum(counts[first:last]), sum(weights[first:last])
+
+
+def monthly_activity(edge: Dict) -> Dict[str, Tuple[int, int]]:
+    """Review count and weight sum of each month with reviews ("YYYY-MM")."""
+    return {
+        month_label(month): (count, weight)
+        for month, count, weight in zip(*get_timeline(edge))
+    }
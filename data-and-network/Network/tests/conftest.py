@@ -0,0 +1,42 @@
+"""
+Test configuration and fixtures for the Network tests.
+"""
+
+import os
+
+import pytest
+
+import Network.benchmark as benchmark
+import Network.main as network
+import Network.shards as shards
+
+
+@pytest.fixture
+def scratch_network(tmp_path, monkeypatch):
+    """Isolated empty network reading and saving its files in a temporary directory"""
+    monkeypatch.setattr(
+        network, 'EXISTING_SNAPSHOT_PATH', os.path.join(tmp_path, 'graph.npz')
+    )
+    monkeypatch.setattr(
+        network, 'EXISTING_GRAPH_PATH', os.path.join(tmp_path, 'graph.gml')
+    )
+    monkeypatch.setattr(
+        network, 'EXISTING_EMOTIONS_PATH', os.path.join(tmp_path, 'emotions.json')
+    )
+    monkeypatch.setattr(
+        network, 'RAW_REVIEW_DATES_PATH', os.path.join(tmp_path, 'review_dates.csv')
+    )
+    monkeypatch.setattr(
+        network, 'NETWORK_INFO_PATH', os.path.join(tmp_path, 'network_info.json')
+    )
+
+    with shards.isolated_network():
+        yield network
+
+
+@pytest.fixture
+def synthetic_reviews():
+    """Synthetic adjective occurrences of a few attractions (see Network.benchmark)"""
+    return benchmark.generate_reviews(
+        attractions=12, occurrences=60, vocabulary=40, seed=7
+    )
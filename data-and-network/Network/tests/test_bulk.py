@@ -0,0 +1,135 @@
+"""
+Test adding the adjective occurrences of an attraction with add_edges_bulk gives the
+same network as calling add_edge for each of them.
+"""
+
+from collections import defaultdict
+
+import networkx as nx
+import numpy as np
+import pytest
+
+import Network.benchmark as benchmark
+import Network.main as network
+
+
+def edge_case_reviews(reviews):
+    """
+    Reviews with names that normalize to the same adjective, missing and invalid
+    dates and scores whose weights round half to even
+    """
+    varied = []
+    for attraction, names, scores, ratings, emotions, dates in reviews:
+        names = [
+            f'{name.upper()}!' if i % 5 == 0 else name for i, name in enumerate(names)
+        ]
+        dates = [
+            None if i % 4 == 0 else 'not a date' if i % 7 == 0 else date
+            for i, date in enumerate(dates)
+        ]
+        scores = [0.25 if i % 6 == 0 else score for i, score in enumerate(scores)]
+        ratings = [5 if i % 6 == 0 else rating for i, rating in enumerate(ratings)]
+        varied.append((attraction, names, scores, ratings, emotions, dates))
+
+    return varied
+
+
+def logged_mutations(mutation_log):
+    """
+    Node records in order and the edge records summed by edge and month (add_edge
+    logs one record per occurrence, add_edges_bulk one per month)
+    """
+    mutation_log.sync()
+    nodes = []
+    edges = defaultdict(lambda: [0, 0])
+    for record in mutation_log.replay():
+        if hasattr(record, 'node_id'):
+            nodes.append((record.node_id, record.attributes))
+        else:
+            key = (
+                record.attraction_id,
+                record.emotion_name,
+                record.emotion_type,
+                record.associated_emotion,
+                record.month,
+            )
+            edges[key][0] += record.count
+            edges[key][1] += record.weight
+
+    return nodes, dict(edges)
+
+
+def build(build_function, reviews):
+    """Everything add_edge and add_edges_bulk update, built from an empty network"""
+    benchmark.reset_scratch_network()
+    build_function(reviews)
+    graph = network.AttractionSentimentNet
+
+    return {
+        'graph': graph,
+        'emotions': dict(network.emotions_dict),
+        'stats': network.network_stats.as_info(graph),
+        'components': network.network_stats.num_components,
+        'index': (
+            network.network_index.attractions_by_location,
+            network.network_index.adjectives_by_emotion,
+            network.network_index.edges_by_month,
+        ),
+        'mutations': logged_mutations(network.mutation_log),
+        'raw_review_dates': list(network.pending_raw_review_dates),
+    }
+
+
+@pytest.mark.usefixtures('scratch_network')
+class TestAddEdgesBulk:
+    """Test add_edges_bulk matches repeated add_edge calls"""
+
+    @pytest.mark.parametrize('edge_cases', [False, True])
+    def test_matches_add_edge(self, synthetic_reviews, monkeypatch, edge_cases):
+        monkeypatch.setattr(network, 'KEEP_RAW_REVIEW_DATES', True)
+        reviews = (
+            edge_case_reviews(synthetic_reviews) if edge_cases else synthetic_reviews
+        )
+
+        one_by_one = build(benchmark.build_with_add_edge, reviews)
+        bulk = build(benchmark.build_with_add_edges_bulk, reviews)
+
+        # Weights, counts and monthly buckets of every edge, and the node attributes
+        assert nx.utils.graphs_equal(bulk['graph'], one_by_one['graph'])
+        assert list(bulk['graph'].nodes) == list(one_by_one['graph'].nodes)
+        assert bulk['emotions'] == one_by_one['emotions']
+        assert bulk['stats'] == one_by_one['stats']
+        assert bulk['components'] == one_by_one['components']
+        assert bulk['index'] == one_by_one['index']
+        assert bulk['mutations'] == one_by_one['mutations']
+        assert bulk['raw_review_dates'] == one_by_one['raw_review_dates']
+
+    def test_replayed_log_matches(self, synthetic_reviews):
+        """Test the bulk mutation log replays into the graph it was logged from"""
+        bulk = build(benchmark.build_with_add_edges_bulk, synthetic_reviews)
+
+        network.use_network(nx.Graph(), {})
+        network.replay_mutation_log()
+
+        assert nx.utils.graphs_equal(network.AttractionSentimentNet, bulk['graph'])
+
+    def test_empty_attraction(self, synthetic_reviews):
+        """Test an attraction without occurrences adds and logs nothing"""
+        attraction = synthetic_reviews[0][0]
+
+        network.add_edges_bulk(attraction, [], 'adjective', [], [])
+
+        assert network.AttractionSentimentNet.number_of_nodes() == 0
+        assert logged_mutations(network.mutation_log) == ([], {})
+
+
+@pytest.mark.parametrize('rating', [1, 2, 3, 4, 5, 0, 7])
+def test_vectorized_weights(rating):
+    """Test the vectorized weights round like calculate_adequacy_weight"""
+    scores = np.linspace(-1.5, 1.5, 61)
+
+    weights = network.calculate_adequacy_weights(scores, np.full(len(scores), rating))
+
+    assert weights.tolist() == [
+        network.calculate_adequacy_weight(score, rating) for score in scores
+    ]
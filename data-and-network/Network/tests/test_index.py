@@ -0,0 +1,171 @@
+"""
+Test the secondary indexes of the network against a full scan of the graph, and the
+date bounds of the query command.
+"""
+
+import argparse
+import os
+import subprocess
+import sys
+
+import networkx as nx
+import pytest
+
+import Network.benchmark as benchmark
+import Network.index as index
+import Network.main as network
+import Network.query as query
+import Network.shards as shards
+import Network.temporal as temporal
+import Network.wal as wal
+
+PROJECT_DIR = os.path.dirname(network.MODULE_PATH)
+
+
+def scanned_index(graph):
+    """Indexes computed by walking every node and edge of the graph"""
+    attractions_by_location = {level: {} for level in index.LOCATION_LEVELS}
+    adjectives_by_emotion = {}
+    for node, data in graph.nodes.items():
+        if data.get('type') == 'attraction':
+            for level in index.LOCATION_LEVELS:
+                value = (data.get('location') or {}).get(level)
+                if value:
+                    attractions_by_location[level].setdefault(
+                        value.strip().casefold(), set()
+                    ).add(node)
+        elif data.get('associated_emotion'):
+            adjectives_by_emotion.setdefault(
+                data['associated_emotion'].strip().casefold(), set()
+            ).add(node)
+
+    edges_by_month = {}
+    for source, target, data in graph.edges(data=True):
+        if graph.nodes[source].get('type') != 'attraction':
+            source, target = target, source
+        for month in temporal.get_timeline(data)[0]:
+            edges_by_month.setdefault(month, set()).add((source, target))
+
+    return attractions_by_location, adjectives_by_emotion, edges_by_month
+
+
+def assert_matches_scan(network_index, graph):
+    attractions_by_location, adjectives_by_emotion, edges_by_month = scanned_index(
+        graph
+    )
+    assert network_index.attractions_by_location == attractions_by_location
+    assert network_index.adjectives_by_emotion == adjectives_by_emotion
+    assert network_index.edges_by_month == edges_by_month
+
+    months = sorted(edges_by_month)
+    for start, end in [
+        (None, None),
+        (months[0], months[-1]),
+        (months[len(months) // 3], months[2 * len(months) // 3]),
+        (months[-1] + 1, None),
+    ]:
+        labels = [
+            temporal.month_label(month) if month else None for month in (start, end)
+        ]
+        expected = {
+            edge
+            for month, edges in edges_by_month.items()
+            if (start is None or month >= start) and (end is None or month <= end)
+            for edge in edges
+        }
+        assert network_index.edges_between(*labels) == expected
+
+    for city, attractions in attractions_by_location['city'].items():
+        assert network_index.attractions_in(city=city.upper()) == attractions
+
+
+def with_undated_reviews(reviews):
+    """Reviews with every third date missing"""
+    return [
+        (
+            *review[:5],
+            [None if i % 3 == 0 else date for i, date in enumerate(review[5])],
+        )
+        for review in reviews
+    ]
+
+
+@pytest.mark.usefixtures('scratch_network')
+class TestNetworkIndex:
+    """Test the indexes kept up to date by the graph updates match a full scan"""
+
+    def test_mixed_mutations(self, synthetic_reviews):
+        reviews = with_undated_reviews(synthetic_reviews)
+
+        benchmark.build_with_add_edge(reviews[:3])
+        assert_matches_scan(network.network_index, network.AttractionSentimentNet)
+
+        # New edges and new months of existing edges
+        benchmark.build_with_add_edges_bulk(reviews[3:6] + reviews[:1])
+        assert_matches_scan(network.network_index, network.AttractionSentimentNet)
+
+        # Mutations only in the log, replayed over the snapshot after a restart
+        network.save_graph()
+        benchmark.build_with_add_edge(reviews[6:8])
+        benchmark.build_with_add_edges_bulk(reviews[8:9])
+        network.mutation_log.sync()
+        assert network.mutation_log.count_after(0) > 0
+        expected_graph = network.AttractionSentimentNet.copy()
+        network.mutation_log.close()
+        network.mutation_log = wal.MutationLog(network.mutation_log.path)
+        del network.AttractionSentimentNet, network.emotions_dict
+        graph = network.get_graph()
+
+        assert nx.utils.edges_equal(
+            graph.edges(data=True), expected_graph.edges(data=True)
+        )
+        assert_matches_scan(network.network_index, graph)
+
+        # A graph built elsewhere replacing the network
+        with shards.isolated_network():
+            benchmark.build_with_add_edges_bulk(reviews[9:])
+            other_graph = network.AttractionSentimentNet
+            other_emotions = network.emotions_dict
+        network.use_network(other_graph, other_emotions)
+        assert_matches_scan(network.network_index, other_graph)
+        benchmark.build_with_add_edge(reviews[:2])
+        assert_matches_scan(network.network_index, other_graph)
+
+
+class TestQueryDates:
+    """Test the --since and --until bounds of the query command"""
+
+    @pytest.mark.parametrize(
+        'date, start, end',
+        [
+            ('2023', '2023-01', '2023-12'),
+            ('2023-05', '2023-05', '2023-05'),
+            ('2023-05-17', '2023-05-17', '2023-05-17'),
+            (None, None, None),
+        ],
+    )
+    def test_month_bound(self, date, start, end):
+        assert query.month_bound(date) == start
+        assert query.month_bound(date, end=True) == end
+
+    @pytest.mark.parametrize('date', ['2023', '2023-05', '2023-05-17T10:00:00'])
+    def test_valid_dates(self, date):
+        assert query.query_date(date) == date
+
+    @pytest.mark.parametrize('date', ['2023-13', '2023-00', 'May 2023', '23', '2023/'])
+    def test_invalid_dates(self, date):
+        with pytest.raises(argparse.ArgumentTypeError):
+            query.query_date(date)
+
+    @pytest.mark.parametrize('option', ['--since', '--until'])
+    def test_cli_rejects_invalid_dates(self, option):
+        """Test the command exits with a usage error before loading the network"""
+        result = subprocess.run(
+            [sys.executable, '-m', 'Network.query', 'emotions', option, '2023-13'],
+            cwd=PROJECT_DIR,
+            capture_output=True,
+            text=True,
+        )
+
+        assert result.returncode == 2
+        assert f'argument {option}: Invalid date "2023-13"' in result.stderr
@@ -0,0 +1,171 @@
+"""
+Test that merging shards gives the same network as a single serial build.
+"""
+
+import pytest
+
+import Network.benchmark as benchmark
+import Network.shards as shards
+import Network.temporal as temporal
+
+
+def edge_values(graph):
+    """Weight, count and monthly aggregates of each edge, by sorted endpoints"""
+    return {
+        tuple(sorted((source, target))): (
+            data['weight'],
+            data['count'],
+            temporal.monthly_activity(dict(data)),
+        )
+        for source, target, data in graph.edges(data=True)
+    }
+
+
+def node_values(graph):
+    return {node: dict(data) for node, data in graph.nodes.items()}
+
+
+def split_occurrences(reviews, part, parts):
+    """Every `parts`-th adjective occurrence of each attraction, from `part`"""
+    return [
+        (attraction, *[column[part::parts] for column in columns])
+        for attraction, *columns in reviews
+    ]
+
+
+class TestShardMerge:
+    """Test shards built separately merge into the serial network"""
+
+    def test_merged_shards_match_serial_build(
+        self, scratch_network, synthetic_reviews, tmp_path, monkeypatch
+    ):
+        """Test nodes, edge weights, counts, monthly aggregates and emotions"""
+        network = scratch_network
+        monkeypatch.setattr(shards, 'SHARDS_PATH', str(tmp_path))
+        benchmark.build_with_add_edges_bulk(synthetic_reviews)
+        serial_graph = network.AttractionSentimentNet
+        serial_emotions = network.emotions_dict
+
+        # The reviews of every attraction are split between the shards, so their edges
+        # are in both and have to be added up
+        for name, part in [
+            ('first', split_occurrences(synthetic_reviews, 0, 2)),
+            ('second', split_occurrences(synthetic_reviews, 1, 2)),
+        ]:
+            with shards.isolated_network():
+                benchmark.build_with_add_edges_bulk(part)
+                shards.export_shard(name)
+        merged_graph, merged_emotions = shards.merge_shards(
+            shards.load_shard(path) for path in shards.shard_paths()
+        )
+
+        assert len(shards.shard_paths()) == 2
+        assert node_values(merged_graph) == node_values(serial_graph)
+        assert edge_values(merged_graph) == edge_values(serial_graph)
+        assert merged_emotions == serial_emotions
+
+    def test_merge_into_network(self, scratch_network, synthetic_reviews, tmp_path):
+        """Test shards merged into the (empty) network give the serial network"""
+        network = scratch_network
+        benchmark.build_with_add_edges_bulk(synthetic_reviews)
+        serial_graph = network.AttractionSentimentNet
+        serial_emotions = network.emotions_dict
+
+        paths = []
+        for i, part in enumerate([synthetic_reviews[:5], synthetic_reviews[5:]]):
+            path = str(tmp_path / f'shard{i}.npz')
+            with shards.isolated_network():
+                benchmark.build_with_add_edges_bulk(part)
+                shards.save_shard(
+                    path, network.AttractionSentimentNet, network.emotions_dict
+                )
+            paths.append(path)
+
+        benchmark.reset_scratch_network()
+        shards.merge_shards_into_network(paths)
+
+        assert node_values(network.AttractionSentimentNet) == node_values(serial_graph)
+        assert edge_values(network.AttractionSentimentNet) == edge_values(serial_graph)
+        assert network.emotions_dict == serial_emotions
+        assert network.network_stats.num_edges == serial_graph.number_of_edges()
+
+    def test_merging_again_changes_nothing(
+        self, scratch_network, synthetic_reviews, tmp_path
+    ):
+        """Test shards already merged into the saved network are skipped"""
+        network = scratch_network
+        paths = []
+        for i, part in enumerate([synthetic_reviews[:5], synthetic_reviews[5:]]):
+            path = str(tmp_path / f'shard{i}.npz')
+            with shards.isolated_network():
+                benchmark.build_with_add_edges_bulk(part)
+                shards.save_shard(
+                    path, network.AttractionSentimentNet, network.emotions_dict
+                )
+            paths.append(path)
+
+        shards.merge_shards_into_network(paths[:1])
+        shards.merge_shards_into_network(paths)
+        merged_nodes = node_values(network.AttractionSentimentNet)
+        merged_edges = edge_values(network.AttractionSentimentNet)
+
+        # Merging again, also after reloading the saved network
+        shards.merge_shards_into_network(paths)
+        assert node_values(network.AttractionSentimentNet) == merged_nodes
+        assert edge_values(network.AttractionSentimentNet) == merged_edges
+        network.load()
+        shards.merge_shards_into_network(paths)
+        assert node_values(network.AttractionSentimentNet) == merged_nodes
+        assert edge_values(network.AttractionSentimentNet) == merged_edges
+
+        benchmark.reset_scratch_network()
+        network.merged_shard_ids.clear()
+        benchmark.build_with_add_edges_bulk(synthetic_reviews)
+        assert edge_values(network.AttractionSentimentNet) == merged_edges
+
+    def test_merged_emotion_matches_fresh_shard(
+        self, scratch_network, synthetic_reviews, tmp_path
+    ):
+        """Test an emotion renamed by merge_emotions has the id of a fresh build"""
+        network = scratch_network
+        benchmark.build_with_add_edges_bulk(synthetic_reviews[:4])
+        network.merge_emotions({'adjective1': 'renamed'})
+        renamed = network.emotions_dict['renamed']
+        renamed_edges = dict(network.AttractionSentimentNet[renamed.id])
+
+        assert renamed.id == network.derive_emotion_id('adjective', 'renamed')
+        assert renamed_edges
+        assert network.AttractionSentimentNet.nodes[renamed.id]['name'] == 'renamed'
+
+        path = str(tmp_path / 'fresh.npz')
+        with shards.isolated_network():
+            benchmark.build_with_add_edges_bulk(
+                [
+                    (attraction, ['renamed'], [0.5], [5], ['Joy'], [None])
+                    for attraction, *_ in synthetic_reviews[:1]
+                ]
+            )
+            shards.save_shard(
+                path, network.AttractionSentimentNet, network.emotions_dict
+            )
+        merged_graph, merged_emotions = shards.merge_shards(
+            [(network.AttractionSentimentNet, network.emotions_dict)]
+            + [shards.load_shard(path)]
+        )
+
+        renamed_nodes = [
+            node for node, name in merged_graph.nodes(data='name') if name == 'renamed'
+        ]
+        assert renamed_nodes == [renamed.id]
+        assert merged_emotions['renamed'].id == renamed.id
+
+    def test_merge_rejects_underived_ids(self, scratch_network, synthetic_reviews):
+        """Test emotions whose id is not derived from their name are not merged"""
+        network = scratch_network
+        benchmark.build_with_add_edges_bulk(synthetic_reviews[:2])
+        network.emotions_dict['adjective0'].id = 'adjective_12'
+
+        with pytest.raises(ValueError, match='adjective0'):
+            shards.merge_shards(
+                [(network.AttractionSentimentNet, network.emotions_dict)]
+            )
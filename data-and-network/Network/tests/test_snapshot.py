@@ -0,0 +1,180 @@
+"""
+Test the graph snapshot (NPZ), GML and GEXF files give back the graph they were
+written from, attributes included.
+"""
+
+import os
+
+import networkx as nx
+import numpy as np
+import pytest
+
+import Network.snapshot as snapshot
+
+
+def attribute_graph():
+    """Graph with every kind of attribute value the snapshot encodes differently"""
+    graph = nx.Graph(name='network', version=3)
+    graph.add_node(
+        'louvre',
+        type='attraction',
+        name='Louvre',
+        rating=4.7,
+        location={'continent': 'Europe', 'country': 'France', 'city': 'Paris'},
+        open=True,
+    )
+    graph.add_node(
+        'colosseum',
+        type='attraction',
+        name='Colosseum',
+        rating=None,
+        location={'continent': 'Europe', 'country': 'Italy', 'city': None},
+        open=False,
+    )
+    # A node missing most attributes, and one named like the reserved GML ids
+    graph.add_node('pantheon', type='attraction')
+    graph.add_node('joy', type='adjective', label='Joy', associated_emotion=None)
+    graph.add_node('awe', type='adjective', label='Awe', associated_emotion='Wonder')
+    graph.add_node(42, type='adjective', associated_emotion='Joy')
+
+    graph.add_edge(
+        'louvre',
+        'joy',
+        weight=10,
+        count=3,
+        months=[24292, 24294],
+        month_counts=[2, 1],
+        month_weights=[7, 3],
+        sources=['google', 'tripadvisor'],
+        mixed=[1, 'a', None],
+    )
+    graph.add_edge(
+        'louvre',
+        'awe',
+        weight=3,
+        count=1,
+        months=[24287],
+        month_counts=[1],
+        month_weights=[3],
+        sources=[],
+        mixed=None,
+    )
+    # Reviews without a date: empty monthly buckets
+    graph.add_edge(
+        'colosseum',
+        'joy',
+        weight=6,
+        count=2,
+        months=[],
+        month_counts=[],
+        month_weights=[],
+    )
+    graph.add_edge('pantheon', 42, weight=1.5)
+
+    return graph
+
+
+def graph_data(graph):
+    return (
+        graph.graph,
+        {str(node): data for node, data in graph.nodes.items()},
+        {
+            tuple(sorted((str(source), str(target)))): data
+            for source, target, data in graph.edges(data=True)
+        },
+    )
+
+
+class TestSnapshot:
+    """Test every column encoding keeps the values, None and missing attributes"""
+
+    def test_roundtrip(self, tmp_path):
+        path = os.path.join(tmp_path, 'graph.npz')
+        graph = attribute_graph()
+
+        snapshot.save_snapshot(graph, path, metadata={'wal_sequence': 12})
+        loaded, metadata = snapshot.load_snapshot(path, with_metadata=True)
+
+        assert graph_data(loaded) == graph_data(graph)
+        assert metadata == snapshot.load_metadata(path) == {'wal_sequence': 12}
+        assert not os.path.exists(f'{path}.tmp.npz')
+
+    def test_column_kinds(self, tmp_path):
+        """Test the monthly buckets, empty ones included, are int_list columns"""
+        path = os.path.join(tmp_path, 'graph.npz')
+        snapshot.save_snapshot(attribute_graph(), path)
+
+        with np.load(path) as saved:
+            kinds = {
+                key: str(arrays['kind'])
+                for key, arrays in snapshot.load_columns(saved, 'edge')
+            }
+        assert kinds == {
+            'weight': 'json',
+            'count': 'int',
+            'months': 'int_list',
+            'month_counts': 'int_list',
+            'month_weights': 'int_list',
+            'sources': 'json',
+            'mixed': 'json',
+        }
+
+    @pytest.mark.parametrize('chunk_rows', [1, 2, 100])
+    def test_chunked_rows(self, tmp_path, chunk_rows):
+        """Test decoding a few rows at a time gives the rows of the whole column"""
+        path = os.path.join(tmp_path, 'graph.npz')
+        graph = attribute_graph()
+        snapshot.save_snapshot(graph, path)
+
+        with np.load(path) as saved:
+            columns = snapshot.load_columns(saved, 'node')
+            rows = list(
+                snapshot.iter_attribute_rows(
+                    columns, graph.number_of_nodes(), chunk_rows
+                )
+            )
+        assert rows == [graph.nodes[node] for node in graph.nodes]
+
+    def test_newer_version_refused(self, tmp_path, monkeypatch):
+        path = os.path.join(tmp_path, 'graph.npz')
+        monkeypatch.setattr(snapshot, 'SNAPSHOT_VERSION', snapshot.SNAPSHOT_VERSION + 1)
+        snapshot.save_snapshot(attribute_graph(), path)
+        monkeypatch.undo()
+
+        with pytest.raises(ValueError):
+            snapshot.load_snapshot(path)
+
+
+class TestTextFormats:
+    """Test GML and GEXF files store what they can not as JSON attributes"""
+
+    @pytest.mark.parametrize('extension', ['gml', 'gexf'])
+    def test_roundtrip(self, tmp_path, extension):
+        path = os.path.join(tmp_path, f'graph.{extension}')
+        graph = attribute_graph()
+
+        snapshot.write_graph(graph, path)
+        loaded = snapshot.read_graph(path)
+
+        assert graph_data(loaded)[1:] == graph_data(graph)[1:]
+        # GEXF only has a place for the graph name
+        assert loaded.graph == (
+            {'name': 'network'} if extension == 'gexf' else graph.graph
+        )
+        assert not any(
+            key.endswith(snapshot.JSON_ATTRIBUTE_SUFFIX)
+            for data in [*loaded.nodes.values(), *loaded.edges.values()]
+            for key in data
+        )
+
+    def test_read_as_backend(self, tmp_path):
+        """Test files are read by the given backend whatever their extension"""
+        path = os.path.join(tmp_path, 'graph.txt')
+        graph = attribute_graph()
+        nx.write_gml(snapshot.to_text_format_graph(graph), path)
+
+        assert graph_data(snapshot.read_graph(path, 'gml')) == graph_data(graph)
+        with pytest.raises(ValueError):
+            snapshot.read_graph(path)
+        with pytest.raises(ValueError):
+            snapshot.write_graph(graph, path)
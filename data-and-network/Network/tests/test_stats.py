@@ -0,0 +1,138 @@
+"""
+Test the incrementally maintained network statistics against a full recomputation.
+"""
+
+import os
+from types import SimpleNamespace
+
+import networkx as nx
+
+import Network.benchmark as benchmark
+import Network.stats as stats
+
+
+def recomputed_stats(graph):
+    """Statistics recomputed from the whole graph with NetworkX"""
+    groups = {
+        node: stats.node_group(data.get('type')) for node, data in graph.nodes.items()
+    }
+    degree_sums = {stats.ATTRACTION_GROUP: 0, stats.EMOTION_GROUP: 0}
+    highest_degrees = {stats.ATTRACTION_GROUP: 0, stats.EMOTION_GROUP: 0}
+    for node, degree in graph.degree:
+        degree_sums[groups[node]] += degree
+        highest_degrees[groups[node]] = max(highest_degrees[groups[node]], degree)
+
+    return {
+        'num_nodes': graph.number_of_nodes(),
+        'num_edges': graph.number_of_edges(),
+        'num_components': nx.number_connected_components(graph),
+        'degree_sums': degree_sums,
+        'highest_degrees': highest_degrees,
+        'highest_weight': max(weight for _, _, weight in graph.edges.data('weight')),
+    }
+
+
+def incremental_stats(network_stats, graph):
+    highest_degrees = {}
+    for group, highest in network_stats.highest_degree.items():
+        node, degree = highest
+        # The reported node really has the reported degree
+        assert graph.degree(node) == degree
+        highest_degrees[group] = degree
+
+    attraction, emotion, weight = network_stats.highest_weight_edge
+    assert graph.nodes[attraction]['type'] == 'attraction'
+    assert graph[attraction][emotion]['weight'] == weight
+
+    return {
+        'num_nodes': network_stats.num_nodes,
+        'num_edges': network_stats.num_edges,
+        'num_components': network_stats.num_components,
+        'degree_sums': network_stats.group_degrees,
+        'highest_degrees': highest_degrees,
+        'highest_weight': weight,
+    }
+
+
+def add_isolated_attraction(network):
+    """Attraction whose adjectives no other attraction uses (a new component)"""
+    attraction = SimpleNamespace(
+        id='island',
+        displayName={'text': 'Island'},
+        rating=4.0,
+        location={'latitude': 0.0, 'longitude': 0.0},
+        types=['tourist_attraction'],
+    )
+    network.add_edges_bulk(
+        attraction,
+        ['remote', 'lonely', 'remote'],
+        'adjective',
+        [0.5, -0.5, 0.9],
+        [5, 2, 4],
+        associated_emotions=['Peace', 'Loneliness', 'Peace'],
+        review_dates=['2024-01-10T00:00:00', None, '2024-03-02T00:00:00'],
+    )
+
+
+class TestIncrementalStats:
+    """Test the statistics kept up to date by the graph update functions"""
+
+    def test_matches_recompute_after_bulk_edges(
+        self, scratch_network, synthetic_reviews
+    ):
+        """Test counts, components, degree sums and maximums after add_edges_bulk"""
+        network = scratch_network
+        benchmark.build_with_add_edges_bulk(synthetic_reviews[:6])
+        add_isolated_attraction(network)
+        benchmark.build_with_add_edges_bulk(synthetic_reviews[6:])
+        graph = network.AttractionSentimentNet
+
+        assert nx.number_connected_components(graph) == 2
+        assert incremental_stats(network.network_stats, graph) == recomputed_stats(
+            graph
+        )
+
+    def test_matches_recompute_after_merge_emotions(
+        self, scratch_network, synthetic_reviews
+    ):
+        """Test the statistics after merging emotions removed nodes"""
+        network = scratch_network
+        benchmark.build_with_add_edges_bulk(synthetic_reviews)
+        add_isolated_attraction(network)
+        nodes_before = network.AttractionSentimentNet.number_of_nodes()
+
+        network.merge_emotions(
+            {'adjective1': 'adjective0', 'adjective2': 'adjective0', 'lonely': 'remote'}
+        )
+        graph = network.AttractionSentimentNet
+
+        assert graph.number_of_nodes() == nodes_before - 3
+        assert incremental_stats(network.network_stats, graph) == recomputed_stats(
+            graph
+        )
+
+        # Updates after the rebuild keep the statistics right
+        benchmark.build_with_add_edges_bulk(synthetic_reviews[:3])
+        assert incremental_stats(network.network_stats, graph) == recomputed_stats(
+            graph
+        )
+
+    def test_matches_recompute_after_import_graph(
+        self, scratch_network, synthetic_reviews, tmp_path
+    ):
+        """Test the statistics after the graph is replaced by an imported one"""
+        network = scratch_network
+        benchmark.build_with_add_edges_bulk(synthetic_reviews[:4])
+        add_isolated_attraction(network)
+        exported_path = os.path.join(tmp_path, 'exported.npz')
+        network.export_graph(exported_path)
+        exported_nodes = network.AttractionSentimentNet.number_of_nodes()
+        benchmark.build_with_add_edges_bulk(synthetic_reviews[4:])
+
+        network.import_graph(exported_path)
+        graph = network.AttractionSentimentNet
+
+        assert incremental_stats(network.network_stats, graph) == recomputed_stats(
+            graph
+        )
+        assert graph.number_of_nodes() == exported_nodes
@@ -0,0 +1,211 @@
+"""
+Test the monthly review buckets of the edges and the migration of the review date
+lists of graphs saved before them.
+"""
+
+import networkx as nx
+import pytest
+
+import Network.main as network
+import Network.temporal as temporal
+
+MAY_2024 = 2024 * 12 + 4
+
+# Edges of a graph saved before the monthly buckets: (attraction, emotion) ->
+# (weight, count, review_dates). GML stores single element lists as plain values and
+# reviews without a date are None.
+LEGACY_EDGES = {
+    ('louvre', 'joy'): (
+        10,
+        4,
+        ['2024-05-17T10:00:00', '2024-07-01T08:30:00', None, '2024-05-02T21:00:00'],
+    ),
+    ('louvre', 'wonder'): (3, 1, '2023-12-31T23:59:59'),
+    ('colosseum', 'joy'): (6, 2, [None, None]),
+    ('colosseum', 'stress'): (7, 3, ['2024-01-10', 'not a date', '2024-03-05']),
+}
+
+
+def legacy_graph():
+    graph = nx.Graph()
+    for attraction, emotion in LEGACY_EDGES:
+        graph.add_node(attraction, type='attraction', name=attraction.title())
+        graph.add_node(emotion, type='adjective', name=emotion)
+    for (attraction, emotion), (weight, count, review_dates) in LEGACY_EDGES.items():
+        graph.add_edge(
+            attraction, emotion, weight=weight, count=count, review_dates=review_dates
+        )
+    # Saved after the aggregation, only reviews without a date
+    graph.add_node('pantheon', type='attraction', name='Pantheon')
+    graph.add_edge('pantheon', 'wonder', weight=2, count=1)
+
+    return graph
+
+
+def month_counts(review_dates):
+    counts = {}
+    for review_date in temporal.as_list(review_dates):
+        month = temporal.month_index(review_date)
+        if month is not None:
+            counts[month] = counts.get(month, 0) + 1
+    return counts
+
+
+class TestMonths:
+    """Test dates are bucketed by month and buckets are merged in month order"""
+
+    @pytest.mark.parametrize(
+        'review_date, month',
+        [
+            ('2024-05-17T10:00:00', MAY_2024),
+            ('2024-05', MAY_2024),
+            ('0999-12-01', 999 * 12 + 11),
+            ('2024-13-01', None),
+            ('2024-00-01', None),
+            ('not a date', None),
+            ('', None),
+            (None, None),
+        ],
+    )
+    def test_month_index(self, review_date, month):
+        assert temporal.month_index(review_date) == month
+
+    def test_month_label(self):
+        assert temporal.month_label(MAY_2024) == '2024-05'
+        assert temporal.month_label(2024 * 12) == '2024-01'
+        assert temporal.month_label(2024 * 12 - 1) == '2023-12'
+
+    def test_add_to_timeline(self):
+        """Test months stay sorted and reviews of the same month share its bucket"""
+        edge = {}
+        for month, count, weight in [(5, 1, 3), (2, 2, 4), (5, 1, 1), (9, 1, 2)]:
+            temporal.add_to_timeline(edge, month, count, weight)
+        temporal.add_to_timeline(edge, None, 1, 10)
+
+        assert temporal.get_timeline(edge) == ([2, 5, 9], [2, 2, 1], [4, 4, 2])
+
+    def test_add_buckets_matches_adding_one_by_one(self):
+        """Test the single merge pass gives the buckets of adding every month"""
+        buckets = [
+            ([1, 4, 6], [1, 2, 1], [2, 5, 1]),
+            ([0, 4, 7, 9], [3, 1, 1, 2], [3, 3, 1, 6]),
+            ([6], [4], [8]),
+            ([], [], []),
+        ]
+        merged, one_by_one = {}, {}
+        for months, counts, weights in buckets:
+            temporal.add_buckets(merged, months, counts, weights)
+            for month, count, weight in zip(months, counts, weights):
+                temporal.add_to_timeline(one_by_one, month, count, weight)
+
+        assert temporal.get_timeline(merged) == temporal.get_timeline(one_by_one)
+        assert temporal.get_timeline(merged) == (
+            [0, 1, 4, 6, 7, 9],
+            [3, 1, 3, 5, 1, 2],
+            [3, 2, 8, 9, 1, 6],
+        )
+
+    def test_merge_timelines_of_gml_values(self):
+        """Test single bucket edges read from GML (plain values) are merged"""
+        edge = {'months': 5, 'month_counts': 1, 'month_weights': 2}
+        other = {'months': [3, 5], 'month_counts': [1, 2], 'month_weights': [1, 4]}
+
+        temporal.merge_timelines(edge, other)
+
+        assert temporal.get_timeline(edge) == ([3, 5], [1, 3], [1, 6])
+        assert temporal.monthly_activity(edge) == {'0000-04': (1, 1), '0000-06': (3, 6)}
+
+    def test_activity_between(self):
+        edge = {}
+        for review_date, weight in [
+            ('2024-01-03', 1),
+            ('2024-05-20', 2),
+            ('2025-02', 4),
+        ]:
+            temporal.add_to_timeline(edge, temporal.month_index(review_date), 1, weight)
+
+        assert temporal.activity_between(edge) == (3, 7)
+        assert temporal.activity_between(edge, '2024-05-31') == (2, 6)
+        assert temporal.activity_between(edge, end='2024-05-01') == (2, 3)
+        assert temporal.activity_between(edge, '2024-02', '2024-12') == (1, 2)
+        assert temporal.activity_between(edge, '2023-01', '2023-12') == (0, 0)
+        with pytest.raises(ValueError):
+            temporal.activity_between(edge, '2024-1-01')
+
+
+@pytest.mark.usefixtures('scratch_network')
+class TestMigrateReviewDates:
+    """Test review date lists become monthly buckets matching the original dates"""
+
+    def test_buckets_match_original_dates(self, monkeypatch):
+        monkeypatch.setattr(network, 'KEEP_RAW_REVIEW_DATES', True)
+        network.use_network(legacy_graph(), {})
+
+        network.migrate_review_dates()
+        # The migrated graph is the saved one
+        del network.AttractionSentimentNet, network.emotions_dict
+        graph = network.get_graph()
+
+        for (attraction, emotion), (weight, count, dates) in LEGACY_EDGES.items():
+            edge = graph[attraction][emotion]
+            months, counts, weights = temporal.get_timeline(edge)
+            assert 'review_dates' not in edge
+            assert (edge['weight'], edge['count']) == (weight, count)
+            assert dict(zip(months, counts)) == month_counts(dates)
+            assert all(month_weight >= 0 for month_weight in weights)
+            assert network.get_edge_activity(attraction, emotion) == (
+                sum(counts),
+                sum(weights),
+            )
+
+        # Every known review has a date: the weight is split without losing any
+        assert network.get_edge_monthly_activity('louvre', 'joy') == {
+            '2024-05': (2, 7),
+            '2024-07': (1, 3),
+        }
+        assert network.get_edge_activity('louvre', 'joy', '2024-06') == (1, 3)
+        assert network.get_edge_activity('louvre', 'joy', end='2024-05-31') == (2, 7)
+        assert network.get_edge_activity('louvre', 'wonder', '2023-12', '2023-12') == (
+            1,
+            3,
+        )
+        # Invalid dates keep their share of the weight out of the buckets
+        assert network.get_edge_monthly_activity('colosseum', 'stress') == {
+            '2024-01': (1, 2),
+            '2024-03': (1, 3),
+        }
+        # Edges without dates only count towards the totals
+        assert network.get_edge_activity('colosseum', 'joy') == (0, 0)
+        assert network.get_edge_activity('pantheon', 'wonder') == (0, 0)
+
+        raw_dates = network.load_raw_review_dates()
+        assert sorted(zip(raw_dates['attraction_id'], raw_dates['emotion_id'])) == [
+            ('colosseum', 'stress'),
+            ('colosseum', 'stress'),
+            ('colosseum', 'stress'),
+            ('louvre', 'joy'),
+            ('louvre', 'joy'),
+            ('louvre', 'joy'),
+            ('louvre', 'wonder'),
+        ]
+
+    def test_index_and_new_reviews_after_migration(self):
+        """Test migrated edges are indexed and take new reviews into their buckets"""
+        network.use_network(legacy_graph(), {})
+        network.migrate_review_dates()
+
+        assert network.network_index.edges_between('2024-01', '2024-05') == {
+            ('louvre', 'joy'),
+            ('colosseum', 'stress'),
+        }
+        assert network.network_index.edges_between(end='2023-12') == {
+            ('louvre', 'wonder')
+        }
+
+        edge = network.get_graph()['louvre']['joy']
+        temporal.add_to_timeline(edge, temporal.month_index('2024-06-01'), 1, 5)
+        assert network.get_edge_monthly_activity('louvre', 'joy') == {
+            '2024-05': (2, 7),
+            '2024-06': (1, 5),
+            '2024-07': (1, 3),
+        }
@@ -0,0 +1,122 @@
+"""
+Test the graph mutation log: torn and damaged records and replay over a snapshot.
+"""
+
+import os
+
+import Network.benchmark as benchmark
+import Network.snapshot as snapshot
+import Network.wal as wal
+
+
+def write_log(path, records=3):
+    """Log with `records` node records, returns it closed"""
+    mutation_log = wal.MutationLog(path)
+    for i in range(records):
+        mutation_log.append_node(f'node{i}', {'type': 'attraction', 'name': f'N{i}'})
+    mutation_log.close()
+    return mutation_log
+
+
+def record_offsets(path):
+    with open(path, 'rb') as f:
+        return [(start, end) for start, end, _, _ in wal.read_records(f.read())]
+
+
+def edge_totals(graph):
+    return {
+        tuple(sorted((source, target))): (data['count'], data['weight'])
+        for source, target, data in graph.edges(data=True)
+    }
+
+
+class TestMutationLog:
+    """Test the replay of damaged logs"""
+
+    def test_truncated_record_is_dropped(self, tmp_path):
+        """Test a record cut in the middle of its write is dropped and cut from the file"""
+        path = os.path.join(tmp_path, 'graph.wal')
+        write_log(path)
+        offsets = record_offsets(path)
+        with open(path, 'r+b') as f:
+            f.truncate(offsets[-1][1] - 5)
+
+        mutation_log = wal.MutationLog(path)
+        records = list(mutation_log.replay())
+
+        assert [record.node_id for record in records] == ['node0', 'node1']
+        assert os.path.getsize(path) == offsets[1][1]
+        assert mutation_log.last_sequence == 2
+
+        # Appends continue after the last complete record
+        mutation_log.append_node('node3', {'type': 'attraction'})
+        mutation_log.close()
+        records = list(wal.MutationLog(path).replay())
+        assert [(r.sequence, r.node_id) for r in records] == [
+            (1, 'node0'),
+            (2, 'node1'),
+            (3, 'node3'),
+        ]
+
+    def test_crc_mismatch_stops_replay(self, tmp_path):
+        """Test the replay stops at the first record whose checksum does not match"""
+        path = os.path.join(tmp_path, 'graph.wal')
+        write_log(path, records=4)
+        offsets = record_offsets(path)
+        # Flip a byte in the payload of the second record
+        with open(path, 'r+b') as f:
+            f.seek(offsets[1][1] - 1)
+            last_byte = f.read(1)
+            f.seek(offsets[1][1] - 1)
+            f.write(bytes([last_byte[0] ^ 0xFF]))
+
+        records = list(wal.MutationLog(path).replay())
+
+        assert [record.node_id for record in records] == ['node0']
+        assert os.path.getsize(path) == offsets[0][1]
+
+    def test_discard_after_cuts_newer_records(self, tmp_path):
+        """Test records above a sequence are cut and sequence numbers keep growing"""
+        path = os.path.join(tmp_path, 'graph.wal')
+        write_log(path, records=5)
+
+        mutation_log = wal.MutationLog(path)
+        assert mutation_log.discard_after(3) == 2
+        assert mutation_log.count_after(0) == 3
+        assert mutation_log.last_sequence == 5
+
+        mutation_log.append_node('node5', {'type': 'attraction'})
+        mutation_log.close()
+        sequences = [record.sequence for record in wal.MutationLog(path).replay()]
+        assert sequences == [1, 2, 3, 6]
+
+
+class TestReplayOverSnapshot:
+    """Test loading the network replays only the mutations missing from the snapshot"""
+
+    def test_records_in_snapshot_are_skipped(self, scratch_network, synthetic_reviews):
+        """Test records at or below the snapshot sequence are not applied twice"""
+        network = scratch_network
+        benchmark.build_with_add_edges_bulk(synthetic_reviews[:6])
+        # Crash between saving the snapshot and truncating the log
+        network.save_emotions()
+        snapshot.save_snapshot(
+            network.AttractionSentimentNet,
+            network.EXISTING_SNAPSHOT_PATH,
+            metadata={'wal_sequence': network.mutation_log.last_sequence},
+        )
+        benchmark.build_with_add_edges_bulk(synthetic_reviews[6:])
+        expected = edge_totals(network.AttractionSentimentNet)
+        expected_nodes = set(network.AttractionSentimentNet.nodes)
+        snapshot_sequence = snapshot.load_metadata(network.EXISTING_SNAPSHOT_PATH)[
+            'wal_sequence'
+        ]
+        # The log still holds the records already in the snapshot
+        assert network.mutation_log.count_after(0) > network.mutation_log.count_after(
+            snapshot_sequence
+        )
+
+        graph = network.load()
+
+        assert set(graph.nodes) == expected_nodes
+        assert edge_totals(graph) == expected
@@ -0,0 +1,267 @@
+from dataclasses import dataclass
+import json
+import logging
+import os
+import struct
+import threading
+import time
+from typing import Dict, Iterator, Optional, Tuple, Union
+import zlib
+
+logger = logging.getLogger(os.getenv('DATA_NETWORK_LOGGER', 'data-and-network'))
+
+# Record: crc32 | payload length | sequence number | record type, then the payload.
+# The checksum covers everything after itself, so a torn write at the end of the log
+# is detected and dropped on replay.
+HEADER = struct.Struct('<IIQB')
+EDGE_COUNTS = struct.Struct('<iii')
+STRING_LENGTH = struct.Struct('<I')
+NONE_STRING_LENGTH = 0xFFFFFFFF
+
+NODE_RECORD = 1
+EDGE_RECORD = 2
+
+
+@dataclass
+class NodeRecord:
+    sequence: int
+    node_id: str
+    attributes: Dict
+
+
+@dataclass
+class EdgeRecord:
+    """`count` reviews with a weight sum of `weight` in `month` (-1 when undated)."""
+
+    sequence: int
+    attraction_id: str
+    emotion_name: str
+    emotion_type: str
+    associated_emotion: Optional[str]
+    month: int
+    count: int
+    weight: int
+
+
+def pack_string(value: Optional[str]) -> bytes:
+    if value is None:
+        return STRING_LENGTH.pack(NONE_STRING_LENGTH)
+    encoded = value.encode('utf-8')
+    return STRING_LENGTH.pack(len(encoded)) + encoded
+
+
+def unpack_string(payload: bytes, offset: int):
+    (length,) = STRING_LENGTH.unpack_from(payload, offset)
+    offset += STRING_LENGTH.size
+    if length == NONE_STRING_LENGTH:
+        return None, offset
+    return payload[offset : offset + length].decode('utf-8'), offset + length
+
+
+def read_records(data: bytes) -> Iterator[Tuple[int, int, int, int]]:
+    """
+    (start offset, end offset, sequence number, record type) of each record of the
+    log contents, up to the first damaged or incomplete one.
+    """
+    offset = 0
+    while offset + HEADER.size <= len(data):
+        checksum, length, sequence, record_type = HEADER.unpack_from(data, offset)
+        end = offset + HEADER.size + length
+        if end > len(data) or checksum != zlib.crc32(data[offset + 4 : end]):
+            return
+
+        yield offset, end, sequence, record_type
+        offset = end
+
+
+class MutationLog:
+    """
+    Append-only binary log of graph mutations written between snapshots.
+    Records are written to the file right away and fsynced in groups: every
+    `sync_records` records, when `sync_seconds` passed since the last fsync, or on
+    `sync()`. Sequence numbers keep growing across truncations, so records already
+    in a snapshot (up to its sequence number) are skipped on replay.
+    """
+
+    def __init__(self, path: str, sync_records: int = 1000, sync_seconds: float = 1.0):
+        self.path = path
+        self.sync_records = sync_records
+        self.sync_seconds = sync_seconds
+        self.last_sequence = 0
+        self._size = None
+        self._file = None
+        self._unsynced_records = 0
+        self._last_sync = time.monotonic()
+        self._lock = threading.RLock()
+
+    @property
+    def size(self) -> int:
+        """Bytes in the log (tracked in memory, the file is only checked once)."""
+        if self._size is None:
+            self._size = os.path.getsize(self.path) if os.path.exists(self.path) else 0
+        return self._size
+
+    def _append(self, record_type: int, payload: bytes):
+        with self._lock:
+            if self._file is None:
+                self._file = open(self.path, 'ab')
+
+            self.last_sequence += 1
+            body = HEADER.pack(0, len(payload), self.last_sequence, record_type)[4:]
+            checksum = zlib.crc32(payload, zlib.crc32(body))
+            self._file.write(struct.pack('<I', checksum) + body + payload)
+            self._size = self.size + HEADER.size + len(payload)
+
+            self._unsynced_records += 1
+            if (
+                self._unsynced_records >= self.sync_records
+                or time.monotonic() - self._last_sync >= self.sync_seconds
+            ):
+                self._sync()
+
+    def append_node(self, node_id: str, attributes: Dict):
+        payload = pack_string(node_id) + pack_string(
+            json.dumps(attributes, ensure_ascii=False)
+        )
+        self._append(NODE_RECORD, payload)
+
+    def append_edge(
+        self,
+        attraction_id: str,
+        emotion_name: str,
+        emotion_type: str,
+        associated_emotion: Optional[str],
+        month: int,
+        count: int,
+        weight: int,
+    ):
+        payload = (
+            EDGE_COUNTS.pack(month, count, weight)
+            + pack_string(attraction_id)
+            + pack_string(emotion_name)
+            + pack_string(emotion_type)
+            + pack_string(associated_emotion)
+        )
+        self._append(EDGE_RECORD, payload)
+
+    def _sync(self):
+        if self._file is not None and self._unsynced_records:
+            self._file.flush()
+            os.fsync(self._file.fileno())
+        self._unsynced_records = 0
+        self._last_sync = time.monotonic()
+
+    def sync(self):
+        """Makes every appended record durable."""
+        with self._lock:
+            self._sync()
+
+    def replay(
+        self, after_sequence: int = 0
+    ) -> Iterator[Union[NodeRecord, EdgeRecord]]:
+        """
+        Records with a sequence number above `after_sequence`, in order. A damaged or
+        incomplete tail (crash in the middle of a write) ends the replay and is cut
+        from the file. Appends continue after the last record read.
+        """
+        with self._lock:
+            self.close()
+            if not os.path.exists(self.path):
+                self.last_sequence = max(self.last_sequence, after_sequence)
+                return
+
+            with open(self.path, 'rb') as f:
+                data = f.read()
+
+        offset = 0
+        last_sequence = after_sequence
+        for start, end, sequence, record_type in read_records(data):
+            payload = data[start + HEADER.size : end]
+            offset = end
+            last_sequence = max(last_sequence, sequence)
+            if sequence <= after_sequence:
+                continue
+
+            if record_type == NODE_RECORD:
+                node_id, position = unpack_string(payload, 0)
+                attributes, _ = unpack_string(payload, position)
+                yield NodeRecord(sequence, node_id, json.loads(attributes))
+            elif record_type == EDGE_RECORD:
+                month, count, weight = EDGE_COUNTS.unpack_from(payload, 0)
+                position = EDGE_COUNTS.size
+                strings = []
+                for _ in range(4):
+                    value, position = unpack_string(payload, position)
+                    strings.append(value)
+                yield EdgeRecord(sequence, *strings, month, count, weight)
+
+        if offset < len(data):
+            logger.warning(
+                f'Dropping {len(data) - offset} bytes of incomplete records from {self.path}.'
+            )
+            with open(self.path, 'r+b') as f:
+                f.truncate(offset)
+
+        self._size = offset
+        self.last_sequence = max(self.last_sequence, last_sequence)
+
+    def count_after(self, sequence: int) -> int:
+        """
+        Records with a sequence number above `sequence`, read without replaying or
+        repairing the log (e.g. to tell whether a snapshot is up to date).
+        """
+        with self._lock:
+            if self._file is not None:
+                self._file.flush()
+            if not os.path.exists(self.path):
+                return 0
+            with open(self.path, 'rb') as f:
+                data = f.read()
+
+        return sum(
+            1
+            for _, _, record_sequence, _ in read_records(data)
+            if record_sequence > sequence
+        )
+
+    def discard_after(self, sequence: int) -> int:
+        """
+        Cuts the records with a sequence number above `sequence`, e.g. mutations of
+        work whose completion was never recorded elsewhere. Returns how many.
+        """
+        with self._lock:
+            self.close()
+            if not os.path.exists(self.path):
+                return 0
+            with open(self.path, 'rb') as f:
+                data = f.read()
+
+            cut_offset, discarded = None, 0
+            for start, _, record_sequence, _ in read_records(data):
+                self.last_sequence = max(self.last_sequence, record_sequence)
+                if record_sequence > sequence:
+                    cut_offset = start if cut_offset is None else cut_offset
+                    discarded += 1
+
+            if cut_offset is not None:
+                with open(self.path, 'r+b') as f:
+                    f.truncate(cut_offset)
+                    os.fsync(f.fileno())
+                self._size = cut_offset
+
+        return discarded
+
+    def truncate(self):
+        """Empties the log (after a checkpoint), sequence numbers keep growing."""
+        with self._lock:
+            self.close()
+            with open(self.path, 'wb') as f:
+                os.fsync(f.fileno())
+            self._size = 0
+
+    def close(self):
+        with self._lock:
+            if self._file is not None:
+                self._sync()
+                self._file.close()
+                self._file = None
@@ -0,0 +1,71 @@
+from dataclasses import dataclass, field
+from typing import TYPE_CHECKING, Dict, List
+
+import Sentiments.main as sentiments
+
+if TYPE_CHECKING:
+    from PlacesAPI.main import Place
+    from Scraper.main import TransformedReview
+
+# The analysis stage of the pipeline runs in spawned worker processes (see
+# Pipeline.main.PIPELINE_ANALYSIS_PROCESSES), which import this module and only get
+# the review texts: they only need Sentiments, not the scraper, the Places API or
+# the network.
+
+
+@dataclass
+class AttractionTask:
+    continent: str
+    country: str
+    city: str
+    attraction: 'Place'
+    # Filled by the stages: reviews not processed yet, their analyses and the emotion
+    # of each of their adjectives
+    scraped_reviews: int = 0
+    reviews: List['TransformedReview'] = field(default_factory=list)
+    analyses: List[sentiments.ReviewAnalysis] = field(default_factory=list)
+    adjective_emotions: Dict[str, str] = field(default_factory=dict)
+    # Sentence memo lookups of the analysis (the memo lives in the worker processes)
+    memo_hits: int = 0
+    memo_misses: int = 0
+
+    @property
+    def name(self) -> str:
+        return self.attraction.displayName['text']
+
+
+@dataclass
+class ReviewsAnalysis:
+    analyses: List[sentiments.ReviewAnalysis]
+    memo_hits: int
+    memo_misses: int
+
+
+def review_texts(task: AttractionTask) -> List[str]:
+    return [review.description.get('en', '') for review in task.reviews]
+
+
+def analyze_review_texts(
+    texts: List[str], n_process: int = sentiments.NLP_N_PROCESS
+) -> ReviewsAnalysis:
+    hits, misses = sentiments.sentence_memo.hits, sentiments.sentence_memo.misses
+    analyses = sentiments.analyze_reviews(texts, n_process=n_process)
+    return ReviewsAnalysis(
+        analyses,
+        sentiments.sentence_memo.hits - hits,
+        sentiments.sentence_memo.misses - misses,
+    )
+
+
+def add_analysis(task: AttractionTask, analysis: ReviewsAnalysis) -> AttractionTask:
+    task.analyses = analysis.analyses
+    task.memo_hits = analysis.memo_hits
+    task.memo_misses = analysis.memo_misses
+    return task
+
+
+def analyze_attraction_reviews(
+    task: AttractionTask, n_process: int = sentiments.NLP_N_PROCESS
+) -> AttractionTask:
+    """Analyzes the reviews of an attraction in this process."""
+    return add_analysis(task, analyze_review_texts(review_texts(task), n_process))
@@ -0,0 +1,242 @@
+import argparse
+import functools
+import json
+import os
+import random
+import tempfile
+import time
+
+import Pipeline.progress as progress
+import Pipeline.stages as stages
+import Shared.main as utils
+
+
+def generate_legacy_progress(
+    cities: int, attractions: int, reviews: int, seed: int
+) -> progress.PipelineProgress:
+    """
+    Synthetic pipeline_progress.json contents: `cities` cities with `attractions`
+    attractions of `reviews` reviews each, every review processed except in the
+    last attraction of each city.
+    """
+    rng = random.Random(seed)
+    city_progresses = []
+    for city in range(cities):
+        attraction_progresses = []
+        for attraction in range(attractions):
+            done = attraction < attractions - 1
+            attraction_progresses.append(
+                progress.AttractionProgress(
+                    id=f'attraction{city}_{attraction}',
+                    name=f'Attraction {city} {attraction}',
+                    reviews=[
+                        progress.ReviewProgress(
+                            id=f'review{rng.getrandbits(64):016x}',
+                            progress='✅' if done else '❌',
+                        )
+                        for _ in range(reviews)
+                    ],
+                    progress='✅' if done else '❌',
+                )
+            )
+        city_progresses.append(
+            progress.CityProgress(
+                name=f'City {city}', progress='❌', attractions=attraction_progresses
+            )
+        )
+
+    return progress.PipelineProgress(
+        continents=[
+            progress.ContinentProgress(
+                name='Continent',
+                progress='❌',
+                countries=[
+                    progress.CountryProgress(
+                        name='Country', progress='❌', cities=city_progresses
+                    )
+                ],
+            )
+        ]
+    )
+
+
+def benchmark_progress(cities: int, attractions: int, reviews: int, seed: int):
+    """
+    Time to look up every review of every attraction (as the pipeline does when
+    resuming) with the nested list scans of pipeline_progress.json and with the
+    progress store, and time to save after finishing one attraction (whole JSON
+    rewrite against the store's incremental save). Checks the imported store
+    matches the JSON.
+    """
+    legacy = generate_legacy_progress(cities, attractions, reviews, seed)
+    country = legacy.continents[0].countries[0]
+    lookups = [
+        (city.name, attraction.id, review.id)
+        for city in country.cities
+        for attraction in city.attractions
+        for review in attraction.reviews
+    ]
+
+    with tempfile.TemporaryDirectory() as directory:
+        json_path = os.path.join(directory, 'pipeline_progress.json')
+        with open(json_path, 'w', encoding='utf-8') as f:
+            json.dump(legacy, f, cls=utils.EnhancedJSONEncoder, indent=2)
+
+        start_time = time.perf_counter()
+        legacy_done = 0
+        for city_name, attraction_id, review_id in lookups:
+            city = next(c for c in country.cities if c.name == city_name)
+            attraction = next(a for a in city.attractions if a.id == attraction_id)
+            review = next(r for r in attraction.reviews if r.id == review_id)
+            legacy_done += review.progress == '✅'
+        legacy_lookup_time = time.perf_counter() - start_time
+
+        start_time = time.perf_counter()
+        with open(json_path, 'w', encoding='utf-8') as f:
+            json.dump(legacy, f, cls=utils.EnhancedJSONEncoder, indent=2)
+        legacy_save_time = time.perf_counter() - start_time
+
+        store = progress.ProgressStore(
+            os.path.join(directory, 'pipeline_progress.sqlite3'), json_path
+        )
+        start_time = time.perf_counter()
+        store.open()
+        import_time = time.perf_counter() - start_time
+
+        start_time = time.perf_counter()
+        store_done = 0
+        for city_name, attraction_id, review_id in lookups:
+            attraction = store.attraction(
+                'Continent', 'Country', city_name, attraction_id, attraction_id
+            )
+            store_done += review_id in store.completed_reviews(attraction)
+        store_lookup_time = time.perf_counter() - start_time
+
+        last_attraction = country.cities[0].attractions[-1]
+        attraction = store.attraction(
+            'Continent', 'Country', 'City 0', last_attraction.id, last_attraction.name
+        )
+        start_time = time.perf_counter()
+        store.complete_reviews(
+            attraction, [review.id for review in last_attraction.reviews]
+        )
+        store.set_attraction_done(attraction)
+        store.save()
+        store_save_time = time.perf_counter() - start_time
+
+        same_progress = store_done == legacy_done and all(
+            store.attraction('Continent', 'Country', city.name, a.id, a.name).done
+            == (a.progress == '✅')
+            for city in country.cities
+            for a in city.attractions
+            if a is not last_attraction
+        )
+        store.close()
+
+    print(
+        f'reviews: {len(lookups)}\n'
+        f'{"":<10}{"lookups (s)":>14}{"save (s)":>12}\n'
+        f'{"json":<10}{legacy_lookup_time:>14.3f}{legacy_save_time:>12.4f}\n'
+        f'{"store":<10}{store_lookup_time:>14.3f}{store_save_time:>12.4f}\n'
+        f'json import (s): {import_time:.3f}\nsame progress: {same_progress}'
+    )
+
+    return same_progress
+
+
+def wait_stage(seconds: float, item: int) -> int:
+    # Stands for a stage waiting on I/O (Places API, Chrome, Gemini)
+    time.sleep(seconds)
+    return item
+
+
+def busy_stage(seconds: float, item: int) -> int:
+    # Stands for a CPU bound stage (spaCy and VADER)
+    end = time.perf_counter() + seconds
+    while time.perf_counter() < end:
+        pass
+    return item
+
+
+def benchmark_stages(items: int, seconds: float, scrape_workers: int):
+    """
+    Runs `items` through stages shaped like the pipeline ones (lookup, scrape,
+    analysis in a process, classify), first one stage after the other for each item
+    as the serial pipeline did, then with StagedPipeline. Also stops a staged run
+    midway to check it drains: only whole items come out, in order.
+    """
+    durations = {
+        'lookup': 0.2 * seconds,
+        'scrape': 2 * seconds,
+        'analysis': seconds,
+        'classify': 0.5 * seconds,
+    }
+    workers = {'lookup': 1, 'scrape': scrape_workers, 'analysis': 1, 'classify': 2}
+
+    def pipeline_stages():
+        return [
+            stages.Stage(
+                name,
+                functools.partial(
+                    busy_stage if name == 'analysis' else wait_stage, duration
+                ),
+                workers=workers[name],
+                processes=name == 'analysis',
+            )
+            for name, duration in durations.items()
+        ]
+
+    start_time = time.perf_counter()
+    serial_results = []
+    for item in range(items):
+        for name, duration in durations.items():
+            item = (busy_stage if name == 'analysis' else wait_stage)(duration, item)
+        serial_results.append(item)
+    serial_time = time.perf_counter() - start_time
+
+    pipeline = stages.StagedPipeline(pipeline_stages())
+    # Includes spawning the analysis worker process
+    start_time = time.perf_counter()
+    staged_results = list(pipeline.run(range(items)))
+    staged_time = time.perf_counter() - start_time
+
+    stopped_pipeline = stages.StagedPipeline(pipeline_stages())
+    drained_results = []
+    for item in stopped_pipeline.run(range(items)):
+        drained_results.append(item)
+        if len(drained_results) == 2:
+            stopped_pipeline.stop()
+
+    slowest_stage = max(durations[name] / workers[name] for name in durations) * items
+    same_results = staged_results == serial_results
+    drained = drained_results == list(range(len(drained_results))) and (
+        len(drained_results) < items
+    )
+    print(
+        f'items: {items}\n'
+        f'serial (s): {serial_time:.2f}\n'
+        f'staged (s): {staged_time:.2f}\n'
+        f'slowest stage (s): {slowest_stage:.2f}\n'
+        f'same results: {same_results}\n'
+        f'drained after stop: {len(drained_results)} items, in order: {drained}'
+    )
+
+    return same_results and drained
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Pipeline benchmarks')
+    parser.add_argument('benchmark', choices=['progress', 'stages'])
+    parser.add_argument('--cities', type=int, default=20)
+    parser.add_argument('--attractions', type=int, default=15)
+    parser.add_argument('--reviews', type=int, default=300)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--items', type=int, default=30)
+    parser.add_argument('--seconds', type=float, default=0.05)
+    parser.add_argument('--scrape-workers', type=int, default=2)
+    args = parser.parse_args()
+
+    if args.benchmark == 'progress':
+        benchmark_progress(args.cities, args.attractions, args.reviews, args.seed)
+    elif args.benchmark == 'stages':
+        benchmark_stages(args.items, args.seconds, args.scrape_workers)
@@ -0,0 +1,77 @@
+import logging
+import os
+import time
+from typing import Optional
+
+import Network.main as network
+import Pipeline.progress as progress
+
+logger = logging.getLogger(os.getenv('DATA_NETWORK_LOGGER', 'data-and-network'))
+
+# The progress (see Pipeline.progress) and the graph are saved separately: the
+# progress records the last graph mutation (see Network.wal) of the attractions it
+# marks as done, and mutations logged after it are dropped when the pipeline starts
+# again, so an attraction interrupted halfway is never counted twice.
+
+
+def last_graph_mutation() -> Optional[int]:
+    # The sequence is only known once the network (and its mutation log) is loaded
+    return network.mutation_log.last_sequence if network.is_loaded() else None
+
+
+def restore_last_checkpoint(progress_store: progress.ProgressStore):
+    """Drops the graph mutations logged after the last progress checkpoint."""
+    if progress_store.wal_sequence is not None:
+        network.discard_mutations_after(progress_store.wal_sequence)
+
+
+def resume_pipeline_progress(progress_store: progress.ProgressStore) -> int:
+    """
+    Rolls the graph back to the last checkpoint and loads it, then checkpoints its
+    last mutation right away, so a crash before the first checkpoint of this run (or
+    of a fresh or imported progress) still rolls back the unfinished attractions.
+    Returns that mutation.
+    """
+    restore_last_checkpoint(progress_store)
+    network.get_graph()
+    completed_sequence = last_graph_mutation()
+    progress_store.save(wal_sequence=completed_sequence)
+
+    return completed_sequence
+
+
+def checkpoint_pipeline(progress_store: progress.ProgressStore):
+    """
+    Makes the graph mutations durable, then saves what changed in the progress along
+    with the last of those mutations in one SQLite transaction. Graph snapshots are
+    only taken here (see Network.main.automatic_checkpoints), so after a crash the
+    graph is rolled back to the last checkpoint (see restore_last_checkpoint) and
+    the unfinished attractions are processed again without being counted twice.
+    """
+    network.mutation_log.sync()
+    progress_store.save(wal_sequence=last_graph_mutation())
+    network.checkpoint_if_needed(automatic=False)
+
+
+def save_pipeline_progress(
+    progress_store: progress.ProgressStore,
+    start_time: float = None,
+    wal_sequence: int = None,
+):
+    """
+    `wal_sequence` is the last graph mutation of the attractions marked as done.
+    Mutations after it belong to an attraction that failed halfway and are dropped,
+    so that attraction is processed again without counting its reviews twice.
+    """
+    logger.info('Saving progress before exiting...')
+    network.mutation_log.sync()
+    if wal_sequence is not None:
+        network.discard_mutations_after(wal_sequence)
+    # Save pipeline (only what changed since the last checkpoint)
+    progress_store.close(wal_sequence=wal_sequence)
+    # Save network
+    network.save_graph()
+    network.save_network_info()
+
+    if start_time is not None:
+        logger.info('Elapsed time: {:.2f} seconds'.format(time.time() - start_time))
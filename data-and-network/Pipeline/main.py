@@ -1,72 +1,47 @@
 from dataclasses import dataclass
 import datetime
-import json
+import functools
 import logging
 import os
 import shutil
 import signal
 import sys
 import time
-from typing import List, Literal
-
-from dacite import from_dict
+from typing import Iterator, List, Tuple, Union
 
 import Network.main as network
+import Pipeline.analysis as analysis
+import Pipeline.checkpoints as checkpoints
+import Pipeline.progress as progress
+import Pipeline.stages as stages
 import Places.main as places
 import PlacesAPI.main as places_api
 import Scraper.main as scraper
+import Sentiments.client as sentiments_client
 import Sentiments.main as sentiments
 import Shared.main as utils
 
-
-@dataclass
-class ReviewProgress:
-    id: str
-    progress: Literal['✅', '❌']
-
-
-# Define the Attraction dataclass
-@dataclass
-class AttractionProgress:
-    id: str
-    name: str
-    reviews: List[ReviewProgress]
-    progress: Literal['✅', '❌']
-
-
-# Define the City dataclass
-@dataclass
-class CityProgress:
-    name: str
-    progress: Literal['✅', '❌']
-    attractions: List[AttractionProgress]
-
-
-# Define the Country dataclass
-@dataclass
-class CountryProgress:
-    name: str
-    progress: Literal['✅', '❌']
-    cities: List[CityProgress]
-
-
-# Define the Continent dataclass
-@dataclass
-class ContinentProgress:
-    name: str
-    progress: Literal['✅', '❌']
-    countries: List[CountryProgress]
-
-
-@dataclass
-class PipelineProgress:
-    continents: List[ContinentProgress]
-
-
 logger = logging.getLogger(os.getenv('DATA_NETWORK_LOGGER', 'data-and-network'))
 
 MODULE_DIR = os.path.dirname(os.path.realpath(__file__))
+PIPELINE_PROGRESS_DB_PATH = os.path.join(MODULE_DIR, 'pipeline_progress.sqlite3')
+# Progress format before PIPELINE_PROGRESS_DB_PATH, imported automatically
 PIPELINE_PROGRESS_PATH = os.path.join(MODULE_DIR, 'pipeline_progress.json')
+# Progress is checkpointed after every PIPELINE_CHECKPOINT_ATTRACTIONS processed
+# attractions, or sooner once PIPELINE_CHECKPOINT_SECONDS passed since the last one
+PIPELINE_CHECKPOINT_ATTRACTIONS = int(os.getenv('PIPELINE_CHECKPOINT_ATTRACTIONS', 1))
+PIPELINE_CHECKPOINT_SECONDS = float(os.getenv('PIPELINE_CHECKPOINT_SECONDS', 60.0))
+# Workers of each stage of the pipeline (see Pipeline.stages): Places API lookups,
+# scrapers (one Chrome each), review analysis processes (spaCy and VADER, 0 to
+# analyze in this process) and Gemini classifications, and how many attractions wait
+# between two stages
+PIPELINE_LOOKUP_WORKERS = int(os.getenv('PIPELINE_LOOKUP_WORKERS', 2))
+PIPELINE_SCRAPE_WORKERS = int(os.getenv('PIPELINE_SCRAPE_WORKERS', 2))
+PIPELINE_ANALYSIS_PROCESSES = int(
+    os.getenv('PIPELINE_ANALYSIS_PROCESSES', sentiments.NLP_N_PROCESS)
+)
+PIPELINE_CLASSIFY_WORKERS = int(os.getenv('PIPELINE_CLASSIFY_WORKERS', 2))
+PIPELINE_QUEUE_SIZE = int(os.getenv('PIPELINE_QUEUE_SIZE', 4))
 SCRAPED_REVIEWS_PATH = os.path.join(
     MODULE_DIR,
     '..',
@@ -82,7 +57,7 @@ def handle_sigint(_sig, _frame):
     global interrupted_count
 
     logger.info(
-        'Termination signal received. Ending on end of current iteration... Press Ctrl+C again to force quit.'
+        'Termination signal received. Finishing the attractions already being processed... Press Ctrl+C again to force quit.'
     )
     interrupted = True
 
@@ -92,9 +67,6 @@ def handle_sigint(_sig, _frame):
         sys.exit(1)
 
 
-signal.signal(signal.SIGINT, handle_sigint)
-
-
 def generate_reviews_directory(
     continent: str, country: str, city: str, attraction: str
 ) -> str:
@@ -131,267 +103,329 @@ def generate_seen_ids_path(
     return os.path.join(reviews_directory, 'google_reviews.ids')
 
 
-def get_pipeline_progress(places_info: places.Places) -> PipelineProgress:
-    if os.path.exists(PIPELINE_PROGRESS_PATH):
-        with open(PIPELINE_PROGRESS_PATH, 'r', encoding='utf-8') as f:
-            data = json.load(f)
-            return from_dict(data_class=PipelineProgress, data=data)
-    else:
-        pipeline_progress = PipelineProgress(continents=[])
-        for continent in places_info.continents:
-            continent_progress = ContinentProgress(
-                name=continent.name, progress='❌', countries=[]
+def reset_pipeline_data():
+    logger.info('Resetting existing Pipeline data...')
+
+    for path in [
+        PIPELINE_PROGRESS_PATH,
+        PIPELINE_PROGRESS_DB_PATH,
+        f'{PIPELINE_PROGRESS_DB_PATH}-wal',
+        f'{PIPELINE_PROGRESS_DB_PATH}-shm',
+    ]:
+        if os.path.exists(path):
+            os.remove(path)
+    if os.path.exists(SCRAPED_REVIEWS_PATH):
+        shutil.rmtree(SCRAPED_REVIEWS_PATH)
+
+    logger.info('Pipeline data reset complete. ✅')
+
+
+@dataclass
+class CityTask:
+    continent: str
+    country: str
+    city: places.City
+
+
+@dataclass
+class RegionDone:
+    # (continent,), (continent, country) or (continent, country, city)
+    region: Tuple[str, ...]
+
+
+def pending_cities(
+    places_info: places.Places, progress_store: progress.ProgressStore
+) -> Iterator[Union[CityTask, RegionDone]]:
+    """
+    Cities not done yet, each country and continent followed by its RegionDone once
+    all of its cities were handed out.
+    """
+    for continent in places_info.continents:
+        if progress_store.is_done(continent.name):
+            logger.info(
+                f'Skipping continent {continent.name} as it is already completed.'
             )
-            for country in continent.countries:
-                country_progress = CountryProgress(
-                    name=country.name, progress='❌', cities=[]
+            continue
+
+        for country in continent.countries:
+            if progress_store.is_done(continent.name, country.name):
+                logger.info(
+                    f'Skipping country {country.name} as it is already completed.'
                 )
-                for city in country.cities:
-                    city_progress = CityProgress(
-                        name=city.name, progress='❌', attractions=[]
+                continue
+
+            for city in country.cities:
+                if progress_store.is_done(continent.name, country.name, city.name):
+                    logger.info(
+                        f'Skipping city {city.name} as it is already completed.'
                     )
-                    country_progress.cities.append(city_progress)
-                continent_progress.countries.append(country_progress)
-            pipeline_progress.continents.append(continent_progress)
+                    continue
 
-    return pipeline_progress
+                yield CityTask(continent.name, country.name, city)
 
+            yield RegionDone((continent.name, country.name))
 
-def save_pipeline_progress(progress: PipelineProgress, start_time: float = None):
-    logger.info('Saving progress before exiting...')
-    # Save pipeline
-    with open(PIPELINE_PROGRESS_PATH, 'w', encoding='utf-8') as f:
-        json.dump(
-            progress, f, ensure_ascii=False, cls=utils.EnhancedJSONEncoder, indent=2
-        )
-    # Save network
-    network.save_graph()
-    network.save_network_info()
+        yield RegionDone((continent.name,))
 
-    logger.info('Elapsed time: {:.2f} seconds'.format(time.time() - start_time))
 
+def lookup_attractions(
+    progress_store: progress.ProgressStore, task: CityTask
+) -> List[Union[analysis.AttractionTask, RegionDone]]:
+    """Attractions of the city still to process, followed by the city RegionDone."""
+    city = task.city
+    logger.info(
+        f'Processing city: {city.name} in country: {task.country}, continent: {task.continent}'
+    )
 
-def reset_pipeline_data():
-    logger.info('Resetting existing Pipeline data...')
+    places_api_city_info = places_api.Location(
+        name=city.name, latitude=city.latitude, longitude=city.longitude
+    )
+    city_attractions = places_api.getNearbyAttractions(
+        places_api_city_info, maximum_results=15
+    )
+    logger.info(
+        f'Found {len(city_attractions)} attractions for city: {city.name}: {[a.displayName["text"] for a in city_attractions]}'
+    )
 
-    if os.path.exists(PIPELINE_PROGRESS_PATH):
-        os.remove(PIPELINE_PROGRESS_PATH)
-    if os.path.exists(SCRAPED_REVIEWS_PATH):
-        shutil.rmtree(SCRAPED_REVIEWS_PATH)
+    tasks = []
+    for attraction in city_attractions:
+        attraction_progress = progress_store.attraction(
+            task.continent,
+            task.country,
+            city.name,
+            attraction.id,
+            attraction.displayName['text'],
+        )
+        completed_reviews = progress_store.completed_reviews(attraction_progress)
+        if attraction_progress.done and len(completed_reviews) > 0:
+            logger.info(
+                f'Skipping attraction {attraction.displayName["text"]} as it is already completed.'
+            )
+            continue
 
-    logger.info('Pipeline data reset complete. ✅')
+        tasks.append(
+            analysis.AttractionTask(task.continent, task.country, city.name, attraction)
+        )
+    tasks.append(RegionDone((task.continent, task.country, city.name)))
+
+    return tasks
+
+
+def scrape_attraction(
+    progress_store: progress.ProgressStore, task: analysis.AttractionTask
+) -> analysis.AttractionTask:
+    reviews = scraper.scrape_google_maps(
+        {
+            'url': f'{task.attraction.googleMapsUri}&hl=en',
+            'json_path': generate_json_reviews_path(
+                task.continent, task.country, task.city, task.name
+            ),
+            'seen_ids_path': generate_seen_ids_path(
+                task.continent, task.country, task.city, task.name
+            ),
+            'stop_on_match': False,
+        }
+    )
 
+    completed_reviews = progress_store.completed_reviews(
+        progress_store.attraction(
+            task.continent, task.country, task.city, task.attraction.id, task.name
+        )
+    )
+    for review in reviews:
+        if review.review_id in completed_reviews:
+            logger.info(
+                f'Skipping review {review.review_id} for attraction {task.name} as it is already completed.'
+            )
+            continue
+
+        task.reviews.append(review)
+    task.scraped_reviews = len(reviews)
+
+    logger.info(f'Processing {len(task.reviews)} reviews for attraction {task.name}')
+    return task
+
+
+def classify_attraction_adjectives(
+    emotion_client: sentiments_client.EmotionClassificationClient,
+    task: analysis.AttractionTask,
+) -> analysis.AttractionTask:
+    adjective_emotions = emotion_client.prefetch(
+        [
+            adjective
+            for review_analysis in task.analyses
+            for sentence in review_analysis.sentences
+            for adjective in sentence.adjectives
+        ]
+    )
+    task.adjective_emotions = {
+        adjective: future.result() for adjective, future in adjective_emotions.items()
+    }
+    return task
+
+
+def add_attraction_to_network(
+    progress_store: progress.ProgressStore, task: analysis.AttractionTask
+):
+    # One row per adjective occurrence, added to the graph at once
+    emotion_names = []
+    sentiment_scores = []
+    review_ratings = []
+    review_dates = []
+    for review, review_analysis in zip(task.reviews, task.analyses):
+        for sentence in review_analysis.sentences:
+            for adjective in sentence.adjectives:
+                emotion_names.append(adjective)
+                sentiment_scores.append(sentence.sentiment['compound'])
+                review_ratings.append(review.rating)
+                review_dates.append(review.review_date)
+
+    network.add_edges_bulk(
+        task.attraction,
+        emotion_names,
+        'adjective',
+        sentiment_scores,
+        review_ratings,
+        associated_emotions=[
+            task.adjective_emotions[adjective] for adjective in emotion_names
+        ],
+        review_dates=review_dates,
+        continent=task.continent,
+        country=task.country,
+        city=task.city,
+    )
+    attraction_progress = progress_store.attraction(
+        task.continent, task.country, task.city, task.attraction.id, task.name
+    )
+    progress_store.complete_reviews(
+        attraction_progress, [review.review_id for review in task.reviews]
+    )
+    progress_store.set_attraction_done(attraction_progress)
+    logger.info(
+        f'Finished processing attraction {task.name} with {task.scraped_reviews} reviews.'
+    )
 
-def mark_empty_attractions(pipeline_progress: PipelineProgress):
-    logger.info('Identifying attractions with no reviews...')
-    for continent in pipeline_progress.continents:
-        for country in continent.countries:
-            for city in country.cities:
-                for attraction in city.attractions:
-                    if len(attraction.reviews) == 0:
-                        logger.info(
-                            f'Attraction {attraction.name} in city {city.name}, country {country.name}, continent {continent.name} has no reviews. Marking as not started.'
-                        )
-                        attraction.progress = '❌'
-                        city.progress = '❌'
-                        country.progress = '❌'
-                        continent.progress = '❌'
 
+def build_pipeline_stages(
+    progress_store: progress.ProgressStore,
+    emotion_client: sentiments_client.EmotionClassificationClient,
+) -> List[stages.Stage]:
+    """
+    Places API lookup -> scrape -> spaCy and VADER -> Gemini, each stage on its own
+    workers. Adding the edges is left to the caller, so the graph only has one writer.
+    """
+    return [
+        stages.Stage(
+            'lookup',
+            functools.partial(lookup_attractions, progress_store),
+            workers=PIPELINE_LOOKUP_WORKERS,
+            queue_size=PIPELINE_QUEUE_SIZE,
+            expand=True,
+            accepts=CityTask,
+        ),
+        stages.Stage(
+            'scrape',
+            functools.partial(scrape_attraction, progress_store),
+            workers=PIPELINE_SCRAPE_WORKERS,
+            queue_size=PIPELINE_QUEUE_SIZE,
+            accepts=analysis.AttractionTask,
+        ),
+        # Worker processes only get the review texts and parse them with a single
+        # spaCy process each
+        stages.Stage(
+            'analysis',
+            functools.partial(analysis.analyze_review_texts, n_process=1),
+            workers=PIPELINE_ANALYSIS_PROCESSES,
+            processes=True,
+            queue_size=PIPELINE_QUEUE_SIZE,
+            accepts=analysis.AttractionTask,
+            payload=analysis.review_texts,
+            merge=analysis.add_analysis,
+        )
+        if PIPELINE_ANALYSIS_PROCESSES > 0
+        else stages.Stage(
+            'analysis',
+            analysis.analyze_attraction_reviews,
+            queue_size=PIPELINE_QUEUE_SIZE,
+            accepts=analysis.AttractionTask,
+        ),
+        stages.Stage(
+            'classify',
+            functools.partial(classify_attraction_adjectives, emotion_client),
+            workers=PIPELINE_CLASSIFY_WORKERS,
+            queue_size=PIPELINE_QUEUE_SIZE,
+            accepts=analysis.AttractionTask,
+        ),
+    ]
 
-def exec_net_build_pipeline():
-    global interrupted
 
+def exec_net_build_pipeline():
     logger.info(f'\nStarting Pipeline execution... {datetime.datetime.now()}')
     start_time = time.time()
+    signal.signal(signal.SIGINT, handle_sigint)
 
     places_info = places.get_places()
 
-    pipeline_progress = get_pipeline_progress(places_info)
-    mark_empty_attractions(pipeline_progress)
+    progress_store = progress.ProgressStore(
+        PIPELINE_PROGRESS_DB_PATH, legacy_json_path=PIPELINE_PROGRESS_PATH
+    )
+    network.automatic_checkpoints = False
+    # Last graph mutation of a fully processed attraction
+    completed_sequence = checkpoints.resume_pipeline_progress(progress_store)
+    logger.info('Identifying attractions with no reviews...')
+    progress_store.reopen_empty_attractions()
+    attractions_since_checkpoint = 0
+    last_checkpoint_time = time.monotonic()
+    # Sentence memo lookups of every analysis worker
+    memo_hits = memo_misses = 0
+
+    emotion_client = sentiments_client.EmotionClassificationClient()
+    pipeline = stages.StagedPipeline(
+        build_pipeline_stages(progress_store, emotion_client),
+        should_stop=lambda: interrupted,
+    )
 
     try:
-        for continent in places_info.continents:
-            continent_progress = next(
-                (c for c in pipeline_progress.continents if c.name == continent.name),
-                None,
-            )
-            if continent_progress.progress == '✅':
-                logger.info(
-                    f'Skipping continent {continent.name} as it is already completed.'
-                )
+        # Results come out in the order of the serial pipeline, so regions are only
+        # marked as done after all of their attractions
+        for task in pipeline.run(pending_cities(places_info, progress_store)):
+            if isinstance(task, RegionDone):
+                progress_store.set_done(*task.region)
+                region_type = ('continent', 'country', 'city')[len(task.region) - 1]
+                logger.info(f'Finished processing {region_type} {task.region[-1]}.')
+                if len(task.region) == 2:
+                    network.save_network_info()
                 continue
 
-            for country in continent.countries:
-                country_progress = next(
-                    (c for c in continent_progress.countries if c.name == country.name),
-                    None,
+            add_attraction_to_network(progress_store, task)
+            completed_sequence = checkpoints.last_graph_mutation()
+            memo_hits += task.memo_hits
+            memo_misses += task.memo_misses
+            if memo_hits + memo_misses:
+                logger.info(
+                    f'Sentence memo hit rate: {memo_hits / (memo_hits + memo_misses):.1%}'
                 )
-                if country_progress and country_progress.progress == '✅':
-                    logger.info(
-                        f'Skipping country {country.name} as it is already completed.'
-                    )
-                    continue
-                if country_progress is None:
-                    country_progress = CountryProgress(
-                        name=country.name, progress='❌', cities=[]
-                    )
-                    continent_progress.countries.append(country_progress)
-
-                for city in country.cities:
-                    city_progress = next(
-                        (c for c in country_progress.cities if c.name == city.name),
-                        None,
-                    )
-                    if city_progress and city_progress.progress == '✅':
-                        logger.info(
-                            f'Skipping city {city.name} as it is already completed.'
-                        )
-                        continue
-                    if city_progress is None:
-                        city_progress = CityProgress(
-                            name=city.name, progress='❌', attractions=[]
-                        )
-                        country_progress.cities.append(city_progress)
-
-                    logger.info(
-                        f'Processing city: {city.name} in country: {country.name}, continent: {continent.name}'
-                    )
 
-                    places_api_city_info = places_api.Location(
-                        name=city.name, latitude=city.latitude, longitude=city.longitude
-                    )
-                    city_attractions = places_api.getNearbyAttractions(
-                        places_api_city_info, maximum_results=15
-                    )
-                    logger.info(
-                        f'Found {len(city_attractions)} attractions for city: {city.name}: {[a.displayName["text"] for a in city_attractions]}'
-                    )
-
-                    for attraction in city_attractions:
-                        attraction_progress = next(
-                            (
-                                a
-                                for a in city_progress.attractions
-                                if a.id == attraction.id
-                            ),
-                            None,
-                        )
-                        if not attraction_progress:
-                            attraction_progress = AttractionProgress(
-                                id=attraction.id,
-                                name=attraction.displayName['text'],
-                                progress='❌',
-                                reviews=[],
-                            )
-                            city_progress.attractions.append(attraction_progress)
-
-                        if (
-                            attraction_progress
-                            and attraction_progress.progress == '✅'
-                            and len(attraction_progress.reviews) > 0
-                        ):
-                            logger.info(
-                                f'Skipping attraction {attraction.displayName["text"]} as it is already completed.'
-                            )
-                            continue
-
-                        reviews = scraper.scrape_google_maps(
-                            {
-                                'url': f'{attraction.googleMapsUri}&hl=en',
-                                'json_path': generate_json_reviews_path(
-                                    continent.name,
-                                    country.name,
-                                    city.name,
-                                    attraction.displayName['text'],
-                                ),
-                                'seen_ids_path': generate_seen_ids_path(
-                                    continent.name,
-                                    country.name,
-                                    city.name,
-                                    attraction.displayName['text'],
-                                ),
-                                'stop_on_match': False,
-                            }
-                        )
-
-                        for review in reviews:
-                            review_progress = next(
-                                (
-                                    r
-                                    for r in attraction_progress.reviews
-                                    if r.id == review.review_id
-                                ),
-                                None,
-                            )
-                            if not review_progress:
-                                review_progress = ReviewProgress(
-                                    id=review.review_id, progress='❌'
-                                )
-                                attraction_progress.reviews.append(review_progress)
-                            if review_progress and review_progress.progress == '✅':
-                                logger.info(
-                                    f'Skipping review {review.review_id} for attraction {attraction.displayName["text"]} as it is already completed.'
-                                )
-                                continue
-
-                            logger.info(
-                                f'Processing review {review.review_id} for attraction {attraction.displayName["text"]}'
-                            )
-                            review_sentences = sentiments.extract_sentences_from_text(
-                                review.description.get('en', '')
-                            )
-
-                            for sentence in review_sentences:
-                                adjectives = sentiments.extract_sentence_adjectives(
-                                    sentence
-                                )
-                                sentiment_score = sentiments.extract_sentence_sentiment(
-                                    sentence
-                                )
-
-                                for adjective in adjectives:
-                                    network.add_edge(
-                                        attraction,
-                                        adjective,
-                                        'adjective',
-                                        sentiment_score['compound'],
-                                        review.rating,
-                                        associated_emotion=sentiments.classify_adjective_to_emotions_gemini(
-                                            adjective
-                                        ),
-                                        review_date=review.review_date,
-                                        continent=continent.name,
-                                        country=country.name,
-                                        city=city.name,
-                                    )
-
-                            review_progress.progress = '✅'
-
-                        attraction_progress.progress = '✅'
-                        logger.info(
-                            f'Finished processing attraction {attraction.displayName["text"]} with {len(reviews)} reviews.'
-                        )
-
-                        if interrupted:
-                            raise StopIteration
-
-                    city_progress.progress = '✅'
-                    logger.info(f'Finished processing city {city.name}.')
-
-                country_progress.progress = '✅'
-                network.save_network_info()
-                logger.info(f'Finished processing country {country.name}.')
-
-            continent_progress.progress = '✅'
-            logger.info(f'Finished processing continent {continent.name}.')
-
-        logger.info('Pipeline execution completed successfully! ✅')
-
-    except StopIteration:
-        logger.info('Pipeline interrupted. Saving and exiting gracefully.')
+            attractions_since_checkpoint += 1
+            if (
+                attractions_since_checkpoint >= PIPELINE_CHECKPOINT_ATTRACTIONS
+                or time.monotonic() - last_checkpoint_time
+                >= PIPELINE_CHECKPOINT_SECONDS
+            ):
+                checkpoints.checkpoint_pipeline(progress_store)
+                attractions_since_checkpoint = 0
+                last_checkpoint_time = time.monotonic()
+
+        if interrupted:
+            logger.info('Pipeline interrupted. Saving and exiting gracefully.')
+        else:
+            logger.info('Pipeline execution completed successfully! ✅')
 
     finally:
-        save_pipeline_progress(pipeline_progress, start_time)
+        emotion_client.shutdown(wait=False)
+        checkpoints.save_pipeline_progress(
+            progress_store, start_time, completed_sequence
+        )
 
     sys.exit(0)
     return
@@ -0,0 +1,384 @@
+from dataclasses import dataclass
+import json
+import logging
+import os
+import sqlite3
+import threading
+from typing import Dict, Iterable, List, Literal, Optional, Set, Tuple
+
+from dacite import from_dict
+
+logger = logging.getLogger(os.getenv('DATA_NETWORK_LOGGER', 'data-and-network'))
+
+
+# Legacy pipeline_progress.json format, only read to import it
+@dataclass
+class ReviewProgress:
+    id: str
+    progress: Literal['✅', '❌']
+
+
+@dataclass
+class AttractionProgress:
+    id: str
+    name: str
+    reviews: List[ReviewProgress]
+    progress: Literal['✅', '❌']
+
+
+@dataclass
+class CityProgress:
+    name: str
+    progress: Literal['✅', '❌']
+    attractions: List[AttractionProgress]
+
+
+@dataclass
+class CountryProgress:
+    name: str
+    progress: Literal['✅', '❌']
+    cities: List[CityProgress]
+
+
+@dataclass
+class ContinentProgress:
+    name: str
+    progress: Literal['✅', '❌']
+    countries: List[CountryProgress]
+
+
+@dataclass
+class PipelineProgress:
+    continents: List[ContinentProgress]
+
+
+# (continent,), (continent, country) or (continent, country, city)
+RegionPath = Tuple[str, ...]
+# (continent, country, city, attraction id)
+AttractionPath = Tuple[str, str, str, str]
+
+
+@dataclass
+class AttractionState:
+    key: int
+    path: AttractionPath
+    name: str
+    done: bool
+    # Ids of the processed reviews, loaded on first use (see completed_reviews)
+    reviews: Optional[Set[str]] = None
+
+
+class ProgressStore:
+    """
+    Pipeline progress persisted in SQLite (WAL journal): done regions (continents,
+    countries and cities), attractions of each city and the ids of the processed
+    reviews of each attraction. Regions and attractions are kept in dicts, review ids
+    in a set per attraction loaded when first needed, so every lookup is O(1).
+    Changes stay in memory until `save`, which writes only what changed in a single
+    transaction (a checkpoint, see Pipeline.checkpoints.checkpoint_pipeline). A legacy
+    pipeline_progress.json is imported the first time the database is created.
+    The store can be shared by the stages of the pipeline: every method holds the
+    same lock.
+    """
+
+    def __init__(self, path: str, legacy_json_path: str = None):
+        self.path = path
+        self.legacy_json_path = legacy_json_path
+        self._connection: sqlite3.Connection = None
+        self._regions: Dict[RegionPath, bool] = {}
+        self._attractions: Dict[AttractionPath, AttractionState] = {}
+        self._dirty_regions: Set[RegionPath] = set()
+        self._dirty_attractions: Set[AttractionPath] = set()
+        self._new_reviews: List[Tuple[int, str]] = []
+        self._next_key = 1
+        self._wal_sequence: Optional[int] = None
+        self._lock = threading.RLock()
+
+    @property
+    def connection(self) -> sqlite3.Connection:
+        return self.open()
+
+    def open(self) -> sqlite3.Connection:
+        """Connects and loads the regions and attractions (done on first use)."""
+        with self._lock:
+            if self._connection is None:
+                self._connection = self._connect()
+                self._load()
+            return self._connection
+
+    def _connect(self) -> sqlite3.Connection:
+        connection = sqlite3.connect(
+            self.path, isolation_level=None, check_same_thread=False
+        )
+        connection.execute('PRAGMA journal_mode=WAL')
+        connection.execute('PRAGMA synchronous=NORMAL')
+        connection.execute(
+            'CREATE TABLE IF NOT EXISTS regions (continent TEXT NOT NULL, '
+            "country TEXT NOT NULL DEFAULT '', city TEXT NOT NULL DEFAULT '', "
+            'done INTEGER NOT NULL, PRIMARY KEY (continent, country, city)) '
+            'WITHOUT ROWID'
+        )
+        connection.execute(
+            'CREATE TABLE IF NOT EXISTS attractions (key INTEGER PRIMARY KEY, '
+            'continent TEXT NOT NULL, country TEXT NOT NULL, city TEXT NOT NULL, '
+            'id TEXT NOT NULL, name TEXT NOT NULL, done INTEGER NOT NULL, '
+            'UNIQUE (continent, country, city, id))'
+        )
+        connection.execute(
+            'CREATE TABLE IF NOT EXISTS reviews (attraction INTEGER NOT NULL, '
+            'id TEXT NOT NULL, PRIMARY KEY (attraction, id)) WITHOUT ROWID'
+        )
+        connection.execute(
+            'CREATE TABLE IF NOT EXISTS state (key TEXT PRIMARY KEY, value) '
+            'WITHOUT ROWID'
+        )
+
+        is_empty = (
+            connection.execute('SELECT 1 FROM regions LIMIT 1').fetchone() is None
+            and connection.execute('SELECT 1 FROM attractions LIMIT 1').fetchone()
+            is None
+        )
+        if (
+            is_empty
+            and self.legacy_json_path
+            and os.path.exists(self.legacy_json_path)
+            and os.path.getsize(self.legacy_json_path) > 0
+        ):
+            self._import_legacy_json(connection)
+
+        return connection
+
+    def _import_legacy_json(self, connection: sqlite3.Connection):
+        with open(self.legacy_json_path, 'r', encoding='utf-8') as f:
+            legacy = from_dict(data_class=PipelineProgress, data=json.load(f))
+
+        regions, attractions, reviews = [], [], []
+        for continent in legacy.continents:
+            regions.append((continent.name, '', '', continent.progress == '✅'))
+            for country in continent.countries:
+                regions.append(
+                    (continent.name, country.name, '', country.progress == '✅')
+                )
+                for city in country.cities:
+                    regions.append(
+                        (continent.name, country.name, city.name, city.progress == '✅')
+                    )
+                    for attraction in city.attractions:
+                        key = len(attractions) + 1
+                        attractions.append(
+                            (
+                                key,
+                                continent.name,
+                                country.name,
+                                city.name,
+                                attraction.id,
+                                attraction.name,
+                                attraction.progress == '✅',
+                            )
+                        )
+                        # Only processed reviews are kept, the others are pending
+                        reviews.extend(
+                            (key, review.id)
+                            for review in attraction.reviews
+                            if review.progress == '✅'
+                        )
+
+        with connection:
+            connection.execute('BEGIN')
+            connection.executemany(
+                'INSERT OR REPLACE INTO regions VALUES (?, ?, ?, ?)', regions
+            )
+            connection.executemany(
+                'INSERT OR IGNORE INTO attractions VALUES (?, ?, ?, ?, ?, ?, ?)',
+                attractions,
+            )
+            connection.executemany(
+                'INSERT OR IGNORE INTO reviews VALUES (?, ?)', reviews
+            )
+        logger.info(
+            f'Imported the progress of {len(attractions)} attractions and '
+            f'{len(reviews)} reviews from {self.legacy_json_path}.'
+        )
+
+    def _load(self):
+        self._regions = {
+            tuple(part for part in (continent, country, city) if part): bool(done)
+            for continent, country, city, done in self._connection.execute(
+                'SELECT continent, country, city, done FROM regions'
+            )
+        }
+        self._attractions = {
+            (continent, country, city, attraction_id): AttractionState(
+                key=key,
+                path=(continent, country, city, attraction_id),
+                name=name,
+                done=bool(done),
+            )
+            for key, continent, country, city, attraction_id, name, done in (
+                self._connection.execute(
+                    'SELECT key, continent, country, city, id, name, done '
+                    'FROM attractions'
+                )
+            )
+        }
+        self._next_key = (
+            max((state.key for state in self._attractions.values()), default=0) + 1
+        )
+        row = self._connection.execute(
+            "SELECT value FROM state WHERE key = 'wal_sequence'"
+        ).fetchone()
+        self._wal_sequence = row[0] if row else None
+
+    @property
+    def wal_sequence(self) -> Optional[int]:
+        """
+        Last graph mutation (see Network.wal) saved along with the progress, None if
+        never saved.
+        """
+        with self._lock:
+            self.open()
+            return self._wal_sequence
+
+    def is_done(self, *region: str) -> bool:
+        """Whether a continent, country (continent, country) or city is done."""
+        with self._lock:
+            self.open()
+            return self._regions.get(region, False)
+
+    def set_done(self, *region: str, done: bool = True):
+        with self._lock:
+            self.open()
+            if self._regions.get(region) != done:
+                self._regions[region] = done
+                self._dirty_regions.add(region)
+
+    def attraction(
+        self, continent: str, country: str, city: str, attraction_id: str, name: str
+    ) -> AttractionState:
+        """Progress of an attraction of a city, created if missing."""
+        with self._lock:
+            self.open()
+            path = (continent, country, city, attraction_id)
+            state = self._attractions.get(path)
+            if state is None:
+                state = AttractionState(
+                    key=self._next_key, path=path, name=name, done=False, reviews=set()
+                )
+                self._next_key += 1
+                self._attractions[path] = state
+                self._dirty_attractions.add(path)
+
+            return state
+
+    def set_attraction_done(self, attraction: AttractionState, done: bool = True):
+        with self._lock:
+            if attraction.done != done:
+                attraction.done = done
+                self._dirty_attractions.add(attraction.path)
+
+    def completed_reviews(self, attraction: AttractionState) -> Set[str]:
+        """Ids of the processed reviews of an attraction."""
+        with self._lock:
+            if attraction.reviews is None:
+                attraction.reviews = {
+                    review_id
+                    for (review_id,) in self.connection.execute(
+                        'SELECT id FROM reviews WHERE attraction = ?', (attraction.key,)
+                    )
+                }
+            return attraction.reviews
+
+    def complete_reviews(self, attraction: AttractionState, review_ids: Iterable[str]):
+        with self._lock:
+            completed = self.completed_reviews(attraction)
+            for review_id in review_ids:
+                if review_id not in completed:
+                    completed.add(review_id)
+                    self._new_reviews.append((attraction.key, review_id))
+
+    def reopen_empty_attractions(self) -> int:
+        """
+        Marks attractions without processed reviews as not done, along with their
+        city, country and continent, so they are scraped again. Returns how many.
+        """
+        with self._lock:
+            self.save()
+            empty_keys = {
+                key
+                for (key,) in self.connection.execute(
+                    'SELECT key FROM attractions WHERE NOT EXISTS '
+                    '(SELECT 1 FROM reviews WHERE reviews.attraction = attractions.key)'
+                )
+            }
+            for state in self._attractions.values():
+                if state.key not in empty_keys:
+                    continue
+                continent, country, city, _ = state.path
+                logger.info(
+                    f'Attraction {state.name} in city {city}, country {country}, continent {continent} has no reviews. Marking as not started.'
+                )
+                self.set_attraction_done(state, False)
+                for region in [
+                    (continent,),
+                    (continent, country),
+                    (continent, country, city),
+                ]:
+                    self.set_done(*region, done=False)
+            self.save()
+
+            return len(empty_keys)
+
+    @property
+    def has_changes(self) -> bool:
+        return bool(self._dirty_regions or self._dirty_attractions or self._new_reviews)
+
+    def save(self, wal_sequence: int = None):
+        """
+        Writes what changed since the last save, and the last graph mutation covered by
+        this progress (`wal_sequence`) when given, in a single transaction: a crash
+        keeps either all of it or none of it.
+        """
+        with self._lock:
+            new_sequence = (
+                wal_sequence is not None and wal_sequence != self.wal_sequence
+            )
+            if not self.has_changes and not new_sequence:
+                return
+
+            connection = self.connection
+            with connection:
+                connection.execute('BEGIN')
+                if new_sequence:
+                    connection.execute(
+                        "INSERT OR REPLACE INTO state VALUES ('wal_sequence', ?)",
+                        (wal_sequence,),
+                    )
+                connection.executemany(
+                    'INSERT OR REPLACE INTO regions VALUES (?, ?, ?, ?)',
+                    (
+                        (*region, *[''] * (3 - len(region)), self._regions[region])
+                        for region in self._dirty_regions
+                    ),
+                )
+                connection.executemany(
+                    'INSERT OR REPLACE INTO attractions VALUES (?, ?, ?, ?, ?, ?, ?)',
+                    (
+                        (state.key, *state.path, state.name, state.done)
+                        for state in map(self._attractions.get, self._dirty_attractions)
+                    ),
+                )
+                connection.executemany(
+                    'INSERT OR IGNORE INTO reviews VALUES (?, ?)', self._new_reviews
+                )
+            self._dirty_regions.clear()
+            self._dirty_attractions.clear()
+            self._new_reviews.clear()
+            if new_sequence:
+                self._wal_sequence = wal_sequence
+
+    def close(self, wal_sequence: int = None):
+        with self._lock:
+            if self._connection is not None:
+                self.save(wal_sequence)
+                self._connection.close()
+                self._connection = None
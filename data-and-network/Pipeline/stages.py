@@ -0,0 +1,282 @@
+from concurrent.futures import Executor, Future, ProcessPoolExecutor, ThreadPoolExecutor
+from dataclasses import dataclass
+import logging
+import multiprocessing
+import os
+import queue
+import signal
+import threading
+from typing import Any, Callable, Iterable, Iterator, List
+
+logger = logging.getLogger(os.getenv('DATA_NETWORK_LOGGER', 'data-and-network'))
+
+# Seconds a blocked queue operation waits before checking whether the pipeline
+# was closed
+POLL_SECONDS = 0.1
+
+# Marks the end of the items in a queue
+_END = object()
+
+
+@dataclass
+class Stage:
+    """
+    A step of a StagedPipeline. `function` is called with each item and returns the
+    item handed to the next stage (with `expand`, an iterable of items, possibly
+    empty). Items that are not instances of `accepts` go through the stage
+    untouched. `function` runs on `workers` threads, or on `workers` processes with
+    `processes` (then `function`, the items and the results must be picklable). With
+    `payload`, `function` is called with `payload(item)` instead and `merge(item,
+    result)` gives the item handed to the next stage, so only what the function
+    needs is sent to the worker processes. At most `queue_size` processed items wait
+    for the next stage.
+    """
+
+    name: str
+    function: Callable[[Any], Any]
+    workers: int = 1
+    processes: bool = False
+    queue_size: int = 4
+    expand: bool = False
+    accepts: type = object
+    payload: Callable[[Any], Any] = None
+    merge: Callable[[Any, Any], Any] = None
+
+
+@dataclass
+class _Item:
+    value: Any
+    # Whether a stage function already processed the item (see StagedPipeline.stop)
+    started: bool = False
+
+
+@dataclass
+class _Failure:
+    stage: str
+    error: BaseException
+
+
+def _ignore_sigint():
+    # Ctrl+C reaches the whole process group: worker processes leave it to the
+    # parent, which drains the pipeline
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+
+
+class StagedPipeline:
+    """
+    Runs items through stages, each on its own pool of workers, connected by bounded
+    queues: a full queue blocks the stage before it, so fast stages never run ahead
+    of slow ones by more than the queue sizes and every stage works at the same time.
+    Total time approaches the one of the slowest stage instead of the sum of all of
+    them. Results come out of `run` in the order of the items, whatever the stage
+    that finished first.
+
+    `stop` (or `should_stop` returning True) drains the pipeline: no new item is
+    taken from the source, items no stage has started yet are dropped and the items
+    already started go through the remaining stages. Worker processes are spawned
+    (not forked), as the pipeline threads may hold locks when they start.
+    """
+
+    def __init__(self, stages: List[Stage], should_stop: Callable[[], bool] = None):
+        self.stages = stages
+        self.should_stop = should_stop
+        self._stopped = threading.Event()
+        # Set when a stage fails: items before the failure still go through the
+        # remaining stages, but no new item is taken from the source
+        self._failed = threading.Event()
+        self._closed = threading.Event()
+        self._executors: List[Executor] = []
+        self._threads: List[threading.Thread] = []
+
+    def stop(self):
+        self._stopped.set()
+
+    @property
+    def stopped(self) -> bool:
+        if not self._stopped.is_set() and self.should_stop and self.should_stop():
+            self._stopped.set()
+        return self._stopped.is_set()
+
+    def run(self, items: Iterable) -> Iterator:
+        """
+        Feeds `items` to the first stage and yields the output of the last one. An
+        exception of a stage is raised here once the results before it were yielded.
+        """
+        source_queue = queue.Queue(maxsize=self.stages[0].queue_size)
+        self._start_thread('source', self._feed, items, source_queue)
+        output_queue = source_queue
+        for stage in self.stages:
+            output_queue = self._start_stage(stage, output_queue)
+
+        try:
+            while True:
+                item = self._get(output_queue)
+                if item is _END:
+                    return
+                if isinstance(item, _Failure):
+                    logger.error(f'Pipeline stage {item.stage} failed: {item.error}')
+                    raise item.error
+                yield item.value
+        finally:
+            self.close()
+
+    def close(self):
+        """Stops every stage right away, work in progress is abandoned."""
+        self._stopped.set()
+        self._closed.set()
+        for executor in self._executors:
+            executor.shutdown(wait=False, cancel_futures=True)
+        for thread in self._threads:
+            thread.join(timeout=POLL_SECONDS * 10)
+
+    def _start_thread(self, name: str, target: Callable, *args):
+        thread = threading.Thread(
+            target=target, args=args, name=f'pipeline-{name}', daemon=True
+        )
+        thread.start()
+        self._threads.append(thread)
+
+    def _start_stage(self, stage: Stage, input_queue: queue.Queue) -> queue.Queue:
+        if stage.processes:
+            executor = ProcessPoolExecutor(
+                max_workers=stage.workers,
+                mp_context=multiprocessing.get_context('spawn'),
+                initializer=_ignore_sigint,
+            )
+        else:
+            executor = ThreadPoolExecutor(
+                max_workers=stage.workers, thread_name_prefix=f'pipeline-{stage.name}'
+            )
+        self._executors.append(executor)
+
+        # Submitted items in submission order, at most one waiting per worker
+        in_flight = queue.Queue(maxsize=stage.workers)
+        output_queue = queue.Queue(maxsize=stage.queue_size)
+        self._start_thread(
+            f'{stage.name}-dispatch',
+            self._dispatch,
+            stage,
+            executor,
+            input_queue,
+            in_flight,
+        )
+        self._start_thread(
+            f'{stage.name}-collect', self._collect, stage, in_flight, output_queue
+        )
+
+        return output_queue
+
+    def _put(self, target: queue.Queue, item) -> bool:
+        while not self._closed.is_set():
+            try:
+                target.put(item, timeout=POLL_SECONDS)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def _get(self, source: queue.Queue):
+        while not self._closed.is_set():
+            try:
+                return source.get(timeout=POLL_SECONDS)
+            except queue.Empty:
+                continue
+        return _END
+
+    def _feed(self, items: Iterable, target: queue.Queue):
+        try:
+            for value in items:
+                if (
+                    self.stopped
+                    or self._failed.is_set()
+                    or not self._put(target, _Item(value))
+                ):
+                    break
+        except Exception as e:
+            self._put(target, _Failure('source', e))
+        self._put(target, _END)
+
+    def _dispatch(
+        self,
+        stage: Stage,
+        executor: Executor,
+        input_queue: queue.Queue,
+        in_flight: queue.Queue,
+    ):
+        while True:
+            item = self._get(input_queue)
+            if item is _END or isinstance(item, _Failure):
+                if not self._put(in_flight, (item, None)):
+                    return
+                if item is _END:
+                    return
+                continue
+
+            if not item.started and self.stopped:
+                continue
+            if not isinstance(item.value, stage.accepts):
+                future = None
+            else:
+                try:
+                    argument = (
+                        stage.payload(item.value) if stage.payload else item.value
+                    )
+                except Exception as e:
+                    self._failed.set()
+                    if not self._put(in_flight, (_Failure(stage.name, e), None)):
+                        return
+                    continue
+                try:
+                    future = executor.submit(stage.function, argument)
+                except RuntimeError:
+                    # The executor was shut down by close
+                    return
+            if not self._put(in_flight, (item, future)):
+                return
+
+    def _collect(self, stage: Stage, in_flight: queue.Queue, output_queue: queue.Queue):
+        while True:
+            entry = self._get(in_flight)
+            if entry is _END:
+                return
+            item, future = entry
+            if item is _END or isinstance(item, _Failure):
+                self._put(output_queue, item)
+                if item is _END:
+                    return
+                continue
+
+            if future is None:
+                outputs = [item]
+            else:
+                result = self._result(future)
+                if not isinstance(result, _Failure) and stage.merge:
+                    try:
+                        result = stage.merge(item.value, result)
+                    except Exception as e:
+                        result = _Failure('', e)
+                if isinstance(result, _Failure):
+                    result.stage = stage.name
+                    self._failed.set()
+                    self._put(output_queue, result)
+                    continue
+                # Outputs of an expanding stage are new items, not started yet
+                outputs = (
+                    [_Item(value) for value in result]
+                    if stage.expand
+                    else [_Item(result, started=True)]
+                )
+
+            for output in outputs:
+                if not self._put(output_queue, output):
+                    return
+
+    def _result(self, future: Future) -> Any:
+        while True:
+            try:
+                return future.result(timeout=POLL_SECONDS)
+            except TimeoutError:
+                if self._closed.is_set():
+                    return _Failure('', RuntimeError('Pipeline closed.'))
+            except BaseException as e:
+                return _Failure('', e)
@@ -0,0 +1,6 @@
+"""
+Test configuration and fixtures for the Pipeline tests.
+"""
+
+# Isolated network fixtures shared with the Network tests
+from Network.tests.conftest import scratch_network, synthetic_reviews  # noqa: F401
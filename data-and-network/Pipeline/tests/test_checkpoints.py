@@ -0,0 +1,181 @@
+"""
+Test the pipeline crash recovery: progress checkpoints and the graph mutations
+dropped when the pipeline starts again.
+"""
+
+import os
+
+import pytest
+
+import Network.benchmark as benchmark
+import Network.main as network
+import Network.shards as shards
+import Network.wal as wal
+import Pipeline.checkpoints as checkpoints
+import Pipeline.progress as progress
+
+REGION = ('Europe', 'France', 'Paris')
+
+
+@pytest.fixture
+def progress_path(tmp_path):
+    return os.path.join(tmp_path, 'pipeline_progress.sqlite3')
+
+
+def edge_totals(graph):
+    return {
+        tuple(sorted((source, target))): (data['count'], data['weight'])
+        for source, target, data in graph.edges(data=True)
+    }
+
+
+def serial_edge_totals(reviews):
+    """Edges of the attractions added once each to an empty network"""
+    with shards.isolated_network():
+        benchmark.build_with_add_edges_bulk(reviews)
+        return edge_totals(network.AttractionSentimentNet)
+
+
+def attraction_state(progress_store, reviews):
+    attraction = reviews[0]
+    return progress_store.attraction(
+        *REGION, attraction.id, attraction.displayName['text']
+    )
+
+
+def add_attraction(progress_store, reviews):
+    """Adds the edges of an attraction and marks its reviews as done, as the pipeline"""
+    benchmark.build_with_add_edges_bulk([reviews])
+    state = attraction_state(progress_store, reviews)
+    progress_store.complete_reviews(
+        state, [f'{state.path[-1]}-review{i}' for i in range(len(reviews[1]))]
+    )
+    progress_store.set_attraction_done(state)
+
+
+def restart(progress_path):
+    """
+    Loses what was only kept in memory (graph, progress not saved), like a killed
+    process, and starts the pipeline again. Returns the progress store.
+    """
+    network.mutation_log.close()
+    network.mutation_log = wal.MutationLog(network.mutation_log.path)
+    del network.AttractionSentimentNet, network.emotions_dict
+
+    progress_store = progress.ProgressStore(progress_path)
+    checkpoints.resume_pipeline_progress(progress_store)
+    return progress_store
+
+
+@pytest.mark.usefixtures('scratch_network')
+class TestCrashRecovery:
+    """Test every review is counted once whenever the pipeline is killed"""
+
+    def test_crash_before_first_checkpoint(self, synthetic_reviews, progress_path):
+        """Test the first attraction of a fresh run is rolled back and not doubled"""
+        progress_store = progress.ProgressStore(progress_path)
+        checkpoints.resume_pipeline_progress(progress_store)
+        add_attraction(progress_store, synthetic_reviews[0])
+
+        progress_store = restart(progress_path)
+
+        assert network.AttractionSentimentNet.number_of_edges() == 0
+        assert not attraction_state(progress_store, synthetic_reviews[0]).done
+
+        add_attraction(progress_store, synthetic_reviews[0])
+        checkpoints.checkpoint_pipeline(progress_store)
+        assert edge_totals(network.AttractionSentimentNet) == serial_edge_totals(
+            synthetic_reviews[:1]
+        )
+
+    def test_crash_after_edges_before_checkpoint(
+        self, synthetic_reviews, progress_path
+    ):
+        """Test an attraction added after the last checkpoint is processed again once"""
+        progress_store = progress.ProgressStore(progress_path)
+        checkpoints.resume_pipeline_progress(progress_store)
+        add_attraction(progress_store, synthetic_reviews[0])
+        checkpoints.checkpoint_pipeline(progress_store)
+        add_attraction(progress_store, synthetic_reviews[1])
+
+        progress_store = restart(progress_path)
+
+        assert attraction_state(progress_store, synthetic_reviews[0]).done
+        second = attraction_state(progress_store, synthetic_reviews[1])
+        assert not second.done
+        assert not progress_store.completed_reviews(second)
+        assert edge_totals(network.AttractionSentimentNet) == serial_edge_totals(
+            synthetic_reviews[:1]
+        )
+
+        add_attraction(progress_store, synthetic_reviews[1])
+        checkpoints.checkpoint_pipeline(progress_store)
+        progress_store = restart(progress_path)
+        assert edge_totals(network.AttractionSentimentNet) == serial_edge_totals(
+            synthetic_reviews[:2]
+        )
+
+    def test_crash_after_checkpoint(self, synthetic_reviews, progress_path):
+        """Test nothing checkpointed is lost, with or without a graph snapshot"""
+        progress_store = progress.ProgressStore(progress_path)
+        checkpoints.resume_pipeline_progress(progress_store)
+        add_attraction(progress_store, synthetic_reviews[0])
+        checkpoints.checkpoint_pipeline(progress_store)
+        # A snapshot taken by a checkpoint, then mutations only in the log
+        network.save_graph()
+        add_attraction(progress_store, synthetic_reviews[1])
+        add_attraction(progress_store, synthetic_reviews[2])
+        checkpoints.checkpoint_pipeline(progress_store)
+
+        progress_store = restart(progress_path)
+
+        for reviews in synthetic_reviews[:3]:
+            state = attraction_state(progress_store, reviews)
+            assert state.done
+            assert len(progress_store.completed_reviews(state)) == len(reviews[1])
+        assert edge_totals(network.AttractionSentimentNet) == serial_edge_totals(
+            synthetic_reviews[:3]
+        )
+
+    def test_failed_attraction_dropped_on_exit(self, synthetic_reviews, progress_path):
+        """Test the mutations after the last completed attraction are not saved"""
+        progress_store = progress.ProgressStore(progress_path)
+        checkpoints.resume_pipeline_progress(progress_store)
+        add_attraction(progress_store, synthetic_reviews[0])
+        completed_sequence = checkpoints.last_graph_mutation()
+        # An attraction failing halfway: edges added, reviews not marked as done
+        benchmark.build_with_add_edges_bulk(synthetic_reviews[1:2])
+
+        checkpoints.save_pipeline_progress(
+            progress_store, wal_sequence=completed_sequence
+        )
+        progress_store = restart(progress_path)
+
+        assert not attraction_state(progress_store, synthetic_reviews[1]).done
+        assert edge_totals(network.AttractionSentimentNet) == serial_edge_totals(
+            synthetic_reviews[:1]
+        )
+        assert os.path.exists(network.NETWORK_INFO_PATH)
+
+    def test_snapshot_newer_than_progress_keeps_log(
+        self, synthetic_reviews, progress_path
+    ):
+        """Test the log is not cut when the snapshot has mutations the progress lacks"""
+        progress_store = progress.ProgressStore(progress_path)
+        checkpoints.resume_pipeline_progress(progress_store)
+        add_attraction(progress_store, synthetic_reviews[0])
+        checkpoints.checkpoint_pipeline(progress_store)
+        # Another tool saves the graph after more mutations, then logs some more
+        benchmark.build_with_add_edges_bulk(synthetic_reviews[1:2])
+        network.save_graph()
+        benchmark.build_with_add_edges_bulk(synthetic_reviews[2:3])
+        network.mutation_log.sync()
+        logged_mutations = network.mutation_log.count_after(0)
+
+        progress_store = restart(progress_path)
+
+        assert logged_mutations > 0
+        assert network.mutation_log.count_after(0) == logged_mutations
+        assert edge_totals(network.AttractionSentimentNet) == serial_edge_totals(
+            synthetic_reviews[:3]
+        )
@@ -0,0 +1,208 @@
+"""
+Test the SQLite pipeline progress store: the legacy JSON import, incremental saves
+and reopening attractions without reviews.
+"""
+
+import json
+import os
+import sqlite3
+
+import pytest
+
+import Pipeline.progress as progress
+
+LEGACY_PROGRESS = {
+    'continents': [
+        {
+            'name': 'Europe',
+            'progress': '❌',
+            'countries': [
+                {
+                    'name': 'France',
+                    'progress': '✅',
+                    'cities': [
+                        {
+                            'name': 'Paris',
+                            'progress': '✅',
+                            'attractions': [
+                                {
+                                    'id': 'louvre',
+                                    'name': 'Louvre',
+                                    'progress': '✅',
+                                    'reviews': [
+                                        {'id': 'l1', 'progress': '✅'},
+                                        {'id': 'l2', 'progress': '✅'},
+                                    ],
+                                },
+                            ],
+                        },
+                    ],
+                },
+                {
+                    'name': 'Italy',
+                    'progress': '❌',
+                    'cities': [
+                        {
+                            'name': 'Rome',
+                            'progress': '❌',
+                            'attractions': [
+                                {
+                                    'id': 'colosseum',
+                                    'name': 'Colosseum',
+                                    'progress': '❌',
+                                    'reviews': [
+                                        {'id': 'c1', 'progress': '✅'},
+                                        {'id': 'c2', 'progress': '❌'},
+                                        {'id': 'c3', 'progress': '✅'},
+                                    ],
+                                },
+                                {
+                                    'id': 'pantheon',
+                                    'name': 'Pantheon',
+                                    'progress': '✅',
+                                    'reviews': [],
+                                },
+                            ],
+                        },
+                    ],
+                },
+            ],
+        },
+    ]
+}
+
+ROME = ('Europe', 'Italy', 'Rome')
+
+
+@pytest.fixture
+def legacy_store(tmp_path):
+    """Store created from the legacy JSON progress, closed at the end"""
+    legacy_path = os.path.join(tmp_path, 'pipeline_progress.json')
+    with open(legacy_path, 'w', encoding='utf-8') as f:
+        json.dump(LEGACY_PROGRESS, f, ensure_ascii=False)
+    progress_store = progress.ProgressStore(
+        os.path.join(tmp_path, 'pipeline_progress.sqlite3'),
+        legacy_json_path=legacy_path,
+    )
+
+    yield progress_store
+
+    progress_store.close()
+
+
+def reopen(progress_store):
+    progress_store.close()
+    return progress.ProgressStore(
+        progress_store.path, legacy_json_path=progress_store.legacy_json_path
+    )
+
+
+def table_rows(progress_store, table):
+    with sqlite3.connect(progress_store.path) as connection:
+        return connection.execute(f'SELECT COUNT(*) FROM {table}').fetchone()[0]
+
+
+class TestLegacyImport:
+    """Test the automatic import of pipeline_progress.json"""
+
+    def test_regions_attractions_and_reviews(self, legacy_store):
+        """Test done regions, attractions and only the processed reviews"""
+        assert not legacy_store.is_done('Europe')
+        assert legacy_store.is_done('Europe', 'France')
+        assert legacy_store.is_done('Europe', 'France', 'Paris')
+        assert not legacy_store.is_done('Europe', 'Italy')
+        assert not legacy_store.is_done(*ROME)
+        assert not legacy_store.is_done('Asia')
+
+        louvre = legacy_store.attraction('Europe', 'France', 'Paris', 'louvre', '')
+        colosseum = legacy_store.attraction(*ROME, 'colosseum', '')
+        assert louvre.done and louvre.name == 'Louvre'
+        assert not colosseum.done and colosseum.name == 'Colosseum'
+        assert legacy_store.completed_reviews(louvre) == {'l1', 'l2'}
+        # The review still pending in the JSON is processed again
+        assert legacy_store.completed_reviews(colosseum) == {'c1', 'c3'}
+        assert legacy_store.wal_sequence is None
+
+    def test_imported_once(self, legacy_store):
+        """Test the JSON is not imported again over the saved progress"""
+        legacy_store.set_done(*ROME)
+        legacy_store = reopen(legacy_store)
+
+        assert legacy_store.is_done(*ROME)
+        assert table_rows(legacy_store, 'attractions') == 3
+        assert table_rows(legacy_store, 'reviews') == 4
+
+
+class TestProgressStore:
+    """Test saves write what changed and survive reopening the store"""
+
+    def test_save_reopen_roundtrip(self, legacy_store):
+        """Test regions, attractions, reviews and the graph mutation after a reopen"""
+        colosseum = legacy_store.attraction(*ROME, 'colosseum', 'Colosseum')
+        trevi = legacy_store.attraction(*ROME, 'trevi', 'Trevi Fountain')
+        legacy_store.complete_reviews(colosseum, ['c2', 'c3'])
+        legacy_store.complete_reviews(trevi, ['t1'])
+        legacy_store.set_attraction_done(colosseum)
+        legacy_store.set_done(*ROME)
+        legacy_store.save(wal_sequence=42)
+
+        legacy_store = reopen(legacy_store)
+
+        assert legacy_store.is_done(*ROME)
+        assert legacy_store.wal_sequence == 42
+        colosseum = legacy_store.attraction(*ROME, 'colosseum', 'Colosseum')
+        trevi = legacy_store.attraction(*ROME, 'trevi', 'Trevi Fountain')
+        assert colosseum.done
+        assert not trevi.done
+        assert legacy_store.completed_reviews(colosseum) == {'c1', 'c2', 'c3'}
+        assert legacy_store.completed_reviews(trevi) == {'t1'}
+
+    def test_save_writes_only_changes(self, legacy_store):
+        """Test unchanged rows are not written again and unsaved changes are lost"""
+        legacy_store.open()
+        assert not legacy_store.has_changes
+
+        # Already saved values are no changes
+        colosseum = legacy_store.attraction(*ROME, 'colosseum', 'Colosseum')
+        legacy_store.complete_reviews(colosseum, ['c1'])
+        legacy_store.set_done('Europe', 'France')
+        assert not legacy_store.has_changes
+        legacy_store.complete_reviews(colosseum, ['c1', 'c4'])
+        legacy_store.set_done(*ROME)
+        assert legacy_store.has_changes
+
+        statements = []
+        legacy_store.connection.set_trace_callback(statements.append)
+        legacy_store.save()
+        legacy_store.connection.set_trace_callback(None)
+        assert not legacy_store.has_changes
+        inserts = [statement for statement in statements if 'INSERT' in statement]
+        assert inserts == [
+            "INSERT OR REPLACE INTO regions VALUES ('Europe', 'Italy', 'Rome', 1)",
+            f"INSERT OR IGNORE INTO reviews VALUES ({colosseum.key}, 'c4')",
+        ]
+
+        # Changes after the last save are not in the database
+        legacy_store.set_done('Asia')
+        saved_store = progress.ProgressStore(legacy_store.path)
+        assert saved_store.is_done(*ROME)
+        assert not saved_store.is_done('Asia')
+        saved_store.close()
+
+    def test_reopen_empty_attractions(self, legacy_store):
+        """Test attractions without processed reviews are reopened with their regions"""
+        assert legacy_store.reopen_empty_attractions() == 1
+
+        pantheon = legacy_store.attraction(*ROME, 'pantheon', 'Pantheon')
+        assert not pantheon.done
+        assert legacy_store.attraction('Europe', 'France', 'Paris', 'louvre', '').done
+        assert legacy_store.is_done('Europe', 'France')
+
+        legacy_store.set_done(*ROME)
+        legacy_store.set_done('Europe', 'Italy')
+        legacy_store.set_attraction_done(pantheon)
+        legacy_store = reopen(legacy_store)
+        assert legacy_store.reopen_empty_attractions() == 1
+        assert not legacy_store.is_done(*ROME)
+        assert not legacy_store.is_done('Europe', 'Italy')
+        assert not legacy_store.is_done('Europe')
@@ -0,0 +1,178 @@
+"""
+Test the staged pipeline: output order, bounded queues and draining on stop.
+"""
+
+from dataclasses import dataclass
+import functools
+import itertools
+import random
+import threading
+import time
+
+import Pipeline.benchmark as benchmark
+import Pipeline.stages as stages
+
+ATTRACTIONS = 3
+
+
+@dataclass
+class City:
+    number: int
+
+
+@dataclass
+class Attraction:
+    city: int
+    number: int
+    scraped: bool = False
+    analyzed: int = None
+    classified: bool = False
+
+
+@dataclass
+class CityDone:
+    city: int
+
+
+def lookup(city: City):
+    return [Attraction(city.number, i) for i in range(ATTRACTIONS)] + [
+        CityDone(city.number)
+    ]
+
+
+def scrape(started: list, attraction: Attraction) -> Attraction:
+    started.append((attraction.city, attraction.number))
+    time.sleep(0.02)
+    attraction.scraped = True
+    return attraction
+
+
+def attraction_key(attraction: Attraction) -> int:
+    return attraction.city * ATTRACTIONS + attraction.number
+
+
+def add_analysis(attraction: Attraction, analyzed: int) -> Attraction:
+    attraction.analyzed = analyzed
+    return attraction
+
+
+def classify(attraction: Attraction) -> Attraction:
+    attraction.classified = True
+    return attraction
+
+
+def pipeline_stages(started: list):
+    """Stages shaped like the pipeline ones, the analysis in a worker process"""
+    return [
+        stages.Stage('lookup', lookup, workers=2, expand=True, accepts=City),
+        stages.Stage(
+            'scrape',
+            functools.partial(scrape, started),
+            workers=2,
+            queue_size=2,
+            accepts=Attraction,
+        ),
+        stages.Stage(
+            'analysis',
+            # Only the key is sent to the process, the result is merged back
+            functools.partial(benchmark.busy_stage, 0.005),
+            processes=True,
+            queue_size=2,
+            accepts=Attraction,
+            payload=attraction_key,
+            merge=add_analysis,
+        ),
+        stages.Stage('classify', classify, workers=2, accepts=Attraction),
+    ]
+
+
+def serial_outputs(cities: int):
+    outputs = []
+    for city in range(cities):
+        for item in lookup(City(city)):
+            if isinstance(item, Attraction):
+                item = classify(add_analysis(scrape([], item), attraction_key(item)))
+            outputs.append(item)
+    return outputs
+
+
+def is_subsequence(items, sequence) -> bool:
+    remaining = iter(sequence)
+    return all(item in remaining for item in items)
+
+
+class TestStagedPipeline:
+    """Test the pipeline gives the serial results and drains when stopped"""
+
+    def test_order_matches_serial(self):
+        """Test outputs come in item order though workers finish out of order"""
+        delays = random.Random(0)
+        item_delays = [delays.uniform(0, 0.02) for _ in range(40)]
+
+        def shuffle(item: int) -> int:
+            time.sleep(item_delays[item])
+            return item
+
+        pipeline = stages.StagedPipeline(
+            [
+                stages.Stage('shuffle', shuffle, workers=4),
+                stages.Stage('double', lambda item: 2 * item, workers=3),
+            ]
+        )
+
+        assert list(pipeline.run(range(40))) == [2 * item for item in range(40)]
+
+    def test_process_stage_matches_serial(self):
+        """Test expanded, skipped and process stage items keep the serial order"""
+        pipeline = stages.StagedPipeline(pipeline_stages([]))
+
+        assert list(pipeline.run(City(city) for city in range(4))) == serial_outputs(4)
+
+    def test_bounded_queues(self):
+        """Test a consumer that does not take the results blocks the source"""
+        taken = itertools.count()
+        items = (next(taken) for _ in range(1000))
+        stage = stages.Stage('identity', lambda item: item, workers=1, queue_size=2)
+        pipeline = stages.StagedPipeline([stage])
+
+        results = pipeline.run(items)
+        assert next(results) == 0
+        time.sleep(0.3)
+        pipeline.close()
+
+        # Held by the consumer, the output and source queues, the workers and the
+        # threads between them
+        taken_items = next(taken)
+        assert taken_items <= 1 + 2 * stage.queue_size + 2 * stage.workers + 3
+
+    def test_stop_drains(self):
+        """Test unstarted items are dropped and started ones go through every stage"""
+        started = []
+        stop = threading.Event()
+        pipeline = stages.StagedPipeline(
+            pipeline_stages(started), should_stop=stop.is_set
+        )
+
+        outputs = []
+        for item in pipeline.run(City(city) for city in range(20)):
+            outputs.append(item)
+            if len(outputs) == 2:
+                stop.set()
+
+        serial = serial_outputs(20)
+        serial_attractions = [item for item in serial if isinstance(item, Attraction)]
+        attractions = [item for item in outputs if isinstance(item, Attraction)]
+        done_cities = [item.city for item in outputs if isinstance(item, CityDone)]
+        # Unstarted attractions and cities were dropped, the rest is in serial order
+        assert len(attractions) < len(serial_attractions)
+        assert len(done_cities) < 20
+        assert is_subsequence(outputs, serial)
+        assert attractions == serial_attractions[: len(attractions)]
+        # Every attraction the scrape stage started finished the other stages
+        assert sorted(started) == sorted(
+            (attraction.city, attraction.number) for attraction in attractions
+        )
+        assert all(attraction.classified for attraction in attractions)
+        # Cities are only done after all of their attractions
+        for city in done_cities:
+            assert sum(item.city == city for item in attractions) == ATTRACTIONS
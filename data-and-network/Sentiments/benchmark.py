@@ -0,0 +1,327 @@
+import argparse
+from collections import Counter
+import json
+import os
+import tempfile
+import time
+from typing import List
+
+from vaderSentiment.vaderSentiment import SentimentIntensityAnalyzer
+
+from Sentiments.cache import AdjectiveEmotionCache
+from Sentiments.client import EmotionClassificationClient
+from Sentiments.fake_model import FakeGenerativeModel
+import Sentiments.main as sentiments
+from Sentiments.memo import AnalysisMemo
+
+# Fixed review sample so results are comparable between runs and machines
+SAMPLE_REVIEWS = [
+    'Great place! The view from the top is breathtaking and the staff was friendly.',
+    'Highly recommended. We spent the whole afternoon walking around the beautiful gardens.',
+    'The museum is small but the collection is impressive. Our second visit was even better.',
+    'Too crowded on weekends and the queue was endless. Tickets are expensive for what you get.',
+    'A quiet, peaceful spot in the middle of the busy city. Perfect for a relaxing break.',
+    'Dirty bathrooms and rude employees. I would not come back.',
+    'The guided tour was informative and the guide was funny. Kids loved the interactive rooms.',
+    'It was the first time we came here and it was amazing. The 3rd floor has the best exhibits.',
+    'Nice park with lots of shade. The lake is calm and the paths are well maintained.',
+    'Overrated. The main hall was closed for renovation and nobody told us at the entrance.',
+    'Historic church with stunning stained glass windows. Entrance is free but donations are welcome.',
+    'The aquarium is huge, clean and well organized. The shark tunnel is unforgettable.',
+    'Parking was a nightmare and the food court was overpriced. The show itself was good though.',
+    'Wonderful atmosphere at night, with live music and colorful lights everywhere.',
+    'Boring exhibition with outdated panels. Half of the screens were broken.',
+    'Lovely beach with clear water and soft sand. It gets busy after noon.',
+    'The castle is old and mysterious, and the views over the valley are spectacular.',
+    'Our tour guide was late and disorganized. We missed the last boat because of it.',
+    'Amazing experience! The roller coasters are thrilling and the lines were short.',
+    'The old market is noisy and chaotic but full of delicious street food.',
+    'Clean, safe and accessible. Great option for families with small children.',
+    'The temple is sacred and serene. Please dress modestly and remove your shoes.',
+    'It was okay. Nothing special, but a decent way to spend an hour.',
+    'The concert hall has fantastic acoustics and comfortable seats. A magical evening.',
+]
+
+
+def load_reviews(reviews_path: str = None) -> List[str]:
+    if not reviews_path:
+        return SAMPLE_REVIEWS
+
+    with open(reviews_path, 'r', encoding='utf-8') as f:
+        docs = json.load(f)
+
+    return [doc['description'].get('en', '') for doc in docs if doc.get('description')]
+
+
+def analyze_docs(docs):
+    sentence_bounds = set()
+    adjectives = Counter()
+    for doc_index, doc in enumerate(docs):
+        for sent in doc.sents:
+            sentence_bounds.add((doc_index, sent.start_char, sent.end_char))
+            for adjective in sentiments.extract_span_adjectives(sent):
+                adjectives[(doc_index, adjective.lower())] += 1
+
+    return sentence_bounds, adjectives
+
+
+def f1_score(matches: int, predicted: int, expected: int) -> float:
+    if predicted == 0 and expected == 0:
+        return 1.0
+    if predicted == 0 or expected == 0:
+        return 0.0
+
+    precision = matches / predicted
+    recall = matches / expected
+
+    return 2 * precision * recall / (precision + recall) if matches else 0.0
+
+
+def benchmark_profiles(reviews: List[str], repeat: int, batch_size: int):
+    """
+    Compares every spaCy pipeline profile with the 'full' profile.
+    Accuracy is the F1 of sentence boundaries and extracted adjectives against
+    'full', throughput is reviews/second through `nlp.pipe` in a single process.
+    """
+    texts = reviews * repeat
+    reference = None
+    results = []
+
+    for profile in sentiments.SPACY_PIPELINE_PROFILES:
+        profile_nlp = sentiments.load_nlp(profile)
+        # Warm up so model loading is not measured
+        list(profile_nlp.pipe(reviews[:4]))
+
+        start_time = time.perf_counter()
+        docs = list(profile_nlp.pipe(texts, batch_size=batch_size))
+        elapsed = time.perf_counter() - start_time
+
+        sentence_bounds, adjectives = analyze_docs(docs[: len(reviews)])
+        if reference is None:
+            reference = (sentence_bounds, adjectives)
+
+        reference_bounds, reference_adjectives = reference
+        results.append(
+            {
+                'profile': profile,
+                'components': ','.join(profile_nlp.pipe_names),
+                'reviews_per_second': len(texts) / elapsed,
+                'sentence_f1': f1_score(
+                    len(sentence_bounds & reference_bounds),
+                    len(sentence_bounds),
+                    len(reference_bounds),
+                ),
+                'adjective_f1': f1_score(
+                    sum((adjectives & reference_adjectives).values()),
+                    sum(adjectives.values()),
+                    sum(reference_adjectives.values()),
+                ),
+            }
+        )
+
+    print(
+        f'{"profile":<16}{"reviews/s":>12}{"sentence F1":>14}{"adjective F1":>15}  components'
+    )
+    for result in results:
+        print(
+            f'{result["profile"]:<16}{result["reviews_per_second"]:>12.1f}'
+            f'{result["sentence_f1"]:>14.3f}{result["adjective_f1"]:>15.3f}'
+            f'  {result["components"]}'
+        )
+
+    return results
+
+
+def benchmark_vader(reviews: List[str], repeat: int):
+    """
+    Sentences/second of VADER scoring when building an analyzer per sentence (how
+    sentences used to be scored), with the shared analyzer and with the memoized
+    `score_sentences` batch API.
+    """
+    sentences = [
+        sent.text for doc in sentiments.nlp.pipe(reviews) for sent in doc.sents
+    ]
+    texts = sentences * repeat
+
+    def analyzer_per_sentence():
+        for sentence in texts:
+            SentimentIntensityAnalyzer().polarity_scores(sentence)
+
+    def shared_analyzer():
+        for sentence in texts:
+            sentiments.sentiment_analyzer.polarity_scores(sentence)
+
+    def memoized_batch():
+        sentiments._cached_polarity_scores.cache_clear()
+        sentiments.score_sentences(texts)
+
+    print(f'{"strategy":<24}{"sentences/s":>14}')
+    results = {}
+    for name, run in [
+        ('analyzer per sentence', analyzer_per_sentence),
+        ('shared analyzer', shared_analyzer),
+        ('score_sentences', memoized_batch),
+    ]:
+        start_time = time.perf_counter()
+        run()
+        results[name] = len(texts) / (time.perf_counter() - start_time)
+        print(f'{name:<24}{results[name]:>14.1f}')
+
+    return results
+
+
+def benchmark_memo(reviews: List[str], repeat: int, batch_size: int):
+    """
+    Reviews/second of `analyze_reviews` without the memo and with an empty memo, on
+    the review sample analyzed `repeat` times (as in re-scrapes and repeated texts).
+    """
+    texts = reviews * repeat
+    # Warm up so model loading is not measured
+    sentiments.analyze_reviews(reviews[:4], memo=None)
+
+    print(f'{"strategy":<16}{"reviews/s":>12}{"hit rate":>12}')
+    results = {}
+    for name, memo in [
+        ('no memo', None),
+        ('memo', AnalysisMemo(sentiments.SENTENCE_MEMO_SIZE)),
+    ]:
+        start_time = time.perf_counter()
+        for _ in range(repeat):
+            sentiments.analyze_reviews(reviews, batch_size=batch_size, memo=memo)
+        results[name] = len(texts) / (time.perf_counter() - start_time)
+        hit_rate = memo.hit_rate if memo is not None else 0.0
+        print(f'{name:<16}{results[name]:>12.1f}{hit_rate:>12.1%}')
+
+    return results
+
+
+def benchmark_fake_gemini(
+    reviews: List[str], repeat: int, latency: float, throttle_rate: float
+):
+    """
+    Runs the Sentiments stage of the pipeline (analysis, then classification of the
+    adjectives of each batch of reviews through EmotionClassificationClient) against
+    FakeGenerativeModel, with an empty temporary adjective cache. The local classifier
+    is seeded from that cache too, so it only learns the fake labels of the run.
+    Reports throughput, model calls, throttled calls and how many adjective lookups
+    the cache answered.
+    """
+    # Warm up so model and Vertex AI SDK loading are not measured
+    sentiments.analyze_reviews(reviews[:4], memo=None)
+    sentiments.request_adjective_batch_emotions(
+        ['warm'], model=FakeGenerativeModel(latency=0)
+    )
+
+    model = FakeGenerativeModel(latency=latency, throttle_rate=throttle_rate)
+    original_cache = sentiments.adjective_to_sentiment_map
+    original_local_cache = sentiments.local_adjective_emotions
+
+    with tempfile.TemporaryDirectory() as cache_dir:
+        cache_path = os.path.join(cache_dir, 'cached_results.sqlite3')
+        sentiments.adjective_to_sentiment_map = AdjectiveEmotionCache(cache_path)
+        sentiments.local_adjective_emotions = AdjectiveEmotionCache(
+            cache_path, table='local_adjective_emotions'
+        )
+        sentiments.reset_knn_classifier()
+        client = EmotionClassificationClient(model=model)
+        adjective_lookups = 0
+        cached_lookups = 0
+        try:
+            start_time = time.perf_counter()
+            for _ in range(repeat):
+                adjectives = [
+                    adjective
+                    for review_analysis in sentiments.analyze_reviews(reviews)
+                    for sentence in review_analysis.sentences
+                    for adjective in sentence.adjectives
+                ]
+                adjective_lookups += len(adjectives)
+                cached_lookups += sum(
+                    adjective in sentiments.adjective_to_sentiment_map
+                    for adjective in adjectives
+                )
+
+                futures = client.prefetch(adjectives)
+                for future in futures.values():
+                    future.result()
+            elapsed = time.perf_counter() - start_time
+        finally:
+            client.shutdown()
+            sentiments.adjective_to_sentiment_map.close()
+            sentiments.local_adjective_emotions.close()
+            sentiments.adjective_to_sentiment_map = original_cache
+            sentiments.local_adjective_emotions = original_local_cache
+            sentiments.reset_knn_classifier()
+
+    results = {
+        'reviews_per_second': len(reviews) * repeat / elapsed,
+        'model_calls': model.calls,
+        'throttled_calls': model.throttled,
+        'cache_hit_rate': cached_lookups / adjective_lookups
+        if adjective_lookups
+        else 0,
+    }
+    for name, value in results.items():
+        print(
+            f'{name:<20}{value:>12.3f}'
+            if isinstance(value, float)
+            else f'{name:<20}{value:>12}'
+        )
+
+    return results
+
+
+def print_knn_agreement_report(holdout_fraction: float):
+    report = sentiments.knn_agreement_report(holdout_fraction=holdout_fraction)
+
+    print(f'{"threshold":>10}{"coverage":>12}{"agreement":>12}')
+    for row in report:
+        print(
+            f'{row["threshold"]:>10.2f}{row["coverage"]:>12.3f}{row["agreement"]:>12.3f}'
+        )
+
+    return report
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Sentiments benchmarks')
+    parser.add_argument(
+        'benchmark', choices=['profiles', 'vader', 'knn', 'memo', 'gemini']
+    )
+    parser.add_argument(
+        '--reviews-path',
+        help='google_reviews.json to use instead of the built-in review sample',
+    )
+    parser.add_argument('--repeat', type=int, default=20)
+    parser.add_argument(
+        '--holdout-fraction',
+        type=float,
+        default=0.2,
+        help='cached labels held out to evaluate the local classifier (knn)',
+    )
+    parser.add_argument('--batch-size', type=int, default=sentiments.NLP_BATCH_SIZE)
+    parser.add_argument(
+        '--latency',
+        type=float,
+        default=0.2,
+        help='seconds per fake Gemini request (gemini)',
+    )
+    parser.add_argument(
+        '--throttle-rate',
+        type=float,
+        default=0.1,
+        help='fraction of fake Gemini requests failing with ResourceExhausted (gemini)',
+    )
+    args = parser.parse_args()
+
+    reviews = load_reviews(args.reviews_path)
+    if args.benchmark == 'profiles':
+        benchmark_profiles(reviews, args.repeat, args.batch_size)
+    elif args.benchmark == 'vader':
+        benchmark_vader(reviews, args.repeat)
+    elif args.benchmark == 'memo':
+        benchmark_memo(reviews, args.repeat, args.batch_size)
+    elif args.benchmark == 'gemini':
+        benchmark_fake_gemini(reviews, args.repeat, args.latency, args.throttle_rate)
+    elif args.benchmark == 'knn':
+        print_knn_agreement_report(args.holdout_fraction)
@@ -0,0 +1,182 @@
+from collections.abc import MutableMapping
+import json
+import logging
+import os
+import sqlite3
+import threading
+from typing import Dict, Iterator, Mapping
+
+logger = logging.getLogger(os.getenv('DATA_NETWORK_LOGGER', 'data-and-network'))
+
+
+class AdjectiveEmotionCache(MutableMapping):
+    """
+    Adjective -> emotion map persisted in SQLite (WAL journal). Every write is
+    committed right away, so answers survive crashes without rewriting the whole
+    cache. The database is opened on first use and read through an in-memory dict,
+    entries are only loaded when looked up.
+    A legacy JSON cache is imported the first time the database is created.
+    `table` lets another map (e.g. the local classifier predictions) share the
+    database file.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        legacy_json_path: str = None,
+        table: str = 'adjective_emotions',
+    ):
+        self.path = path
+        self.legacy_json_path = legacy_json_path
+        self.table = table
+        self._connection: sqlite3.Connection = None
+        self._memory: Dict[str, str] = {}
+        self._lock = threading.RLock()
+
+    @property
+    def connection(self) -> sqlite3.Connection:
+        with self._lock:
+            if self._connection is None:
+                self._connection = self._connect()
+            return self._connection
+
+    def _connect(self) -> sqlite3.Connection:
+        connection = sqlite3.connect(
+            self.path, check_same_thread=False, isolation_level=None
+        )
+        connection.execute('PRAGMA journal_mode=WAL')
+        connection.execute('PRAGMA synchronous=NORMAL')
+        connection.execute(
+            f'CREATE TABLE IF NOT EXISTS {self.table} '
+            '(adjective TEXT PRIMARY KEY, emotion TEXT NOT NULL) WITHOUT ROWID'
+        )
+
+        is_empty = (
+            connection.execute(f'SELECT 1 FROM {self.table} LIMIT 1').fetchone() is None
+        )
+        if (
+            is_empty
+            and self.legacy_json_path
+            and os.path.exists(self.legacy_json_path)
+            and os.path.getsize(self.legacy_json_path) > 0
+        ):
+            with open(self.legacy_json_path, 'r', encoding='utf-8') as f:
+                legacy_cache = json.load(f)
+            self._write_many(connection, legacy_cache)
+            logger.info(
+                f'Imported {len(legacy_cache)} cached adjective emotions from {self.legacy_json_path}.'
+            )
+
+        return connection
+
+    def _write_many(
+        self,
+        connection: sqlite3.Connection,
+        entries: Mapping[str, str],
+        replace_all: bool = False,
+    ):
+        with connection:
+            connection.execute('BEGIN')
+            if replace_all:
+                connection.execute(f'DELETE FROM {self.table}')
+            connection.executemany(
+                f'INSERT OR REPLACE INTO {self.table} VALUES (?, ?)',
+                entries.items(),
+            )
+
+    def __getitem__(self, adjective: str) -> str:
+        emotion = self._memory.get(adjective)
+        if emotion is not None:
+            return emotion
+
+        with self._lock:
+            row = self.connection.execute(
+                f'SELECT emotion FROM {self.table} WHERE adjective = ?',
+                (adjective,),
+            ).fetchone()
+        if row is None:
+            raise KeyError(adjective)
+
+        self._memory[adjective] = row[0]
+        return row[0]
+
+    def __setitem__(self, adjective: str, emotion: str):
+        with self._lock:
+            self.connection.execute(
+                f'INSERT OR REPLACE INTO {self.table} VALUES (?, ?)',
+                (adjective, emotion),
+            )
+            self._memory[adjective] = emotion
+
+    def __delitem__(self, adjective: str):
+        with self._lock:
+            cursor = self.connection.execute(
+                f'DELETE FROM {self.table} WHERE adjective = ?', (adjective,)
+            )
+            self._memory.pop(adjective, None)
+        if cursor.rowcount == 0:
+            raise KeyError(adjective)
+
+    def __contains__(self, adjective) -> bool:
+        try:
+            self[adjective]
+        except KeyError:
+            return False
+        return True
+
+    def __iter__(self) -> Iterator[str]:
+        with self._lock:
+            rows = self.connection.execute(
+                f'SELECT adjective FROM {self.table}'
+            ).fetchall()
+
+        return (row[0] for row in rows)
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self.connection.execute(
+                f'SELECT COUNT(*) FROM {self.table}'
+            ).fetchone()[0]
+
+    def update(self, entries: Mapping[str, str] = (), **kwargs):
+        """Stores every entry in a single transaction."""
+        entries = {**dict(entries), **kwargs}
+        with self._lock:
+            self._write_many(self.connection, entries)
+            self._memory.update(entries)
+
+    def replace_all(self, entries: Mapping[str, str]):
+        """Replaces the whole cache with `entries` in a single transaction."""
+        with self._lock:
+            self._write_many(self.connection, entries, replace_all=True)
+            self._memory = dict(entries)
+
+    def clear(self):
+        with self._lock:
+            self.connection.execute(f'DELETE FROM {self.table}')
+            self._memory.clear()
+
+    def to_dict(self) -> Dict[str, str]:
+        with self._lock:
+            return dict(
+                self.connection.execute(
+                    f'SELECT adjective, emotion FROM {self.table}'
+                ).fetchall()
+            )
+
+    def export_json(self, path: str):
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(self.to_dict(), f, ensure_ascii=False, indent=2)
+
+    def checkpoint(self):
+        """Moves the WAL contents into the database file."""
+        with self._lock:
+            if self._connection is not None:
+                self._connection.execute('PRAGMA wal_checkpoint(TRUNCATE)')
+
+    def close(self):
+        with self._lock:
+            if self._connection is not None:
+                self._connection.close()
+                self._connection = None
+            self._memory.clear()
@@ -0,0 +1,170 @@
+from concurrent.futures import Future, ThreadPoolExecutor
+import logging
+import os
+import threading
+import time
+from typing import Callable, Dict, Iterable, List
+
+import Sentiments.main as sentiments
+
+logger = logging.getLogger(os.getenv('DATA_NETWORK_LOGGER', 'data-and-network'))
+
+# Defaults tuned to the Vertex AI quota of the project (requests per minute)
+GEMINI_MAX_CONCURRENCY = int(os.getenv('GEMINI_MAX_CONCURRENCY', 4))
+GEMINI_REQUESTS_PER_MINUTE = float(os.getenv('GEMINI_REQUESTS_PER_MINUTE', 60))
+GEMINI_BURST = int(os.getenv('GEMINI_BURST', 5))
+
+
+class TokenBucket:
+    """
+    Thread-safe token bucket. `acquire` blocks until a token is available, tokens are
+    refilled at `rate` per second up to `capacity`. `clock` and `sleep` can be
+    replaced by a fake clock in tests.
+    """
+
+    def __init__(
+        self,
+        rate: float,
+        capacity: int,
+        clock: Callable[[], float] = time.monotonic,
+        sleep: Callable[[float], None] = time.sleep,
+    ):
+        self.rate = rate
+        self.capacity = capacity
+        self.clock = clock
+        self.sleep = sleep
+        self._tokens = float(capacity)
+        self._last_refill = clock()
+        self._lock = threading.Lock()
+
+    def acquire(self, tokens: float = 1.0):
+        while True:
+            with self._lock:
+                now = self.clock()
+                self._tokens = min(
+                    self.capacity, self._tokens + (now - self._last_refill) * self.rate
+                )
+                self._last_refill = now
+
+                if self._tokens >= tokens:
+                    self._tokens -= tokens
+                    return
+                wait_time = (tokens - self._tokens) / self.rate
+
+            self.sleep(wait_time)
+
+
+class RateLimitedModel:
+    """
+    Wraps a model (the Gemini model when None) so every `generate_content` call,
+    retries included, takes a token.
+    """
+
+    def __init__(self, model, rate_limiter: TokenBucket):
+        self.model = model
+        self.rate_limiter = rate_limiter
+
+    def generate_content(self, *args, **kwargs):
+        model = self.model or sentiments.get_ai_model()
+        self.rate_limiter.acquire()
+        return model.generate_content(*args, **kwargs)
+
+
+class EmotionClassificationClient:
+    """
+    Classifies adjectives on a thread pool so cache misses do not block the pipeline.
+    Requests share a token bucket, adjectives already being classified are coalesced
+    into the same future and uncached adjectives are sent in batches (see
+    `Sentiments.main.classify_adjectives_to_emotions_gemini`).
+    `model` defaults to the Gemini model, a local stand-in can be passed for tests.
+    """
+
+    def __init__(
+        self,
+        model=None,
+        max_concurrency: int = GEMINI_MAX_CONCURRENCY,
+        requests_per_minute: float = GEMINI_REQUESTS_PER_MINUTE,
+        burst: int = GEMINI_BURST,
+        batch_size: int = sentiments.ADJECTIVE_BATCH_SIZE,
+    ):
+        self.rate_limiter = TokenBucket(requests_per_minute / 60, burst)
+        self.model = RateLimitedModel(model, self.rate_limiter)
+        self.batch_size = batch_size
+        self._executor = ThreadPoolExecutor(
+            max_workers=max_concurrency, thread_name_prefix='gemini'
+        )
+        self._in_flight: Dict[str, Future] = {}
+        self._lock = threading.Lock()
+
+    def prefetch(self, adjectives: Iterable[str]) -> Dict[str, Future]:
+        """
+        Starts classifying every uncached adjective and returns a future of the emotion
+        of each sanitized adjective. Cached adjectives get already completed futures.
+        """
+        futures: Dict[str, Future] = {}
+        new_adjectives: List[str] = []
+
+        with self._lock:
+            for adjective in adjectives:
+                sanitized_adjective = sentiments.normalize_adjective(adjective)
+                if sanitized_adjective in futures:
+                    continue
+
+                cached_emotion = sentiments.adjective_to_sentiment_map.get(
+                    sanitized_adjective
+                )
+                if cached_emotion is not None:
+                    future = Future()
+                    future.set_result(cached_emotion)
+                elif sanitized_adjective in self._in_flight:
+                    future = self._in_flight[sanitized_adjective]
+                else:
+                    future = Future()
+                    self._in_flight[sanitized_adjective] = future
+                    new_adjectives.append(sanitized_adjective)
+
+                futures[sanitized_adjective] = future
+
+        for i in range(0, len(new_adjectives), self.batch_size):
+            batch = new_adjectives[i : i + self.batch_size]
+            self._executor.submit(self._classify_batch, batch)
+
+        return futures
+
+    def classify(self, adjective: str) -> str:
+        """Blocking classification of a single adjective (coalesced with prefetches)."""
+        return next(iter(self.prefetch([adjective]).values())).result()
+
+    def _classify_batch(self, batch: List[str]):
+        try:
+            emotions = sentiments.classify_adjectives_to_emotions_gemini(
+                batch, batch_size=self.batch_size, model=self.model
+            )
+        except Exception as e:
+            logger.error(f'Error classifying adjectives {batch}: {e}')
+            self._resolve(batch, error=e)
+            return
+
+        self._resolve(batch, emotions=emotions)
+
+    def _resolve(self, batch: List[str], emotions: Dict[str, str] = None, error=None):
+        with self._lock:
+            futures = [self._in_flight.pop(adjective, None) for adjective in batch]
+
+        for adjective, future in zip(batch, futures):
+            if future is None:
+                continue
+            if error is not None:
+                future.set_exception(error)
+            else:
+                future.set_result(emotions.get(adjective))
+
+    def shutdown(self, wait: bool = True):
+        self._executor.shutdown(wait=wait, cancel_futures=not wait)
+
+        # Batches cancelled before starting would leave their futures pending forever
+        with self._lock:
+            cancelled = list(self._in_flight.values())
+            self._in_flight.clear()
+        for future in cancelled:
+            future.cancel()
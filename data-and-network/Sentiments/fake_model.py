@@ -0,0 +1,86 @@
+import hashlib
+import json
+import os
+import random
+import re
+import threading
+import time
+
+import Sentiments.main as sentiments
+
+# Local stand-in for the Gemini model, used instead of Vertex AI when GEMINI_FAKE_MODEL
+# is set (see Sentiments.main.get_ai_model)
+GEMINI_FAKE_LATENCY = float(os.getenv('GEMINI_FAKE_LATENCY', 0.2))
+GEMINI_FAKE_THROTTLE_RATE = float(os.getenv('GEMINI_FAKE_THROTTLE_RATE', 0.0))
+GEMINI_FAKE_SEED = int(os.getenv('GEMINI_FAKE_SEED', 0))
+
+BATCH_WORDS_PATTERN = re.compile(r'Words: (\[.*?\])\n')
+SINGLE_WORD_PATTERN = re.compile(r'adjective, "(.*?)", into one of the emotions')
+
+
+def fake_emotion(adjective: str) -> str:
+    """Deterministic emotion of an adjective, the same across runs and machines."""
+    digest = hashlib.blake2b(adjective.encode('utf-8'), digest_size=8).digest()
+    return sentiments.VALID_EMOTIONS[
+        int.from_bytes(digest, 'big') % len(sentiments.VALID_EMOTIONS)
+    ]
+
+
+class FakeResponse:
+    def __init__(self, text: str):
+        self.text = text
+
+
+class FakeGenerativeModel:
+    """
+    Answers the prompts of Sentiments.main like Gemini would: a JSON list for batch
+    prompts and a bare emotion name otherwise, with labels from `fake_emotion`.
+    Every call waits `latency` seconds and raises ResourceExhausted with probability
+    `throttle_rate` (drawn from a generator seeded with `seed`), so throughput, retries
+    and caching can be measured offline.
+    """
+
+    def __init__(
+        self,
+        latency: float = GEMINI_FAKE_LATENCY,
+        throttle_rate: float = GEMINI_FAKE_THROTTLE_RATE,
+        seed: int = GEMINI_FAKE_SEED,
+    ):
+        self.latency = latency
+        self.throttle_rate = throttle_rate
+        self.calls = 0
+        self.throttled = 0
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def generate_content(
+        self,
+        prompt: str,
+        generation_config=None,  # noqa: ARG002
+    ) -> FakeResponse:
+        from google.api_core import exceptions as gax_exceptions
+
+        with self._lock:
+            self.calls += 1
+            throttled = self._random.random() < self.throttle_rate
+            if throttled:
+                self.throttled += 1
+
+        time.sleep(self.latency)
+        if throttled:
+            raise gax_exceptions.ResourceExhausted('Fake Gemini quota exceeded')
+
+        batch_match = BATCH_WORDS_PATTERN.search(prompt)
+        if batch_match:
+            return FakeResponse(
+                json.dumps(
+                    [
+                        {'adjective': adjective, 'emotion': fake_emotion(adjective)}
+                        for adjective in json.loads(batch_match.group(1))
+                    ],
+                    ensure_ascii=False,
+                )
+            )
+
+        single_match = SINGLE_WORD_PATTERN.search(prompt)
+        return FakeResponse(fake_emotion(single_match.group(1) if single_match else ''))
@@ -1,102 +1,407 @@
+from collections import Counter
+from dataclasses import asdict, dataclass, field
+from functools import lru_cache
 import json
 import logging
+import math
 import os
 import random
+import string
+import threading
 import time
+from typing import Dict, Iterable, List, Mapping, Tuple
 
-from google.api_core import exceptions as gax_exceptions
-import grpc
-import spacy
-from spacy.util import is_package
-from vaderSentiment.vaderSentiment import SentimentIntensityAnalyzer
-import vertexai
-from vertexai.generative_models import GenerativeModel
+from Sentiments.cache import AdjectiveEmotionCache
+from Sentiments.memo import AnalysisMemo, normalize_text
 
 logger = logging.getLogger(os.getenv('DATA_NETWORK_LOGGER', 'data-and-network'))
 
-VERTEX_AI_PROJECT_ID = os.getenv('VERTEX_AI_PROJECT_ID')
-if not VERTEX_AI_PROJECT_ID:
-    raise ValueError('VERTEX_AI_PROJECT_ID not found in environment variables')
+# Vertex AI, spaCy and VADER are only imported and initialized on first use (see the
+# get_* functions), so importing this module is cheap and needs no credentials
+_ai_model = None
+_nlp = None
+_sentiment_analyzer = None
+_word_vectors = None
+_knn_classifier = None
+_init_lock = threading.Lock()
+_knn_lock = threading.Lock()
+
+
+def get_ai_model():
+    global _ai_model
+
+    with _init_lock:
+        if _ai_model is None and os.getenv('GEMINI_FAKE_MODEL'):
+            from Sentiments.fake_model import FakeGenerativeModel
+
+            logger.warning('GEMINI_FAKE_MODEL is set, using a local fake Gemini model.')
+            _ai_model = FakeGenerativeModel()
+        elif _ai_model is None:
+            import vertexai
+            from vertexai.generative_models import GenerativeModel
+
+            vertex_ai_project_id = os.getenv('VERTEX_AI_PROJECT_ID')
+            if not vertex_ai_project_id:
+                raise ValueError(
+                    'VERTEX_AI_PROJECT_ID not found in environment variables'
+                )
+
+            vertexai.init(project=vertex_ai_project_id, location='us-central1')
+            _ai_model = GenerativeModel('gemini-2.0-flash')
+
+    return _ai_model
 
-vertexai.init(project=VERTEX_AI_PROJECT_ID, location='us-central1')
-ai_model = GenerativeModel('gemini-2.0-flash')
 
 MODULE_DIR = os.path.dirname(os.path.realpath(__file__))
 
+# Legacy JSON cache, imported into the SQLite cache the first time it is created
 CACHED_GEMINI_RESULTS_PATH = os.path.join(MODULE_DIR, 'cached_results.json')
+CACHED_GEMINI_RESULTS_DB_PATH = os.path.join(MODULE_DIR, 'cached_results.sqlite3')
 
-new_responses_count = 0
-
-adjective_to_sentiment_map = {}
-if (
-    os.path.exists(CACHED_GEMINI_RESULTS_PATH)
-    and os.path.getsize(CACHED_GEMINI_RESULTS_PATH) > 0
-):
-    with open(CACHED_GEMINI_RESULTS_PATH, 'r', encoding='utf-8') as f:
-        adjective_to_sentiment_map = json.load(f)
+adjective_to_sentiment_map = AdjectiveEmotionCache(
+    CACHED_GEMINI_RESULTS_DB_PATH, legacy_json_path=CACHED_GEMINI_RESULTS_PATH
+)
+# Confident predictions of the local classifier (see classify_adjectives_locally),
+# kept apart so they are never used to train it
+local_adjective_emotions = AdjectiveEmotionCache(
+    CACHED_GEMINI_RESULTS_DB_PATH, table='local_adjective_emotions'
+)
 
 spacy_model = 'en_core_web_sm'
-if not is_package(spacy_model):
-    spacy.cli.download(spacy_model)
-nlp = spacy.load(spacy_model)
+
+# Only sentence boundaries, POS tags, lemmas, `like_num` and ORDINAL entities are used.
+# Profiles drop the components that are not needed for them (compare them with
+# `python -m Sentiments.benchmark profiles` before switching). Every profile keeps the
+# lemmatizer, as adjectives are keyed by their lemma (see normalize_adjective).
+SPACY_PIPELINE_PROFILES = {
+    # Every component enabled by default in the model
+    'full': {'exclude': [], 'enable': []},
+    # Sentence boundaries come from the senter instead of the dependency parser
+    'senter': {'exclude': ['parser'], 'enable': ['senter']},
+    # Ordinals are detected by the `like_num` rule instead of NER
+    'senter_no_ner': {'exclude': ['parser', 'ner'], 'enable': ['senter']},
+}
+SPACY_PIPELINE_PROFILE = os.getenv('SPACY_PIPELINE_PROFILE', 'full')
+
+
+def load_nlp(profile: str = SPACY_PIPELINE_PROFILE):
+    import spacy
+    from spacy.util import is_package
+
+    if profile not in SPACY_PIPELINE_PROFILES:
+        raise ValueError(
+            f'Unknown spaCy pipeline profile "{profile}". Options: {list(SPACY_PIPELINE_PROFILES)}'
+        )
+    if not is_package(spacy_model):
+        spacy.cli.download(spacy_model)
+
+    settings = SPACY_PIPELINE_PROFILES[profile]
+    loaded_nlp = spacy.load(spacy_model, exclude=settings['exclude'])
+    for pipe_name in settings['enable']:
+        if pipe_name in loaded_nlp.disabled:
+            loaded_nlp.enable_pipe(pipe_name)
+
+    return loaded_nlp
+
+
+def get_nlp():
+    global _nlp
+
+    with _init_lock:
+        if _nlp is None:
+            _nlp = load_nlp()
+
+    return _nlp
+
+
+def get_sentiment_analyzer():
+    # VADER only reads its lexicon after construction, so one instance is shared by
+    # every thread instead of rebuilding the lexicon dictionaries for each sentence
+    global _sentiment_analyzer
+
+    with _init_lock:
+        if _sentiment_analyzer is None:
+            from vaderSentiment.vaderSentiment import SentimentIntensityAnalyzer
+
+            _sentiment_analyzer = SentimentIntensityAnalyzer()
+
+    return _sentiment_analyzer
+
+
+_lazy_attributes = {
+    'ai_model': get_ai_model,
+    'nlp': get_nlp,
+    'sentiment_analyzer': get_sentiment_analyzer,
+}
+
+
+def __getattr__(name):
+    # Keeps `Sentiments.main.nlp` (and the others) working as lazy module attributes
+    if name in _lazy_attributes:
+        return _lazy_attributes[name]()
+    raise AttributeError(f'module {__name__!r} has no attribute {name!r}')
+
+
+SENTIMENT_CACHE_SIZE = int(os.getenv('SENTIMENTS_SENTIMENT_CACHE_SIZE', 100_000))
+
+# Batch NLP settings (see analyze_reviews)
+NLP_BATCH_SIZE = int(os.getenv('SENTIMENTS_NLP_BATCH_SIZE', 64))
+NLP_N_PROCESS = int(os.getenv('SENTIMENTS_NLP_N_PROCESS', os.cpu_count() or 1))
+
+
+@dataclass
+class SentenceAnalysis:
+    text: str
+    adjectives: List[str]
+    sentiment: Dict[str, float]
+
+
+@dataclass
+class ReviewAnalysis:
+    sentences: List[SentenceAnalysis] = field(default_factory=list)
+
+
+# Memo of analyzed texts (see analyze_reviews), the on-disk tier is only used when
+# SENTIMENTS_SENTENCE_MEMO_PATH is set
+SENTENCE_MEMO_SIZE = int(os.getenv('SENTIMENTS_SENTENCE_MEMO_SIZE', 100_000))
+SENTENCE_MEMO_PATH = os.getenv('SENTIMENTS_SENTENCE_MEMO_PATH') or None
+
+sentence_memo = AnalysisMemo(
+    SENTENCE_MEMO_SIZE, SENTENCE_MEMO_PATH, namespace=SPACY_PIPELINE_PROFILE
+)
 
 
 def save_adjective_sentiment_cache():
-    with open(CACHED_GEMINI_RESULTS_PATH, 'w', encoding='utf-8') as f:
-        json.dump(adjective_to_sentiment_map, f, ensure_ascii=False, indent=2)
+    # Answers are committed as soon as they are stored, this only folds the WAL
+    # back into the database file
+    adjective_to_sentiment_map.checkpoint()
 
 
-def clear_adjective_sentiment_cache():
-    global adjective_to_sentiment_map
+def migrate_adjective_sentiment_cache():
+    """
+    Collapses cache entries whose adjectives share the same normalized key
+    ("Beautiful!", "beautiful"). The label of the entry already in normalized form
+    wins, otherwise the most common valid label.
+    """
+    cached_map = adjective_to_sentiment_map.to_dict()
+    normalized_keys = normalize_adjectives(cached_map.keys())
+    labels_by_key: Dict[str, List[str]] = {}
+    normalized_labels: Dict[str, str] = {}
+    for adjective, label in cached_map.items():
+        key = normalized_keys[adjective]
+        if not key:
+            continue
+        label = parse_emotion_label(label) or label
+        labels_by_key.setdefault(key, []).append(label)
+        if adjective == key:
+            normalized_labels[key] = label
+
+    migrated_map = {}
+    for key, labels in labels_by_key.items():
+        if parse_emotion_label(normalized_labels.get(key)):
+            migrated_map[key] = normalized_labels[key]
+            continue
+        valid_labels = [label for label in labels if parse_emotion_label(label)]
+        migrated_map[key] = Counter(valid_labels or labels).most_common(1)[0][0]
+
+    logger.info(
+        f'Adjective sentiment cache migrated: {len(cached_map)} -> {len(migrated_map)} entries.'
+    )
+    adjective_to_sentiment_map.replace_all(migrated_map)
+
+    return normalized_keys
+
 
-    adjective_to_sentiment_map = {}
-    if os.path.exists(CACHED_GEMINI_RESULTS_PATH):
-        os.remove(CACHED_GEMINI_RESULTS_PATH)
+def clear_adjective_sentiment_cache():
+    adjective_to_sentiment_map.close()
+    local_adjective_emotions.close()
+    reset_knn_classifier()
+    for path in [
+        CACHED_GEMINI_RESULTS_PATH,
+        CACHED_GEMINI_RESULTS_DB_PATH,
+        f'{CACHED_GEMINI_RESULTS_DB_PATH}-wal',
+        f'{CACHED_GEMINI_RESULTS_DB_PATH}-shm',
+    ]:
+        if os.path.exists(path):
+            os.remove(path)
 
     logger.info('Adjective sentiment cache cleared. ✅')
 
 
 def extract_sentences_from_text(text):
-    doc = nlp(text)
+    doc = get_nlp()(text)
 
     return [sent.text for sent in doc.sents]
 
 
-def extract_sentence_adjectives(sentence):
-    doc = nlp(sentence)
+def is_number_or_ordinal(token):
+    # English `like_num` already matches ordinal words ("first") and suffixed digits
+    # ("11th"), so profiles without NER keep filtering ordinals
+    return token.like_num or token.ent_type_ == 'ORDINAL'
+
+
+def normalize_adjective(adjective: str, lemma: str = None) -> str:
+    """
+    Key used for an adjective in the emotion cache and in the graph: its lemma when
+    available ("bigger" -> "big"), lowercased and without surrounding punctuation.
+    """
+    if lemma and lemma.strip():
+        adjective = lemma
+
+    return ' '.join(
+        adjective.strip(string.punctuation + string.whitespace).lower().split()
+    )
 
+
+def extract_span_adjectives(span):
     # Extract adjectives excluding ordinals
-    return [
-        token.text
-        for token in doc
-        if token.pos_ == 'ADJ' and not (token.like_num or token.ent_type_ == 'ORDINAL')
+    adjectives = [
+        normalize_adjective(token.text, token.lemma_)
+        for token in span
+        if token.pos_ == 'ADJ' and not is_number_or_ordinal(token)
     ]
 
+    return [adjective for adjective in adjectives if adjective]
+
+
+def normalize_adjectives(adjectives: Iterable[str]) -> Dict[str, str]:
+    """
+    Normalized key of each adjective, lemmatized out of context. Used to collapse keys
+    stored before adjectives were lemmatized.
+    """
+    adjectives = list(dict.fromkeys(adjectives))
+    normalized = {}
+    for adjective, doc in zip(adjectives, get_nlp().pipe(adjectives, batch_size=1000)):
+        words = [token for token in doc if not token.is_punct]
+        normalized[adjective] = normalize_adjective(
+            adjective, words[0].lemma_ if len(words) == 1 else None
+        )
+
+    return normalized
+
+
+def extract_sentence_adjectives(sentence):
+    return extract_span_adjectives(get_nlp()(sentence))
+
+
+@lru_cache(maxsize=SENTIMENT_CACHE_SIZE)
+def _cached_polarity_scores(sentence: str):
+    return get_sentiment_analyzer().polarity_scores(sentence)
+
 
 def extract_sentence_sentiment(sentence):
-    sid_obj = SentimentIntensityAnalyzer()
-    sentiment_dict = sid_obj.polarity_scores(sentence)
+    return dict(_cached_polarity_scores(sentence))
+
+
+def score_sentences(sentences: List[str]) -> List[Dict[str, float]]:
+    """
+    Returns the VADER polarity scores of each sentence (same order).
+    Identical sentences, within the batch or across calls, are only scored once.
+    """
+    return [extract_sentence_sentiment(sentence) for sentence in sentences]
+
 
-    return sentiment_dict
+def analyze_reviews(
+    texts: List[str],
+    batch_size: int = NLP_BATCH_SIZE,
+    n_process: int = NLP_N_PROCESS,
+    memo: AnalysisMemo = sentence_memo,
+) -> List[ReviewAnalysis]:
+    """
+    Streams review texts through `nlp.pipe` and returns, for each text (same order),
+    its sentences with their adjectives and VADER sentiment.
+    Sentences are taken from the review parse instead of being parsed again.
+    Texts (whitespace normalized) already in `memo`, either as a whole review or as
+    a sentence of a previous review, are not parsed again. Pass `memo=None` to
+    always parse.
+    """
+    normalized_texts = [normalize_text(text) for text in texts]
+    sentence_records: Dict[str, List[dict]] = {}
+    for text in dict.fromkeys(normalized_texts):
+        records = memo.get(text) if memo is not None else None
+        if records is not None:
+            sentence_records[text] = records
+
+    new_texts = [
+        text for text in dict.fromkeys(normalized_texts) if text not in sentence_records
+    ]
+    # Worker processes only pay off when every worker receives at least one batch
+    n_process = max(1, min(n_process, math.ceil(len(new_texts) / batch_size)))
+
+    new_records = {}
+    docs = get_nlp().pipe(new_texts, batch_size=batch_size, n_process=n_process)
+    for text, doc in zip(new_texts, docs):
+        sentences = list(doc.sents)
+        sentence_scores = score_sentences([sent.text for sent in sentences])
+        records = [
+            asdict(
+                SentenceAnalysis(
+                    text=sent.text,
+                    adjectives=extract_span_adjectives(sent),
+                    sentiment=sentiment,
+                )
+            )
+            for sent, sentiment in zip(sentences, sentence_scores)
+        ]
+        sentence_records[text] = records
+
+        # Each sentence is also remembered on its own, so short reviews repeating a
+        # known sentence ("Great place!") are hits
+        for record in records:
+            new_records.setdefault(record['text'], [record])
+        new_records[text] = records
+
+    if memo is not None and new_records:
+        memo.put_many(new_records)
+
+    return [
+        ReviewAnalysis(
+            # Copies, so callers can not alter memoized records
+            sentences=[
+                SentenceAnalysis(
+                    text=record['text'],
+                    adjectives=list(record['adjectives']),
+                    sentiment=dict(record['sentiment']),
+                )
+                for record in sentence_records[text]
+            ]
+        )
+        for text in normalized_texts
+    ]
 
 
-def generate_with_retry(prompt: str, max_retries: int = 12, base_delay: float = 1.0):
+def generate_with_retry(
+    prompt: str,
+    max_retries: int = 12,
+    base_delay: float = 1.0,
+    generation_config=None,
+    model=None,
+    max_delay: float = 60.0,
+):
     """
     Calls Vertex AI with exponential backoff and jitter on transient errors.
     Retries on RESOURCE_EXHAUSTED (429), UNAVAILABLE (503), DEADLINE_EXCEEDED (504).
+    Each wait is capped at `max_delay` seconds.
+    `model` defaults to the Gemini model, any object with `generate_content` works.
     """
+    from google.api_core import exceptions as gax_exceptions
+    import grpc
+
+    if generation_config is None:
+        generation_config = {'temperature': 0.71}
+    if model is None:
+        model = get_ai_model()
+
     for attempt in range(max_retries):
         try:
-            return ai_model.generate_content(
-                prompt, generation_config=({'temperature': 0.71})
-            )
+            return model.generate_content(prompt, generation_config=generation_config)
         except (
             gax_exceptions.ResourceExhausted,
             gax_exceptions.TooManyRequests,
             gax_exceptions.ServiceUnavailable,
             gax_exceptions.DeadlineExceeded,
         ) as e:
-            delay = base_delay * (2**attempt) + random.uniform(0, 0.25)
+            delay = min(max_delay, base_delay * (2**attempt)) + random.uniform(0, 0.25)
             logger.warning(
                 f'Gemini throttled ({type(e).__name__}); retrying in {delay:.2f}s (attempt {attempt + 1}/{max_retries})'
             )
@@ -108,7 +413,9 @@ def generate_with_retry(prompt: str, max_retries: int = 12, base_delay: float =
                 grpc.StatusCode.UNAVAILABLE,
                 grpc.StatusCode.DEADLINE_EXCEEDED,
             ):
-                delay = base_delay * (2**attempt) + random.uniform(0, 0.25)
+                delay = min(max_delay, base_delay * (2**attempt)) + random.uniform(
+                    0, 0.25
+                )
                 logger.warning(
                     f'Gemini gRPC {code.name}; retrying in {delay:.2f}s (attempt {attempt + 1}/{max_retries})'
                 )
@@ -153,17 +460,7 @@ VALID_EMOTIONS = [
     'Insecurity',
 ]
 
-
-def classify_adjective_to_emotions_gemini(adjective: str, skip_cache: bool = False):
-    global new_responses_count
-
-    sanitized_adjective = adjective.strip().lower()
-
-    if sanitized_adjective in adjective_to_sentiment_map and not skip_cache:
-        return adjective_to_sentiment_map[sanitized_adjective]
-
-    prompt = f"""
-    Classify the following word that has been used as an adjective, "{sanitized_adjective}", into one of the emotions:
+EMOTIONS_PROMPT_LIST = """\
     1. Happiness
     2. Joy
     3. Excitement
@@ -194,27 +491,421 @@ def classify_adjective_to_emotions_gemini(adjective: str, skip_cache: bool = Fal
     28. Disgust (dirty, smelly)
     29. Regret (waste of time/money)
     30. Insecurity (unsafe, unwelcoming)
+"""
+
+# Adjectives sent in a single batch classification request
+ADJECTIVE_BATCH_SIZE = int(os.getenv('SENTIMENTS_ADJECTIVE_BATCH_SIZE', 50))
+ADJECTIVE_BATCH_RESPONSE_SCHEMA = {
+    'type': 'array',
+    'items': {
+        'type': 'object',
+        'properties': {
+            'adjective': {'type': 'string'},
+            'emotion': {'type': 'string', 'enum': VALID_EMOTIONS},
+        },
+        'required': ['adjective', 'emotion'],
+    },
+}
+
+
+# Local nearest-neighbor classifier over the cached Gemini labels (see
+# NearestNeighborEmotionClassifier). Needs a spaCy model with word vectors installed.
+VECTORS_SPACY_MODEL = os.getenv('SENTIMENTS_VECTORS_MODEL', 'en_core_web_md')
+KNN_NEIGHBORS = int(os.getenv('SENTIMENTS_KNN_NEIGHBORS', 7))
+KNN_CONFIDENCE_THRESHOLD = float(os.getenv('SENTIMENTS_KNN_CONFIDENCE_THRESHOLD', 0.8))
+# The classifier is rebuilt once Gemini added this many labels to the cache
+KNN_REFRESH_LABELS = int(os.getenv('SENTIMENTS_KNN_REFRESH_LABELS', 500))
+
+
+def get_word_vectors():
+    """
+    Vocab of VECTORS_SPACY_MODEL (only its word vectors are used), or None when the
+    model is not installed.
+    """
+    global _word_vectors
+
+    with _init_lock:
+        if _word_vectors is None:
+            import spacy
+            from spacy.util import is_package
+
+            if not is_package(VECTORS_SPACY_MODEL):
+                logger.warning(
+                    f'spaCy model {VECTORS_SPACY_MODEL} is not installed, adjectives are only classified by Gemini.'
+                )
+                _word_vectors = False
+            else:
+                vectors_nlp = spacy.load(
+                    VECTORS_SPACY_MODEL,
+                    exclude=[
+                        'tok2vec',
+                        'tagger',
+                        'parser',
+                        'senter',
+                        'attribute_ruler',
+                        'lemmatizer',
+                        'ner',
+                    ],
+                )
+                _word_vectors = vectors_nlp.vocab
+
+    return _word_vectors or None
+
+
+class NearestNeighborEmotionClassifier:
+    """
+    k-nearest-neighbor emotion classifier over the word vectors of adjectives already
+    labeled by Gemini. The confidence of a prediction is the similarity-weighted share
+    of the `k` nearest labeled adjectives that voted for it.
+    """
+
+    def __init__(self, labels: Mapping[str, str], vocab, k: int = KNN_NEIGHBORS):
+        import numpy as np
+
+        self.vocab = vocab
+        self.k = k
+        # Cached labels it was built from (see get_knn_classifier)
+        self.label_count = len(labels)
+
+        adjectives, vectors, emotions = [], [], []
+        for adjective, label in labels.items():
+            emotion = parse_emotion_label(label)
+            vector = self.vector(adjective)
+            if emotion and vector is not None:
+                adjectives.append(adjective)
+                vectors.append(vector)
+                emotions.append(VALID_EMOTIONS.index(emotion))
+
+        self.adjectives = adjectives
+        self.matrix = (
+            np.vstack(vectors) if vectors else np.zeros((0, 1), dtype=np.float32)
+        )
+        self.emotions = np.array(emotions, dtype=np.int64)
+
+    def vector(self, adjective: str):
+        import numpy as np
+
+        words = [word for word in adjective.split() if self.vocab.has_vector(word)]
+        if not words:
+            return None
+
+        vector = np.mean([self.vocab.get_vector(word) for word in words], axis=0)
+        norm = np.linalg.norm(vector)
+
+        return (vector / norm).astype(np.float32) if norm > 0 else None
+
+    def predict_many(self, adjectives: List[str]) -> Dict[str, Tuple[str, float]]:
+        """Predicted emotion and confidence by adjective (no entry without a vector)."""
+        import numpy as np
+
+        vectors = {adjective: self.vector(adjective) for adjective in adjectives}
+        vectors = {a: v for a, v in vectors.items() if v is not None}
+        if not vectors or len(self.adjectives) == 0:
+            return {}
+
+        k = min(self.k, len(self.adjectives))
+        similarities = np.vstack(list(vectors.values())) @ self.matrix.T
+        neighbors = np.argpartition(-similarities, k - 1, axis=1)[:, :k]
+
+        predictions = {}
+        for row, adjective in enumerate(vectors):
+            weights = np.clip(similarities[row, neighbors[row]], 0, None)
+            votes = np.bincount(
+                self.emotions[neighbors[row]],
+                weights=weights,
+                minlength=len(VALID_EMOTIONS),
+            )
+            total = votes.sum()
+            if total <= 0:
+                continue
+            best = int(votes.argmax())
+            predictions[adjective] = (VALID_EMOTIONS[best], float(votes[best] / total))
+
+        return predictions
+
+
+def get_knn_classifier(refresh: bool = False):
+    """
+    Classifier seeded with the current cached labels, built on first use and rebuilt
+    when `refresh` is set or once KNN_REFRESH_LABELS new labels were cached. None
+    when no word vectors are available.
+    """
+    global _knn_classifier
+
+    vocab = get_word_vectors()
+    if vocab is None:
+        return None
+    with _knn_lock:
+        if (
+            _knn_classifier is None
+            or refresh
+            or len(adjective_to_sentiment_map) - _knn_classifier.label_count
+            >= KNN_REFRESH_LABELS
+        ):
+            _knn_classifier = NearestNeighborEmotionClassifier(
+                adjective_to_sentiment_map.to_dict(), vocab
+            )
 
+        return _knn_classifier
+
+
+def reset_knn_classifier():
+    """Drops the classifier, the next lookup builds it from the current cache."""
+    global _knn_classifier
+
+    with _knn_lock:
+        _knn_classifier = None
+
+
+def classify_adjectives_locally(
+    adjectives: List[str], threshold: float = KNN_CONFIDENCE_THRESHOLD
+) -> Dict[str, str]:
+    """
+    Emotions of the adjectives the local classifier is confident about. Confident
+    predictions are stored in local_adjective_emotions and not computed again.
+    """
+    emotions = {
+        adjective: local_adjective_emotions[adjective]
+        for adjective in adjectives
+        if adjective in local_adjective_emotions
+    }
+    pending = [adjective for adjective in adjectives if adjective not in emotions]
+    if not pending or threshold > 1:
+        return emotions
+
+    classifier = get_knn_classifier()
+    if classifier is None:
+        return emotions
+
+    predicted = {
+        adjective: emotion
+        for adjective, (emotion, confidence) in classifier.predict_many(pending).items()
+        if confidence >= threshold
+    }
+    local_adjective_emotions.update(predicted)
+    emotions.update(predicted)
+
+    return emotions
+
+
+def knn_agreement_report(
+    holdout_fraction: float = 0.2,
+    thresholds: List[float] = (0.5, 0.6, 0.7, 0.8, 0.9, 1.0),
+    seed: int = 0,
+) -> List[Dict[str, float]]:
+    """
+    Trains the classifier on the cached labels minus a random held-out fraction and
+    reports, for each confidence threshold, the share of held-out adjectives answered
+    locally (coverage) and how often those answers match Gemini (agreement).
+    """
+    vocab = get_word_vectors()
+    if vocab is None:
+        raise RuntimeError(f'spaCy model {VECTORS_SPACY_MODEL} is not installed')
+
+    labels = {
+        adjective: parse_emotion_label(label)
+        for adjective, label in adjective_to_sentiment_map.to_dict().items()
+        if parse_emotion_label(label)
+    }
+    adjectives = sorted(labels)
+    random.Random(seed).shuffle(adjectives)
+    holdout_size = int(len(adjectives) * holdout_fraction)
+    held_out = adjectives[:holdout_size]
+
+    classifier = NearestNeighborEmotionClassifier(
+        {adjective: labels[adjective] for adjective in adjectives[holdout_size:]}, vocab
+    )
+    predictions = classifier.predict_many(held_out)
+
+    report = []
+    for threshold in thresholds:
+        answered = [
+            adjective
+            for adjective, (_, confidence) in predictions.items()
+            if confidence >= threshold
+        ]
+        agreed = [
+            adjective
+            for adjective in answered
+            if predictions[adjective][0] == labels[adjective]
+        ]
+        report.append(
+            {
+                'threshold': threshold,
+                'coverage': len(answered) / len(held_out) if held_out else 0.0,
+                'agreement': len(agreed) / len(answered) if answered else 0.0,
+            }
+        )
+
+    return report
+
+
+def classify_adjective_to_emotions_gemini(
+    adjective: str, skip_cache: bool = False, model=None, max_attempts: int = 3
+):
+    """
+    Emotion of a single adjective. Gemini is asked again, up to `max_attempts` times,
+    while its answer is not one of VALID_EMOTIONS. Only valid labels are cached,
+    None is returned when every answer was invalid.
+    """
+    sanitized_adjective = normalize_adjective(adjective)
+
+    if sanitized_adjective in adjective_to_sentiment_map and not skip_cache:
+        return adjective_to_sentiment_map[sanitized_adjective]
+
+    if not skip_cache:
+        local_emotion = classify_adjectives_locally([sanitized_adjective]).get(
+            sanitized_adjective
+        )
+        if local_emotion:
+            return local_emotion
+
+    prompt = f"""
+    Classify the following word that has been used as an adjective, "{sanitized_adjective}", into one of the emotions:
+{EMOTIONS_PROMPT_LIST}
     You must choose only one emotion that best represents it. Reply with **ONLY** the emotion name, ignoring any other text.
     """
 
-    response = generate_with_retry(prompt)
+    for _ in range(max_attempts):
+        response = generate_with_retry(prompt, model=model)
+        emotion = parse_emotion_label(response.text)
+        if emotion:
+            adjective_to_sentiment_map[sanitized_adjective] = emotion
+            return emotion
+
+        logger.warning(
+            f'Invalid Gemini label {response.text.strip()!r} for adjective "{sanitized_adjective}".'
+        )
+
+    return None
+
+
+def parse_emotion_label(label) -> str:
+    """Returns the matching entry of VALID_EMOTIONS, or None if the label is invalid."""
+    if not isinstance(label, str):
+        return None
+    label = label.strip().strip('.*"').title()
+
+    return label if label in VALID_EMOTIONS else None
+
+
+def request_adjective_batch_emotions(
+    adjectives: List[str], model=None
+) -> Dict[str, str]:
+    """
+    Classifies every adjective with a single structured output request.
+    Returns the valid labels by adjective, adjectives missing from the response or
+    with invalid labels are left out.
+    """
+    prompt = f"""
+    Classify each of the following words that have been used as adjectives into one of the emotions:
+{EMOTIONS_PROMPT_LIST}
+    Words: {json.dumps(adjectives, ensure_ascii=False)}
+
+    You must choose only one emotion that best represents each word. Reply with one entry per word, using the word exactly as given and **ONLY** the emotion name.
+    """
 
-    adjective_to_sentiment_map[sanitized_adjective] = response.text.strip()
-    new_responses_count += 1
+    if model is None:
+        model = get_ai_model()
+    generation_config = {
+        'temperature': 0.71,
+        'response_mime_type': 'application/json',
+        'response_schema': ADJECTIVE_BATCH_RESPONSE_SCHEMA,
+    }
+    # Only Vertex AI models need the schema converted by GenerationConfig, the fake
+    # model (and any other) gets the plain dict without importing vertexai
+    if type(model).__module__.startswith('vertexai.'):
+        from vertexai.generative_models import GenerationConfig
+
+        generation_config = GenerationConfig(**generation_config)
+
+    response = generate_with_retry(
+        prompt, generation_config=generation_config, model=model
+    )
+
+    try:
+        entries = json.loads(response.text)
+    except (json.JSONDecodeError, ValueError):
+        logger.warning(
+            f'Invalid JSON in Gemini batch response for {len(adjectives)} adjectives.'
+        )
+        return {}
+
+    requested = set(adjectives)
+    labels = {}
+    for entry in entries if isinstance(entries, list) else []:
+        if not isinstance(entry, dict):
+            continue
+        adjective = normalize_adjective(str(entry.get('adjective', '')))
+        emotion = parse_emotion_label(entry.get('emotion'))
+        if adjective in requested and emotion:
+            labels[adjective] = emotion
+
+    return labels
+
+
+def classify_adjectives_to_emotions_gemini(
+    adjectives: List[str],
+    skip_cache: bool = False,
+    batch_size: int = ADJECTIVE_BATCH_SIZE,
+    max_rounds: int = 3,
+    model=None,
+) -> Dict[str, str]:
+    """
+    Batch version of classify_adjective_to_emotions_gemini.
+    Uncached adjectives the local classifier is confident about are answered without
+    Gemini. The rest are sent `batch_size` at a time and only the ones that came back
+    missing or with an invalid label are queried again, for up to `max_rounds`.
+    The labels of each batch are stored in the cache in bulk. Returns the emotion by
+    sanitized adjective.
+    """
+    sanitized_adjectives = list(
+        dict.fromkeys(normalize_adjective(adjective) for adjective in adjectives)
+    )
+    pending = [
+        adjective
+        for adjective in sanitized_adjectives
+        if skip_cache or adjective not in adjective_to_sentiment_map
+    ]
+
+    local_emotions = {} if skip_cache else classify_adjectives_locally(pending)
+    pending = [adjective for adjective in pending if adjective not in local_emotions]
+
+    for _ in range(max_rounds):
+        if not pending:
+            break
+
+        invalid = []
+        for i in range(0, len(pending), batch_size):
+            batch = pending[i : i + batch_size]
+            labels = request_adjective_batch_emotions(batch, model=model)
+            adjective_to_sentiment_map.update(labels)
+            invalid.extend(adjective for adjective in batch if adjective not in labels)
+        pending = invalid
+
+    if pending:
+        logger.warning(
+            f'{len(pending)} adjectives without a valid batch label, classifying them one by one.'
+        )
+        for adjective in pending:
+            classify_adjective_to_emotions_gemini(
+                adjective, skip_cache=skip_cache, model=model
+            )
 
-    # Save cache every 25 new responses to avoid data loss
-    if new_responses_count >= 25:
-        save_adjective_sentiment_cache()
-        new_responses_count = 0
+    emotions = {}
+    for adjective in sanitized_adjectives:
+        if adjective in local_emotions:
+            emotions[adjective] = local_emotions[adjective]
+        elif adjective in adjective_to_sentiment_map:
+            emotions[adjective] = adjective_to_sentiment_map[adjective]
 
-    return response.text
+    return emotions
 
 
 if __name__ == '__main__':
     adjective = 'wonderful'
     q = classify_adjective_to_emotions_gemini(adjective)
-    answer = adjective_to_sentiment_map[adjective]
+    answer = adjective_to_sentiment_map.get(adjective, q)
     print('Gemini answers:', answer)
 
     test_sentence = 'The first dog is bigger than the second beautiful dog, but the 11th dog is the smallest.'
@@ -0,0 +1,127 @@
+from collections import OrderedDict
+import hashlib
+import json
+import sqlite3
+import threading
+from typing import Any, Mapping, Optional
+
+
+def normalize_text(text: str) -> str:
+    # Case is kept since VADER scores uppercase words differently
+    return ' '.join(text.split())
+
+
+def text_key(text: str, namespace: str = '') -> bytes:
+    """Content hash of the normalized text."""
+    return hashlib.blake2b(
+        normalize_text(text).encode('utf-8'),
+        digest_size=16,
+        person=namespace.encode('utf-8')[:16],
+    ).digest()
+
+
+class AnalysisMemo:
+    """
+    Bounded LRU memo of text analyses keyed by the content hash of the normalized
+    text, with an optional on-disk tier in SQLite (WAL journal) shared between runs.
+    Values must be JSON serializable. Memory hits are promoted, disk hits are copied
+    into memory and evicted entries stay on disk.
+    `namespace` is mixed into the keys so analyses made with different settings (e.g.
+    another spaCy profile) are not mixed up.
+    """
+
+    def __init__(self, max_size: int, path: str = None, namespace: str = ''):
+        self.max_size = max_size
+        self.path = path
+        self.namespace = namespace
+        self.hits = 0
+        self.misses = 0
+        self._memory: OrderedDict[bytes, Any] = OrderedDict()
+        self._connection: sqlite3.Connection = None
+        self._lock = threading.RLock()
+
+    @property
+    def connection(self) -> Optional[sqlite3.Connection]:
+        with self._lock:
+            if self._connection is None and self.path:
+                self._connection = sqlite3.connect(
+                    self.path, check_same_thread=False, isolation_level=None
+                )
+                self._connection.execute('PRAGMA journal_mode=WAL')
+                self._connection.execute('PRAGMA synchronous=NORMAL')
+                self._connection.execute(
+                    'CREATE TABLE IF NOT EXISTS text_analyses '
+                    '(key BLOB PRIMARY KEY, analysis TEXT NOT NULL) WITHOUT ROWID'
+                )
+            return self._connection
+
+    @property
+    def hit_rate(self) -> float:
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+    def _remember(self, key: bytes, value):
+        self._memory[key] = value
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_size:
+            self._memory.popitem(last=False)
+
+    def get(self, text: str):
+        key = text_key(text, self.namespace)
+        with self._lock:
+            if key in self._memory:
+                self._memory.move_to_end(key)
+                self.hits += 1
+                return self._memory[key]
+
+            row = None
+            if self.connection is not None:
+                row = self.connection.execute(
+                    'SELECT analysis FROM text_analyses WHERE key = ?', (key,)
+                ).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+
+            value = json.loads(row[0])
+            self._remember(key, value)
+            self.hits += 1
+            return value
+
+    def put_many(self, entries: Mapping[str, Any]):
+        """Stores every text -> value entry (written to disk in a single transaction)."""
+        entries = {
+            text_key(text, self.namespace): value for text, value in entries.items()
+        }
+        with self._lock:
+            for key, value in entries.items():
+                self._remember(key, value)
+
+            if self.connection is not None and entries:
+                with self.connection:
+                    self.connection.execute('BEGIN')
+                    self.connection.executemany(
+                        'INSERT OR REPLACE INTO text_analyses VALUES (?, ?)',
+                        (
+                            (key, json.dumps(value, ensure_ascii=False))
+                            for key, value in entries.items()
+                        ),
+                    )
+
+    def reset_stats(self):
+        self.hits = 0
+        self.misses = 0
+
+    def clear(self):
+        with self._lock:
+            self._memory.clear()
+            if self.connection is not None:
+                self.connection.execute('DELETE FROM text_analyses')
+            self.reset_stats()
+
+    def close(self):
+        with self._lock:
+            if self._connection is not None:
+                self._connection.close()
+                self._connection = None
+            self._memory.clear()
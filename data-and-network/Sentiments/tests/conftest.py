@@ -0,0 +1,27 @@
+"""
+Test configuration and fixtures for the Sentiments tests.
+"""
+
+import os
+
+import pytest
+
+from Sentiments.cache import AdjectiveEmotionCache
+import Sentiments.main as sentiments
+
+
+@pytest.fixture
+def adjective_cache(tmp_path, monkeypatch):
+    """Empty temporary adjective emotion cache, without the local classifier"""
+    cache_path = os.path.join(tmp_path, 'cached_results.sqlite3')
+    cache = AdjectiveEmotionCache(cache_path)
+    local_cache = AdjectiveEmotionCache(cache_path, table='local_adjective_emotions')
+    monkeypatch.setattr(sentiments, 'adjective_to_sentiment_map', cache)
+    monkeypatch.setattr(sentiments, 'local_adjective_emotions', local_cache)
+    # Only Gemini (the fake model) answers, whatever word vectors are installed
+    monkeypatch.setattr(sentiments, 'get_knn_classifier', lambda: None)
+
+    yield cache
+
+    cache.close()
+    local_cache.close()
@@ -0,0 +1,122 @@
+"""
+Test the batch Gemini adjective classification against the local fake Gemini model:
+invalid labels, retry rounds and the single word fallback.
+"""
+
+import json
+
+import Sentiments.fake_model as fake_model
+from Sentiments.fake_model import FakeGenerativeModel, FakeResponse, fake_emotion
+import Sentiments.main as sentiments
+
+
+class ScriptedModel(FakeGenerativeModel):
+    """
+    Fake Gemini model answering `bad_batches[word]` batch requests with an invalid
+    label (or no entry at all for the words in `missing`) before the valid one, and
+    every single word request for the words in `always_invalid` with an invalid label
+    """
+
+    def __init__(self, bad_batches=None, missing=(), always_invalid=()):
+        super().__init__(latency=0, throttle_rate=0)
+        self.bad_batches = dict(bad_batches or {})
+        self.missing = set(missing)
+        self.always_invalid = set(always_invalid)
+        self.batches = []
+        self.single_words = []
+        self.generation_configs = []
+
+    def generate_content(self, prompt, generation_config=None):
+        self.generation_configs.append(generation_config)
+        response = super().generate_content(prompt, generation_config)
+
+        batch_match = fake_model.BATCH_WORDS_PATTERN.search(prompt)
+        if not batch_match:
+            word = fake_model.SINGLE_WORD_PATTERN.search(prompt).group(1)
+            self.single_words.append(word)
+            return FakeResponse('Meh' if word in self.always_invalid else response.text)
+
+        self.batches.append(json.loads(batch_match.group(1)))
+        entries = []
+        for entry in json.loads(response.text):
+            word = entry['adjective']
+            if self.bad_batches.get(word, 0) > 0:
+                self.bad_batches[word] -= 1
+                if word in self.missing:
+                    continue
+                entry['emotion'] = 'Meh'
+            entries.append(entry)
+        return FakeResponse(json.dumps(entries))
+
+
+class TestBatchClassification:
+    """Test only the invalid labels are asked again, then one word at a time"""
+
+    def test_valid_batch(self, adjective_cache):
+        """Test one structured request classifies and caches every adjective"""
+        model = ScriptedModel()
+
+        emotions = sentiments.classify_adjectives_to_emotions_gemini(
+            ['Beautiful!', 'quiet', 'beautiful'], model=model
+        )
+
+        assert emotions == {
+            'beautiful': fake_emotion('beautiful'),
+            'quiet': fake_emotion('quiet'),
+        }
+        assert model.batches == [['beautiful', 'quiet']]
+        assert adjective_cache['quiet'] == fake_emotion('quiet')
+        # The schema is a plain dict for models other than Vertex AI ones
+        generation_config = model.generation_configs[0]
+        assert generation_config['response_mime_type'] == 'application/json'
+        assert (
+            generation_config['response_schema']
+            == sentiments.ADJECTIVE_BATCH_RESPONSE_SCHEMA
+        )
+
+    def test_invalid_labels_retried(self, adjective_cache):
+        """Test invalid and missing labels are asked again in later rounds only"""
+        model = ScriptedModel(bad_batches={'crowded': 1, 'dirty': 2}, missing={'dirty'})
+
+        emotions = sentiments.classify_adjectives_to_emotions_gemini(
+            ['amazing', 'crowded', 'dirty', 'boring', 'quiet'],
+            batch_size=2,
+            model=model,
+        )
+
+        assert model.batches == [
+            ['amazing', 'crowded'],
+            ['dirty', 'boring'],
+            ['quiet'],
+            ['crowded', 'dirty'],
+            ['dirty'],
+        ]
+        assert not model.single_words
+        assert emotions == {
+            adjective: fake_emotion(adjective)
+            for adjective in ['amazing', 'crowded', 'dirty', 'boring', 'quiet']
+        }
+        assert 'Meh' not in adjective_cache.to_dict().values()
+
+    def test_single_word_fallback(self, adjective_cache):
+        """Test adjectives invalid in every round are classified one by one"""
+        model = ScriptedModel(
+            bad_batches={'crowded': 3, 'dirty': 3}, always_invalid={'dirty'}
+        )
+
+        emotions = sentiments.classify_adjectives_to_emotions_gemini(
+            ['amazing', 'crowded', 'dirty'], max_rounds=3, model=model
+        )
+
+        assert model.batches == [
+            ['amazing', 'crowded', 'dirty'],
+            ['crowded', 'dirty'],
+            ['crowded', 'dirty'],
+        ]
+        # Every single word request answered invalid is asked again
+        assert model.single_words == ['crowded'] + ['dirty'] * 3
+        assert emotions == {
+            'amazing': fake_emotion('amazing'),
+            'crowded': fake_emotion('crowded'),
+        }
+        assert 'dirty' not in adjective_cache
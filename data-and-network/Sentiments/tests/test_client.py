@@ -0,0 +1,190 @@
+"""
+Test the concurrent, rate-limited Gemini classification client against the local
+fake Gemini model.
+"""
+
+import threading
+import time
+
+import pytest
+
+from Sentiments.client import EmotionClassificationClient, TokenBucket
+from Sentiments.fake_model import FakeGenerativeModel, fake_emotion
+
+ADJECTIVES = ['beautiful', 'crowded', 'quiet', 'dirty', 'amazing', 'boring']
+
+
+class RecordingModel(FakeGenerativeModel):
+    """Fake Gemini model recording when each call started and the calls in flight"""
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.call_times = []
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self._calls_lock = threading.Lock()
+
+    def generate_content(self, prompt, generation_config=None):
+        with self._calls_lock:
+            self.call_times.append(time.monotonic())
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            return super().generate_content(prompt, generation_config)
+        finally:
+            with self._calls_lock:
+                self.in_flight -= 1
+
+
+class TestEmotionClassificationClient:
+    """Test coalescing, limits, prefetching and shutdown of the client"""
+
+    def test_duplicate_adjectives_are_coalesced(self, adjective_cache):
+        """Test adjectives already being classified share the same request"""
+        model = RecordingModel(latency=0.2, throttle_rate=0.3, seed=1)
+        client = EmotionClassificationClient(
+            model=model, max_concurrency=4, requests_per_minute=6000, burst=10
+        )
+        try:
+            first = client.prefetch(['Beautiful!', 'beautiful', 'quiet'])
+            second = client.prefetch(['beautiful', 'QUIET'])
+
+            assert set(first) == {'beautiful', 'quiet'}
+            assert second['beautiful'] is first['beautiful']
+            assert second['quiet'] is first['quiet']
+            assert second['quiet'].result() == fake_emotion('quiet')
+            # One successful batch request, whatever the throttled attempts
+            assert model.calls - model.throttled == 1
+            assert adjective_cache['beautiful'] == fake_emotion('beautiful')
+        finally:
+            client.shutdown()
+
+    @pytest.mark.usefixtures('adjective_cache')
+    def test_concurrency_and_rate_limits(self):
+        """Test the calls in flight never exceed the limit and follow the token rate"""
+        requests_per_second = 20
+        model = RecordingModel(latency=0.1, throttle_rate=0.2, seed=2)
+        client = EmotionClassificationClient(
+            model=model,
+            max_concurrency=2,
+            requests_per_minute=requests_per_second * 60,
+            burst=1,
+            batch_size=1,
+        )
+        try:
+            futures = client.prefetch(ADJECTIVES)
+            for adjective, future in futures.items():
+                assert future.result() == fake_emotion(adjective)
+        finally:
+            client.shutdown()
+
+        assert model.throttled > 0
+        assert model.max_in_flight <= 2
+        assert len(model.call_times) >= len(ADJECTIVES)
+        # The refill timing itself is tested with a fake clock (see TestTokenBucket)
+        assert client.rate_limiter.rate == requests_per_second
+        assert client.rate_limiter.capacity == 1
+
+    def test_prefetch_futures_resolve(self, adjective_cache):
+        """Test prefetched futures resolve to the emotions, cached ones right away"""
+        adjective_cache['beautiful'] = 'Wonder'
+        model = FakeGenerativeModel(latency=0.05, throttle_rate=0.3, seed=3)
+        client = EmotionClassificationClient(
+            model=model, requests_per_minute=6000, burst=10, batch_size=2
+        )
+        try:
+            futures = client.prefetch(ADJECTIVES)
+
+            assert futures['beautiful'].done()
+            assert futures['beautiful'].result() == 'Wonder'
+            for adjective in ADJECTIVES[1:]:
+                assert futures[adjective].result(timeout=30) == fake_emotion(adjective)
+            assert client.classify('Amazing') == fake_emotion('amazing')
+        finally:
+            client.shutdown()
+
+    @pytest.mark.usefixtures('adjective_cache')
+    def test_shutdown_drains(self):
+        """Test shutdown waits for pending batches, or cancels them without waiting"""
+        model = FakeGenerativeModel(latency=0.1, throttle_rate=0.3, seed=4)
+        client = EmotionClassificationClient(
+            model=model,
+            max_concurrency=1,
+            requests_per_minute=6000,
+            burst=10,
+            batch_size=1,
+        )
+        futures = client.prefetch(ADJECTIVES[:3])
+        client.shutdown(wait=True)
+
+        for adjective, future in futures.items():
+            assert future.done()
+            assert future.result() == fake_emotion(adjective)
+        # One successful request per batch, none left running
+        assert model.calls - model.throttled == 3
+
+        client = EmotionClassificationClient(
+            model=model,
+            max_concurrency=1,
+            requests_per_minute=6000,
+            burst=10,
+            batch_size=1,
+        )
+        futures = client.prefetch(ADJECTIVES[3:])
+        client.shutdown(wait=False)
+
+        # No future is left pending: they are cancelled unless already resolved
+        for future in futures.values():
+            assert future.done()
+            assert future.cancelled() or future.result() is not None
+
+        # The batch still running stores its labels before the cache is restored,
+        # the batches cancelled before starting never reach the model
+        client.shutdown(wait=True)
+        assert model.calls - model.throttled <= 3 + 1
+
+
+class FakeClock:
+    """Monotonic clock that only moves when sleeping"""
+
+    def __init__(self):
+        self.now = 0.0
+        self.sleeps = []
+
+    def monotonic(self) -> float:
+        return self.now
+
+    def sleep(self, seconds: float):
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+
+class TestTokenBucket:
+    """Test the token bucket against a fake clock"""
+
+    def test_burst_then_refill_rate(self):
+        """Test the burst is taken right away and later tokens follow the rate"""
+        clock = FakeClock()
+        bucket = TokenBucket(20, 2, clock=clock.monotonic, sleep=clock.sleep)
+
+        acquired_at = []
+        for _ in range(6):
+            bucket.acquire()
+            acquired_at.append(clock.now)
+
+        assert acquired_at == pytest.approx([0, 0, 0.05, 0.1, 0.15, 0.2])
+
+    def test_refill_is_capped(self):
+        """Test idle time refills the bucket up to its capacity only"""
+        clock = FakeClock()
+        bucket = TokenBucket(10, 3, clock=clock.monotonic, sleep=clock.sleep)
+        for _ in range(3):
+            bucket.acquire()
+        assert not clock.sleeps
+
+        clock.now += 60
+        for _ in range(3):
+            bucket.acquire()
+        assert not clock.sleeps
+        bucket.acquire()
+        assert sum(clock.sleeps) == pytest.approx(0.1)
@@ -0,0 +1,75 @@
+import argparse
+import os
+import subprocess
+import sys
+from typing import Dict
+
+from dotenv import load_dotenv
+
+DATA_AND_NETWORK_DIR = os.path.join(os.path.dirname(os.path.realpath(__file__)), '..')
+
+# Startup budget (cumulative import time in milliseconds) of each entry point module
+IMPORT_TIME_BUDGETS_MS: Dict[str, float] = {
+    'Sentiments.main': 150,
+    # Dominated by networkx: the graph is loaded on first use, pandas and the plotting
+    # libraries are imported by the functions that need them
+    'Network.main': 500,
+}
+
+
+def measure_import_time(module: str, repeat: int = 3) -> float:
+    """
+    Best cumulative import time of `module` in milliseconds over `repeat` fresh
+    interpreters, as reported by `python -X importtime`.
+    """
+    best_time = None
+    for _ in range(repeat):
+        result = subprocess.run(
+            [sys.executable, '-X', 'importtime', '-c', f'import {module}'],
+            cwd=DATA_AND_NETWORK_DIR,
+            capture_output=True,
+            text=True,
+        )
+        if result.returncode != 0:
+            raise RuntimeError(
+                f'Importing {module} failed: {result.stderr.strip().splitlines()[-1]}'
+            )
+
+        for line in result.stderr.splitlines():
+            # import time: self [us] | cumulative | imported package
+            if not line.startswith('import time:'):
+                continue
+            _, cumulative, name = line[len('import time:') :].split('|')
+            if name.strip() == module:
+                import_time = int(cumulative) / 1000
+                best_time = (
+                    import_time if best_time is None else min(best_time, import_time)
+                )
+
+    return best_time
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description='Checks the import time of the entry points against their budget'
+    )
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    load_dotenv()
+
+    over_budget = False
+    print(f'{"module":<20}{"import (ms)":>14}{"budget (ms)":>14}')
+    for module, budget in IMPORT_TIME_BUDGETS_MS.items():
+        try:
+            import_time = measure_import_time(module, args.repeat)
+        except RuntimeError as e:
+            print(f'{module:<20}{"failed":>14}{budget:>14.0f}  {e}')
+            over_budget = True
+            continue
+
+        status = 'OK' if import_time <= budget else 'OVER BUDGET'
+        over_budget = over_budget or import_time > budget
+        print(f'{module:<20}{import_time:>14.1f}{budget:>14.0f}  {status}')
+
+    sys.exit(1 if over_budget else 0)